@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Мікробенчмарк обробки однієї UDP датаграми кошика.
+
+Порівнює старий алгоритм (дві копії dict(item) на рядок і повне
+порівняння з old_products) з CartDiff для кошиків на 10, 100 і 1000
+рядків. Вимірюється розбір JSON + порівняння, без мережі і форматування.
+
+Запуск: python bench_cart_diff.py [--number N]
+"""
+import argparse
+import json
+import timeit
+
+from cart_diff import CartDiff
+from line_items import DECODER_NAME, decode_cart
+
+
+def make_cart(lines, changed=0):
+    goods = []
+    for i in range(lines):
+        qty = 1 + (1 if i == changed else 0)
+        goods.append({"fPName": f"Товар оптовий №{i:05d}", "fPrice": 12.5, "fQtty": qty, "fSum": 12.5 * qty,
+                      "fCode": 100000 + i})
+    return json.dumps({"cmd": {"cmd": ""}, "goods": goods, "sum": {"sum": sum(g["fSum"] for g in goods)}},
+                      ensure_ascii=False).encode("utf-8")
+
+
+class LegacyCart:
+    """Алгоритм до CartDiff: products + prev_products і повне порівняння"""
+
+    def __init__(self):
+        self.prev_products = {}
+
+    def feed(self, data):
+        obj = json.loads(data)
+        old_products = dict(self.prev_products)
+        products = {}
+        prev_products = {}
+        for item in obj.get("goods", []):
+            name = item.get("fPName", "")
+            if name:
+                if name in products:
+                    products[name]['fQtty'] = products[name].get('fQtty', 0) + item.get('fQtty', 0)
+                    products[name]['fSum'] = products[name].get('fSum', 0) + item.get('fSum', 0)
+                else:
+                    products[name] = dict(item)
+                if name in prev_products:
+                    prev_products[name]['fQtty'] = prev_products[name].get('fQtty', 0) + item.get('fQtty', 0)
+                    prev_products[name]['fSum'] = prev_products[name].get('fSum', 0) + item.get('fSum', 0)
+                else:
+                    prev_products[name] = dict(item)
+        self.prev_products = prev_products
+        events = []
+        for name, item in products.items():
+            if name not in old_products:
+                events.append(("ADD", name))
+            elif (old_products[name].get('fQtty') != item.get('fQtty') or
+                  old_products[name].get('fSum') != item.get('fSum')):
+                events.append(("UPDATE", name))
+        for name in old_products:
+            if name not in products:
+                events.append(("REMOVE", name))
+        return events
+
+
+class DiffCart:
+    """Новий шлях: відбиток байтів -> decode_cart (LineItem) -> CartDiff.apply"""
+
+    def __init__(self):
+        self.cart = CartDiff()
+
+    def feed(self, data):
+        if self.cart.is_duplicate(data):
+            return []
+        return self.cart.apply(decode_cart(data).items)
+
+
+def bench(engine_cls, datagrams, number):
+    """Середній час на датаграму (мкс), датаграми подаються по колу"""
+    engine = engine_cls()
+    engine.feed(datagrams[0])
+    state = {"i": 0}
+
+    def step():
+        state["i"] += 1
+        engine.feed(datagrams[state["i"] % len(datagrams)])
+
+    seconds = min(timeit.repeat(step, number=number, repeat=3))
+    return seconds / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Мікробенчмарк CartDiff")
+    parser.add_argument("--number", type=int, default=200, help="датаграм на один замір")
+    args = parser.parse_args()
+
+    print(f"Розбір JSON для CartDiff: {DECODER_NAME}")
+    print(f"{'рядків':>7} | {'сценарій':<22} | {'старий, мкс':>12} | {'CartDiff, мкс':>13} | {'прискорення':>11}")
+    print("-" * 78)
+    for lines in (10, 100, 1000):
+        number = max(20, args.number * 10 // lines)
+        scenarios = {
+            # Повтор того самого кошика (принтер шле кошик на кожне натискання)
+            "повтор знімка": [make_cart(lines)],
+            # Змінюється кількість одного рядка
+            "зміна одного рядка": [make_cart(lines, changed=lines // 2), make_cart(lines, changed=lines // 3)],
+        }
+        for title, datagrams in scenarios.items():
+            legacy = bench(LegacyCart, datagrams, number)
+            new = bench(DiffCart, datagrams, number)
+            print(f"{lines:>7} | {title:<22} | {legacy:>12.1f} | {new:>13.1f} | {legacy / new:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Інкрементальне порівняння кошика для UDP JSON від принтера.
+
+Принтер надсилає весь кошик при кожному натисканні клавіші. Щоб не
+розбирати і не порівнювати однакові знімки, сирі байти датаграми
+спочатку порівнюються за відбитком (довжина + CRC32, збіг
+підтверджується побайтово) - повтор відкидається ще до json.loads.
+Для зміненого знімка тримаємо один словник товарів (LineItem) і
+видаємо лише мінімальні події ADD / UPDATE / REMOVE.
+
+Вікно об'єднання: hold() запам'ятовує рядок товару до першої зміни у
+вікні, take_pending() віддає сумарні зміни відносно нього - проміжні
+стани швидкого сканування до клієнтів не йдуть.
+"""
+import zlib
+
+ADD = "ADD"
+UPDATE = "UPDATE"
+REMOVE = "REMOVE"
+
+
+def fingerprint(data):
+    """Відбиток сирих байтів знімка кошика"""
+    return len(data), zlib.crc32(data)
+
+
+class CartDiff:
+    """Поточний кошик каси і обчислення змін між знімками"""
+
+    def __init__(self):
+        self.items = {}  # назва товару -> LineItem (об'єднаний за назвою)
+        self.pending = {}  # назва -> рядок до першої зміни у вікні (None - товару не було)
+        self._fingerprint = None
+        self._raw = b""
+        self.skipped = 0
+
+    def is_duplicate(self, data):
+        """True, якщо байти ідентичні попередньому знімку; інакше запам'ятовуємо новий відбиток"""
+        digest = fingerprint(data)
+        if digest == self._fingerprint and data == self._raw:
+            self.skipped += 1
+            return True
+        self._fingerprint = digest
+        self._raw = data
+        return False
+
+    def reset(self):
+        self.items = {}
+        self.pending = {}
+        self._fingerprint = None
+        self._raw = b""
+
+    def apply(self, items):
+        """Застосування рядків нового знімка; повертає список (дія, назва, новий, старий)"""
+        new_items = {}
+        for item in items:
+            name = item.name
+            if not name:
+                continue
+            prev = new_items.get(name)
+            if prev is None:
+                # Рядок знімка використовуємо як є - без копіювання
+                new_items[name] = item
+            else:
+                # Товар з такою назвою вже є - додаємо кількість і суму (копія лише для дублікатів)
+                new_items[name] = prev.merged(item)
+
+        old_items = self.items
+        events = []
+        added = 0
+        for name, item in new_items.items():
+            old = old_items.get(name)
+            if old is None:
+                events.append((ADD, name, item, None))
+                added += 1
+            elif not old.same_amount(item):
+                events.append((UPDATE, name, item, old))
+
+        # Видалені товари шукаємо лише якщо спільних рядків менше, ніж було
+        if len(new_items) - added < len(old_items):
+            for name, old in old_items.items():
+                if name not in new_items:
+                    events.append((REMOVE, name, None, old))
+
+        self.items = new_items
+        return events
+
+    def hold(self, events):
+        """Відкладення подій apply() до закриття вікна об'єднання"""
+        pending = self.pending
+        for action, name, item, old in events:
+            if name not in pending:
+                pending[name] = old
+
+    def take_pending(self):
+        """Сумарні зміни з початку вікна (дія, назва, новий, старий); вікно очищується"""
+        events = []
+        items = self.items
+        for name, old in self.pending.items():
+            item = items.get(name)
+            if old is None:
+                if item is not None:
+                    events.append((ADD, name, item, None))
+            elif item is None:
+                events.append((REMOVE, name, None, old))
+            elif not old.same_amount(item):
+                events.append((UPDATE, name, item, old))
+        self.pending = {}
+        return events
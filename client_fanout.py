@@ -0,0 +1,272 @@
+"""Неблокуюча розсилка повідомлень клієнтам (дисплеям покупця).
+
+Кожен клієнт має власну обмежену чергу і окрему задачу-записувач,
+тому повільний або "напівмертвий" дисплей не затримує інших клієнтів
+і обробку даних від принтера.
+"""
+import asyncio
+import time
+from collections import deque
+
+from client_protocol import PROTO_LEGACY, PROTO_V2
+from metrics import QUEUE
+from receipt_formatter import FORMAT_TEXT
+
+# Політики переповнення черги клієнта
+POLICY_DROP_OLDEST = "drop_oldest"   # Викидаємо найстаріші інкрементальні оновлення
+POLICY_DISCONNECT = "disconnect"     # Відключаємо клієнта
+POLICY_BLOCK = "block"               # Нічого не губимо, пригальмовуємо прийом даних
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DISCONNECT, POLICY_BLOCK)
+
+# Запас для політики block, після якого клієнт все одно відключається
+BLOCK_HARD_LIMIT_FACTOR = 10
+
+# Ліміти буфера транспорту: далі дані лишаються в нашій черзі, де діє політика
+WRITE_BUFFER_HIGH = 64 * 1024
+
+
+class ClientConnection:
+    """Підключений клієнт з обмеженою чергою вихідних повідомлень"""
+
+    def __init__(self, writer, addr, max_queue, policy, on_drained=None, metrics=None):
+        self.writer = writer
+        self.addr = addr
+        self.max_queue = max_queue
+        self.policy = policy
+        self.queue = deque()  # (data, incremental, час постановки в чергу)
+        self.connected_at = time.time()
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.register_id = None  # None - повідомлення всіх кас
+        self.proto = PROTO_LEGACY  # PROTO_V2 - події замість тексту
+        self.framing = None
+        self.receipt_format = FORMAT_TEXT  # Інший формат - клієнт отримує лише чеки
+        self.closed = False
+        self.close_reason = None
+        self.task = None
+        self._on_drained = on_drained
+        self._metrics = metrics
+        self._wakeup = asyncio.Event()
+
+        try:
+            writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        except Exception:
+            pass
+
+    @property
+    def depth(self):
+        return len(self.queue)
+
+    @property
+    def lag(self):
+        """Скільки секунд чекає найстаріше невідправлене повідомлення"""
+        if not self.queue:
+            return 0.0
+        return time.monotonic() - self.queue[0][2]
+
+    @property
+    def over_limit(self):
+        return len(self.queue) >= self.max_queue
+
+    def enqueue(self, data, incremental=True):
+        """Постановка в чергу без блокування; False - клієнта треба відключити"""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                self.close_reason = "черга переповнена"
+                return False
+            if self.policy == POLICY_BLOCK:
+                if len(self.queue) >= self.max_queue * BLOCK_HARD_LIMIT_FACTOR:
+                    self.close_reason = "черга переповнена (block)"
+                    return False
+            elif not self._drop_oldest_incremental():
+                # Черга заповнена важливими повідомленнями (чеки) - клієнт безнадійно відстав
+                self.close_reason = "черга переповнена"
+                return False
+
+        self.queue.append((data, incremental, time.monotonic()))
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest_incremental(self):
+        for index, entry in enumerate(self.queue):
+            if entry[1]:
+                del self.queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    async def run_writer(self):
+        """Задача-записувач: вивантажує чергу пачками і чекає лише на свій сокет"""
+        try:
+            while not self.closed:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.queue and not self.closed:
+                    batch = []
+                    oldest = self.queue[0][2]
+                    while self.queue:
+                        batch.append(self.queue.popleft()[0])
+                    data = b"".join(batch)
+                    self.writer.write(data)
+                    await self.writer.drain()
+                    if self._metrics is not None:
+                        # Скільки найстаріше повідомлення пачки чекало до відправки
+                        self._metrics.observe(QUEUE, time.monotonic() - oldest)
+                    self.sent_messages += len(batch)
+                    self.sent_bytes += len(data)
+                    if self._on_drained:
+                        self._on_drained()
+        except (ConnectionError, OSError) as e:
+            self.close_reason = f"помилка запису: {e}"
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._wakeup.set()
+        try:
+            # abort, а не close: "завислий" клієнт ніколи не дочитає буфер
+            self.writer.transport.abort()
+        except Exception:
+            pass
+
+    def stats(self):
+        return {
+            'addr': self.addr,
+            'register': self.register_id,
+            'depth': self.depth,
+            'lag': self.lag,
+            'sent': self.sent_messages,
+            'bytes': self.sent_bytes,
+            'dropped': self.dropped,
+            'policy': self.policy,
+            'proto': self.proto if self.proto == PROTO_LEGACY else f"{self.proto}/{self.framing}",
+            'format': self.receipt_format,
+        }
+
+
+class ClientFanOut:
+    """Розсилка одного повідомлення всім клієнтам через їхні черги"""
+
+    def __init__(self, log, max_queue=256, policy=POLICY_DROP_OLDEST, metrics=None):
+        if policy not in POLICIES:
+            log(f"Невідома політика черги клієнтів '{policy}', використовуємо {POLICY_DROP_OLDEST}", "warning")
+            policy = POLICY_DROP_OLDEST
+        self.log = log
+        self.max_queue = max(1, int(max_queue))
+        self.policy = policy
+        self.metrics = metrics
+        self.clients = []
+        self.disconnected_slow = 0
+        self._dropped_closed = 0
+        self._sent_closed = 0
+        self._sent_bytes_closed = 0
+        self._space = None
+
+    def add(self, writer, addr):
+        client = ClientConnection(writer, addr, self.max_queue, self.policy, self._update_space, self.metrics)
+        client.task = asyncio.get_running_loop().create_task(self._run_client(client))
+        self.clients.append(client)
+        return client
+
+    async def _run_client(self, client):
+        await client.run_writer()
+        self.remove(client)
+
+    def remove(self, client):
+        client.close()
+        if client in self.clients:
+            self.clients.remove(client)
+            self._dropped_closed += client.dropped
+            self._sent_closed += client.sent_messages
+            self._sent_bytes_closed += client.sent_bytes
+            if client.close_reason:
+                self.log(f"КЛІЄНТ ВІДКЛЮЧЕНО: {client.addr} ({client.close_reason})", "warning")
+            else:
+                self.log(f"КЛІЄНТ ВІДКЛЮЧЕНО: {client.addr}", "info")
+        self._update_space()
+
+    def broadcast(self, data, incremental=True, register_id=None):
+        """Розсилка вже закодованих байтів текстовим (v1) клієнтам каси; ніколи не блокує цикл подій"""
+        for client in list(self.clients):
+            if client.proto != PROTO_LEGACY or client.receipt_format != FORMAT_TEXT:
+                continue
+            if register_id is not None and client.register_id not in (None, register_id):
+                continue
+            self._deliver(client, data, incremental)
+        self._update_space()
+
+    def broadcast_receipt(self, receipt, register_id=None):
+        """Чек клієнтам v1 у їхньому форматі: кожен формат рендериться один раз (RenderedReceipt)"""
+        for client in list(self.clients):
+            if client.proto != PROTO_LEGACY:
+                continue
+            if register_id is not None and client.register_id not in (None, register_id):
+                continue
+            self._deliver(client, receipt.encoded(client.receipt_format), False)
+        self._update_space()
+
+    def broadcast_event(self, encoded, incremental=True, register_id=None):
+        """Розсилка події клієнтам v2: байти кодуються один раз на формат (EncodedEvent)"""
+        for client in list(self.clients):
+            if client.proto != PROTO_V2:
+                continue
+            if register_id is not None and client.register_id not in (None, register_id):
+                continue
+            self._deliver(client, encoded.framed(client.framing), incremental)
+        self._update_space()
+
+    def _deliver(self, client, data, incremental):
+        if not client.enqueue(data, incremental):
+            if client.close_reason and client.close_reason.startswith("черга"):
+                self.disconnected_slow += 1
+            self.remove(client)
+
+    @property
+    def blocked(self):
+        """Чи є клієнт з політикою block, що не встигає - тоді прийом даних пригальмовуємо"""
+        return self.policy == POLICY_BLOCK and any(c.over_limit for c in self.clients)
+
+    async def wait_for_space(self):
+        if self._space is None:
+            self._space = asyncio.Event()
+        while self.blocked:
+            self._space.clear()
+            await self._space.wait()
+
+    def _update_space(self):
+        if self._space is None:
+            return
+        if self.blocked:
+            self._space.clear()
+        else:
+            self._space.set()
+
+    def close_all(self):
+        for client in list(self.clients):
+            client.close()
+        self.clients = []
+        if self._space is not None:
+            self._space.set()
+
+    @property
+    def dropped_total(self):
+        return self._dropped_closed + sum(c.dropped for c in self.clients)
+
+    @property
+    def sent_total(self):
+        return self._sent_closed + sum(c.sent_messages for c in self.clients)
+
+    @property
+    def sent_bytes_total(self):
+        return self._sent_bytes_closed + sum(c.sent_bytes for c in self.clients)
+
+    def stats(self):
+        return [client.stats() for client in self.clients]
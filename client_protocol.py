@@ -0,0 +1,119 @@
+"""Протокол v2 для клієнтів (дисплеїв) на клієнтському порту.
+
+За замовчуванням клієнт отримує текстові рядки (v1, як і раніше).
+Клієнт, що надіслав рядок
+
+    PROTO 2 json    - події як JSON рядки (один об'єкт на рядок)
+    PROTO 2 lp      - події з префіксом довжини (4 байти big-endian + JSON)
+
+отримує відповідь hello - завжди JSON рядок, незалежно від формату, -
+і після неї лише події v2. Все, що прийшло до hello, - текст v1.
+"PROTO 1" повертає текстовий потік.
+
+Після hello одразу (тим самим записом) приходить стан активних кошиків:
+подія snapshot або, якщо клієнт вказав останній отриманий seq каси,
+пропущені події з кільця каси:
+
+    PROTO 2 json 41                - seq 41 для каси, на яку підписаний клієнт
+    PROTO 2 lp 127.0.0.2:17 3:120  - seq для кількох кас
+
+Кожна подія має тип, касу і номер seq, що монотонно зростає в межах
+каси, тож дисплей застосовує зміни без розбору тексту і бачить пропуски:
+    start   - початок операції
+    delta   - зміни кошика: changes = [{op: add|update|remove, name, qty, price, sum}]
+    total   - нова сума
+    commit  - оплату підтверджено (items, total)
+    return  - повернення (items, total)
+    cancel  - операцію скасовано
+    snapshot - поточний кошик (items, total, active); seq - номер останньої події каси
+"""
+import json
+import struct
+import time
+
+PROTO_LEGACY = 1
+PROTO_V2 = 2
+
+FRAMING_JSON = "json"
+FRAMING_LP = "lp"
+FRAMINGS = (FRAMING_JSON, FRAMING_LP)
+
+EVENT_HELLO = "hello"
+EVENT_SUBSCRIBED = "subscribed"
+EVENT_START = "start"
+EVENT_DELTA = "delta"
+EVENT_TOTAL = "total"
+EVENT_COMMIT = "commit"
+EVENT_RETURN = "return"
+EVENT_CANCEL = "cancel"
+EVENT_SNAPSHOT = "snapshot"
+
+# Операції в delta (дії CartDiff у нижньому регістрі)
+OP_ADD = "add"
+OP_UPDATE = "update"
+OP_REMOVE = "remove"
+
+LENGTH_PREFIX = struct.Struct(">I")
+
+
+def parse_proto(args):
+    """Аргументи команди PROTO -> (версія, формат, {каса або None: останній seq})
+
+    ValueError - непідтримувана версія, формат або некоректний seq.
+    """
+    if not args:
+        raise ValueError("PROTO: не вказано версію")
+    if args[0] == str(PROTO_LEGACY):
+        return PROTO_LEGACY, None, {}
+    if args[0] != str(PROTO_V2):
+        raise ValueError(f"PROTO: непідтримувана версія {args[0]}")
+    framing = args[1].lower() if len(args) > 1 else FRAMING_JSON
+    if framing not in FRAMINGS:
+        raise ValueError(f"PROTO: невідомий формат {framing}")
+    resume = {}
+    for token in args[2:]:
+        register_id, _, seq = token.rpartition(":")
+        if not seq.isdigit():
+            raise ValueError(f"PROTO: некоректний seq '{token}'")
+        resume[register_id or None] = int(seq)
+    return PROTO_V2, framing, resume
+
+
+def item_fields(item):
+    return {"name": item.name, "qty": item.qty, "price": item.price, "sum": item.sum}
+
+
+def make_event(kind, register_id, seq, **fields):
+    event = {"type": kind, "register": register_id, "seq": seq, "ts": round(time.time(), 3)}
+    event.update(fields)
+    return event
+
+
+def encode_json(event):
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def frame(payload, framing):
+    """Байти події для вибраного формату"""
+    if framing == FRAMING_LP:
+        return LENGTH_PREFIX.pack(len(payload)) + payload
+    return payload + b"\n"
+
+
+class EncodedEvent:
+    """Подія, закодована один раз на формат (спільні байти для всіх клієнтів)"""
+
+    __slots__ = ("event", "_payload", "_frames")
+
+    def __init__(self, event):
+        self.event = event
+        self._payload = None
+        self._frames = {}
+
+    def framed(self, framing):
+        data = self._frames.get(framing)
+        if data is None:
+            if self._payload is None:
+                self._payload = encode_json(self.event)
+            data = self._frames[framing] = frame(self._payload, framing)
+        return data
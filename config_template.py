@@ -0,0 +1,118 @@
+"""Шаблон config.py з описом параметрів.
+
+Записується поруч з програмою, якщо config.py там немає (у exe
+вбудований лише базовий config.py без нових параметрів і коментарів).
+Текст збігається з config.py репозиторію - це перевіряє тест.
+"""
+import re
+
+CONFIG_TEMPLATE = r'''# Сетевые настройки
+TCP_STATUS_PORT = 4000    # TCP для статусов от принтера
+UDP_JSON_PORT = 4001      # UDP для JSON данных от принтера
+TCP_CLIENT_PORT = 4002    # TCP для отправки клиентам
+
+# Кодировки
+ENCODINGS = ['utf-8', 'cp1251', 'ascii', 'latin1']
+
+# Кодування статусів принтера: "auto" - визначається за першими байтами і кешується для каси
+STATUS_ENCODING = "auto"
+# Перевизначення для окремих принтерів: IP принтера або номер каси -> кодування
+PRINTER_ENCODINGS = {}
+
+# Индикаторы операций
+SUCCESS_INDICATORS = ["Дякуємо за покупку", "дякуемо за покупку"]
+RETURN_INDICATORS = ["Повернення", "повернення", "Возврат", "возврат"]
+DELETE_INDICATORS = ["Видалено товар:", "видалено товар:"]
+
+# Правила оплати: перевірка змін config.py раз на стільки секунд (0 - без перезавантаження)
+RULES_RELOAD_INTERVAL = 2.0
+# Додаткові правила: [("success" або "return", "c4ffea")] - сирі байти в HEX
+PAYMENT_HEX_PATTERNS = []
+# [("success" або "return", r"regex")] - без урахування регістру. Ширші ознаки вмикати
+# свідомо: будь-який статус зі збігом закриває кошик як оплачений, наприклад
+#     ("success", r"\bсплачено\b"),
+#     ("success", r"\bоплачено\b"),
+PAYMENT_REGEX_RULES = []
+
+# Черги клієнтів (дисплеїв)
+CLIENT_QUEUE_LIMIT = 256                # Максимум повідомлень у черзі одного клієнта
+CLIENT_OVERFLOW_POLICY = "drop_oldest"  # drop_oldest / disconnect / block
+
+# Каси: IP принтера -> номер каси (незнайомий IP сам стає номером каси)
+REGISTERS = {}
+# Дисплеї: IP клієнта -> номер каси (інакше всі каси або команда "REGISTER <номер>")
+CLIENT_REGISTERS = {}
+# Останніх подій на касу для наздоганяння клієнтів після перепідключення
+CLIENT_EVENT_RING = 256
+
+# Двійкове захоплення TCP трафіку принтера ("" - вимкнено)
+TCP_CAPTURE_FILE = "tcp_capture.bin"
+
+# Вікно процентилів затримок у моніторингу, с
+METRICS_WINDOW = 60
+
+# HTTP метрики для моніторингу (Prometheus /metrics, /health); 0 - вимкнено
+METRICS_HTTP_PORT = 0
+METRICS_HTTP_HOST = "127.0.0.1"
+
+# Рядків у вкладці логів (старіші - з файлу кнопкою "Старіші" і пошуком)
+LOG_VIEW_MAX_LINES = 2000
+
+# Розбір JSON від принтера: auto (msgspec/orjson, якщо встановлені), msgspec, orjson, json
+JSON_DECODER = "auto"
+
+# Журнал транзакцій для відновлення кошика після збою ("" - вимкнено)
+JOURNAL_DIR = "journal"
+# Розмір сегмента журналу, байт; закритих сегментів до стиснення
+JOURNAL_SEGMENT_SIZE = 4 * 1024 * 1024
+JOURNAL_COMPACT_SEGMENTS = 4
+# Пауза між fsync, с: події за цей час пишуться однією пачкою
+JOURNAL_FSYNC_INTERVAL = 0.05
+
+# Архів чеків SQLite для пошуку на вкладці "Чеки" ("" - вимкнено)
+RECEIPT_ARCHIVE = "receipts.db"
+
+# Формат чеків для клієнтів за IP: text, escpos, json, html (інакше команда "FORMAT <формат>")
+# Клієнт не-текстового формату отримує лише чеки (наприклад, додатковий чековий принтер)
+CLIENT_RECEIPT_FORMATS = {}
+# ESC/POS: символів у рядку (48 - 80 мм, 32 - 58 мм), кодова сторінка принтера (ESC t n) і кодування
+ESCPOS_WIDTH = 48
+ESCPOS_CODEPAGE = 46
+ESCPOS_ENCODING = "cp1251"
+
+# Вікно об'єднання змін кошика, с: зміни за вікно йдуть клієнтам одним кадром з однією сумою
+# (оплата, повернення і скасування розсилають відкладені зміни одразу); 0 - без об'єднання
+UPDATE_COALESCE_WINDOW = 0.03
+
+# Прийом UDP: найбільша датаграма, байт (більші рахуються як обрізані), буфер сокета
+# ядра SO_RCVBUF, байт (на Linux обмежений net.core.rmem_max) і датаграм за одне пробудження
+UDP_MAX_DATAGRAM = 65507
+UDP_RCVBUF = 4 * 1024 * 1024
+UDP_DRAIN_BATCH = 256
+
+# Кеш коротких назв товарів DataProcessor (записів)
+SHORT_NAME_CACHE_SIZE = 4096
+
+# Період публікації знімка стану ядра для GUI (секунди)
+SNAPSHOT_INTERVAL = 0.25
+
+# Порт статусів принтера: ліміти з'єднань
+STATUS_MAX_CONNECTIONS = 32   # всього відкритих з'єднань
+STATUS_MAX_PER_PEER = 4      # з однієї IP адреси
+STATUS_IDLE_TIMEOUT = 300.0  # секунд без даних до закриття (0 - без обмеження)
+STATUS_BACKLOG = 128         # черга прийому з'єднань
+'''
+
+
+def set_config_ports(text, ports):
+    """Текст config.py з новими значеннями портів {назва: порт}; решта тексту без змін"""
+    for name, value in ports.items():
+        text, found = re.subn(rf'^{name}\s*=\s*\d+', f'{name} = {value}', text, flags=re.MULTILINE)
+        if not found:
+            text += f"\n{name} = {value}\n"
+    return text
+
+
+def render_config_py(ports):
+    """Повний config.py з шаблону з новими портами"""
+    return set_config_ports(CONFIG_TEMPLATE, ports)
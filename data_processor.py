@@ -1,50 +1,193 @@
 import re
 import json
+from functools import lru_cache
+
+try:
+    import config
+except ImportError:
+    config = None
+
+# Нормализация названий: шаблоны компилируются один раз
+_STRIP_RE = re.compile(r'[^\w\sа-яёіїєґ]', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+SHORT_NAME_LENGTH = 30
+
+# Строки "Видалено товар: ..." от принтера (порт статусов)
+_DELETE_RE = None
+
+
+def set_delete_indicators(indicators):
+    """Перекомпиляция шаблона удаления (при перезагрузке config.py)"""
+    global _DELETE_RE
+    # Пустой список - шаблон, который ничего не находит
+    pattern = '|'.join(re.escape(indicator) for indicator in indicators if indicator) or r'(?!)'
+    _DELETE_RE = re.compile(pattern, re.IGNORECASE)
+
+
+set_delete_indicators(getattr(config, 'DELETE_INDICATORS', ["Видалено товар:"]))
+
+# Короче - слишком неоднозначно для сопоставления строки с товаром
+MIN_MATCH_LENGTH = 3
+
+# Незавершенная строка статуса длиннее - мусор, а не строка чека
+MAX_STATUS_TAIL = 4096
+
+
+@lru_cache(maxsize=getattr(config, 'SHORT_NAME_CACHE_SIZE', 4096))
+def short_name(full_name):
+    """Короткий ключ для сопоставления (кэш: одни и те же товары приходят в каждом пакете)"""
+    short = _STRIP_RE.sub('', full_name.lower())
+    short = _SPACE_RE.sub(' ', short).strip()
+    return short[:SHORT_NAME_LENGTH]
+
+
+class ProductIndex:
+    """Префиксное дерево коротких имен товаров текущей корзины
+
+    Поиск идет по символам строки, а не по товарам корзины: время
+    зависит от длины строки, но не от размера корзины.
+    """
+
+    _NAME = object()    # ключ узла: короткое имя, которое здесь заканчивается
+    _UNIQUE = object()  # ключ узла: единственное имя в поддереве или None
+
+    def __init__(self, names=()):
+        self.root = {}
+        self.size = 0
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        if not name:
+            return
+        node = self.root
+        self._mark(node, name)
+        for char in name:
+            node = node.setdefault(char, {})
+            self._mark(node, name)
+        if node.get(self._NAME) is None:
+            self.size += 1
+        node[self._NAME] = name
+
+    def _mark(self, node, name):
+        if self._UNIQUE not in node:
+            node[self._UNIQUE] = name
+        elif node[self._UNIQUE] != name:
+            node[self._UNIQUE] = None
+
+    def match(self, text):
+        """Имя товара для строки принтера или None
+
+        Строка может содержать полное имя и дальше количество/цену
+        (самое длинное имя-префикс строки) или обрезанное принтером
+        имя (строка - префикс ровно одного имени).
+        """
+        node = self.root
+        found = None
+        depth = 0
+        for char in text:
+            child = node.get(char)
+            if child is None:
+                break
+            node = child
+            depth += 1
+            name = node.get(self._NAME)
+            # Имя должно заканчиваться на границе слова ("хліб" не совпадает с "хлібці")
+            if name is not None and (depth == len(text) or text[depth] == ' ' or depth >= SHORT_NAME_LENGTH):
+                found = name
+        else:
+            # Строка закончилась внутри дерева - обрезанное имя
+            if found is None and depth >= MIN_MATCH_LENGTH:
+                return node.get(self._UNIQUE)
+        return found
+
 
 class DataProcessor:
     def __init__(self):
         self.json_products = {}
+        self.index = ProductIndex()
         self.current_transaction_lines = []
+        self._matched_names = set()
+        self._status_tail = ""  # Строка статуса без конца, пришедшая в конце куска
         self.transaction_total = 0.0
         self.transaction_active = False
         self.is_return_operation = False
-        
-    def process_json_data(self, json_obj):
-        """Обработка JSON данных от принтера"""
-        cmd = json_obj.get('cmd', {}).get('cmd', '')
-        
-        if cmd == 'clear':
-            print("JSON команда очистки")
+
+    def process_json_data(self, snapshot):
+        """Обработка снимка корзины от принтера (CartSnapshot)"""
+        if snapshot.cmd == 'clear':
             return 'CLEAR'
-            
-        # Сохраняем товары
-        goods = json_obj.get('goods', [])
-        for item in goods:
-            full_name = item.get('fPName', '')
-            if full_name:
-                short_name = self.create_short_name(full_name)
-                self.json_products[short_name] = {
-                    'full_name': full_name,
-                    'price': item.get('fPrice', 0),
-                    'qty': item.get('fQtty', 0),
-                    'sum': item.get('fSum', 0)
-                }
-                print(f"Сохранен товар: '{full_name}'")
-        
-        self.transaction_total = json_obj.get('sum', {}).get('sum', 0)
+
+        # Сохраняем товары (LineItem, без копирования)
+        products = {}
+        for item in snapshot.items:
+            if item.name:
+                products[short_name(item.name)] = item
+        # Новые товары добавляются в дерево; перестраиваем только после удаления
+        if self.json_products.keys() - products.keys():
+            self.index = ProductIndex(products)
+        else:
+            for name in products.keys() - self.json_products.keys():
+                self.index.add(name)
+        self.json_products = products
+
+        self.transaction_total = snapshot.total
         return None
-    
+
     def create_short_name(self, full_name):
         """Создание короткого ключа для сопоставления"""
-        short = re.sub(r'[^\w\sа-яёіїєґ]', '', full_name.lower(), flags=re.IGNORECASE)
-        short = re.sub(r'\s+', ' ', short).strip()
-        return short[:30]  # Ограничиваем длину
-    
+        return short_name(full_name)
+
+    def match_line(self, line):
+        """Товар корзины (LineItem) для строки чека принтера или None"""
+        key = _SPACE_RE.sub(' ', _STRIP_RE.sub('', line.lower())).strip()
+        if len(key) < MIN_MATCH_LENGTH:
+            return None
+        name = key[:SHORT_NAME_LENGTH]
+        if name not in self.json_products:
+            name = self.index.match(key)
+        return self.json_products.get(name) if name else None
+
+    def process_status_text(self, text):
+        """Строки статуса принтера -> (удаленные товары, товары из строк чека)
+
+        Обрабатываются только завершенные строки: хвост куска без
+        перевода строки ждет продолжения из следующего куска.
+        """
+        deleted = []
+        matched = []
+        lines = (self._status_tail + text).splitlines(keepends=True)
+        if lines and not lines[-1].endswith(('\n', '\r')):
+            self._status_tail = lines.pop()[-MAX_STATUS_TAIL:]
+        else:
+            self._status_tail = ""
+        if not self.json_products:
+            return deleted, matched
+        for line in lines:
+            line = line.rstrip('\r\n')
+            found = _DELETE_RE.search(line)
+            if found:
+                item = self.match_line(line[found.end():])
+                if item is not None:
+                    deleted.append(item)
+                continue
+            item = self.match_line(line)
+            if item is not None and item.name not in self._matched_names:
+                self._matched_names.add(item.name)
+                self.current_transaction_lines.append(item)
+                matched.append(item)
+        return deleted, matched
+
     def reset_transaction(self):
         """Полный сброс транзакции"""
         self.transaction_active = False
         self.current_transaction_lines = []
+        self._matched_names = set()
         self.transaction_total = 0.0
         self.is_return_operation = False
         self.json_products = {}  # ВАЖНО: очищаем словарь товаров!
-        print("Транзакция сброшена, все данные очищены")
+        self.index = ProductIndex()
+
+    def end_status_stream(self):
+        """Соединение статусов закрыто: незавершенная строка уже не продолжится"""
+        self._status_tail = ""
@@ -0,0 +1,259 @@
+"""Журнал транзакцій: відновлення відкритого кошика після збою.
+
+Кожна подія каси (start, delta, total, commit, return, cancel) - JSON
+рядок у сегменті журналу, ті самі байти, що йдуть клієнтам v2.
+Цикл подій лише кладе байти в чергу; окремий потік пише їх пачками і
+робить один fsync на пачку (group commit), тож обробка датаграм
+ніколи не чекає на диск.
+
+Сегменти: journal-000001.jsonl, journal-000002.jsonl, ... Після
+заповнення сегмент закривається; коли закритих сегментів набирається
+забагато, вони стискаються в один: по одному знімку на касу (останній
+seq і незавершений кошик), завершені операції відкидаються - їх
+історія зберігається в архіві чеків.
+
+При запуску сервера журнал читається повністю і для кожної каси
+відновлюється останній незавершений кошик і номер seq.
+"""
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+SEGMENT_RE = re.compile(r"^journal-(\d{6})\.jsonl$")
+
+# Події, що завершують операцію
+CLOSING_EVENTS = ("commit", "return", "cancel")
+
+_STOP = object()
+
+
+def segment_name(number):
+    return f"journal-{number:06d}.jsonl"
+
+
+class CartState:
+    """Стан кошика однієї каси при програванні журналу"""
+
+    __slots__ = ("register_id", "items", "total", "active", "seq")
+
+    def __init__(self, register_id):
+        self.register_id = register_id
+        self.items = {}  # назва -> {name, qty, price, sum}
+        self.total = 0
+        self.active = False
+        self.seq = 0
+
+
+class JournalState:
+    """Програвання подій журналу: відкриті кошики і останні seq кас"""
+
+    def __init__(self):
+        self.carts = {}
+        self.events = 0
+        self.corrupt = 0
+
+    def cart(self, register_id):
+        cart = self.carts.get(register_id)
+        if cart is None:
+            cart = self.carts[register_id] = CartState(register_id)
+        return cart
+
+    def apply(self, event):
+        self.events += 1
+        cart = self.cart(event.get("register"))
+        cart.seq = max(cart.seq, event.get("seq", 0))
+        kind = event.get("type")
+        if kind == "start":
+            cart.items = {}
+            cart.total = 0
+            cart.active = True
+        elif kind == "delta":
+            cart.active = True
+            for change in event.get("changes", ()):
+                if change.get("op") == "remove":
+                    cart.items.pop(change.get("name"), None)
+                else:
+                    cart.items[change.get("name")] = {k: v for k, v in change.items() if k != "op"}
+        elif kind == "total":
+            cart.total = event.get("total", 0)
+        elif kind == "snapshot":
+            cart.items = {item["name"]: item for item in event.get("items", ())}
+            cart.total = event.get("total", 0)
+            cart.active = event.get("active", bool(cart.items))
+        elif kind in CLOSING_EVENTS:
+            cart.items = {}
+            cart.total = 0
+            cart.active = False
+
+    def feed_file(self, path, on_event=None):
+        """Програвання сегмента; обірваний останній рядок (збій під час запису) пропускається"""
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    self.corrupt += 1
+                    continue
+                if not isinstance(event, dict):
+                    self.corrupt += 1
+                    continue
+                self.apply(event)
+                if on_event is not None:
+                    on_event(event, line)
+
+    def open_carts(self):
+        return [cart for cart in self.carts.values() if cart.active and cart.items]
+
+
+class Journal:
+    """Сегментований журнал з фоновим group commit"""
+
+    def __init__(self, directory, segment_size=4 * 1024 * 1024, compact_segments=4, fsync_interval=0.05):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compact_segments = max(2, compact_segments)
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._number = 0
+
+    def segments(self):
+        """Номери сегментів за зростанням"""
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_RE.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _path(self, number):
+        return os.path.join(self.directory, segment_name(number))
+
+    def recover(self):
+        """Програвання всіх сегментів (до start); повертає JournalState"""
+        os.makedirs(self.directory, exist_ok=True)
+        state = JournalState()
+        for number in self.segments():
+            try:
+                state.feed_file(self._path(number))
+            except OSError:
+                state.corrupt += 1
+        return state
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        numbers = self.segments()
+        if len(numbers) >= self.compact_segments:
+            # Кожен запуск відкриває новий сегмент - не даємо їм накопичуватись
+            self.compact(numbers)
+            numbers = self.segments()
+        # Завжди новий сегмент: хвіст попереднього міг бути обірваний збоєм
+        self._open_segment((numbers[-1] if numbers else 0) + 1)
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    def append(self, line):
+        """Байти одного JSON рядка (з \\n); виклик не блокує"""
+        self._queue.put(line)
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _open_segment(self, number):
+        self._number = number
+        self._file = open(self._path(number), "ab")
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = []
+            while True:
+                if item is _STOP:
+                    running = False
+                    break
+                batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._commit(batch)
+                if self.fsync_interval and running:
+                    # Пауза між fsync: наступна пачка збере все, що прийде за цей час
+                    time.sleep(self.fsync_interval)
+        self._close_segment()
+
+    def _commit(self, batch):
+        try:
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.written += len(batch)
+            self.fsyncs += 1
+            if self._file.tell() >= self.segment_size:
+                self._rotate()
+        except OSError as e:
+            self.error = e
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            pass
+        self._file.close()
+        self._file = None
+
+    def _rotate(self):
+        self._close_segment()
+        self._open_segment(self._number + 1)
+        sealed = [n for n in self.segments() if n < self._number]
+        if len(sealed) >= self.compact_segments:
+            self.compact(sealed)
+
+    def compact(self, numbers):
+        """Стиснення закритих сегментів в один (з найменшим номером)
+
+        Лишається один рядок snapshot на касу: останній seq і, якщо
+        операція не завершена, її кошик. Історія продажів - в архіві
+        чеків, тож журнал не росте з кожним стисненням.
+        """
+        state = JournalState()
+        for number in numbers:
+            state.feed_file(self._path(number))
+
+        lines = []
+        for cart in state.carts.values():
+            active = cart.active and bool(cart.items)
+            snapshot = {"type": "snapshot", "register": cart.register_id, "seq": cart.seq, "active": active,
+                        "total": cart.total if active else 0,
+                        "items": list(cart.items.values()) if active else []}
+            lines.append(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+
+        target = self._path(numbers[0])
+        temporary = target + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, target)
+        for number in numbers[1:]:
+            os.remove(self._path(number))
+        self.compactions += 1
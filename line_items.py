@@ -0,0 +1,164 @@
+"""Рядки кошика і знімок кошика з UDP JSON принтера.
+
+Датаграма розбирається одразу в компактні об'єкти з __slots__:
+LineItem (назва, ціна, кількість, сума) і CartSnapshot (команда,
+рядки, сума). Ними користуються CartDiff, форматування, чеки і GUI -
+доступ за атрибутом замість рядкових ключів 'fPName'/'fQtty'/...
+
+Розбір JSON (JSON_DECODER у config.py):
+    msgspec - байти декодуються одразу в типізовані Struct, без
+              проміжного дерева dict; рядки кошика - MsgspecLineItem з
+              тими ж полями і методами, що й LineItem;
+    orjson  - швидкий розбір у dict, далі LineItem.from_json;
+    json    - стандартний модуль, якщо нічого не встановлено.
+"auto" - перший встановлений з msgspec, orjson, json. Датаграма
+неправильної структури (goods не список об'єктів, sum не об'єкт
+тощо) - ValueError, як і некоректний JSON.
+"""
+import json
+
+try:
+    import config
+except ImportError:
+    config = None
+
+
+class LineItemMethods:
+    """Спільні методи рядка кошика (поля name, price, qty, sum)"""
+
+    __slots__ = ()
+
+    def merged(self, other):
+        """Новий рядок з сумарною кількістю і сумою (однакові товари в кошику)"""
+        return LineItem(self.name, self.price, self.qty + other.qty, self.sum + other.sum)
+
+    def same_amount(self, other):
+        return self.qty == other.qty and self.sum == other.sum
+
+    def values(self):
+        """Незмінний кортеж для передачі в інший потік"""
+        return self.qty, self.price, self.sum
+
+    def __repr__(self):
+        return f"LineItem({self.name!r}, {self.price!r}, {self.qty!r}, {self.sum!r})"
+
+
+class LineItem(LineItemMethods):
+    """Рядок кошика (товар з кількістю і сумою)"""
+
+    __slots__ = ("name", "price", "qty", "sum")
+
+    def __init__(self, name, price=0, qty=0, sum=0):
+        self.name = name
+        self.price = price
+        self.qty = qty
+        self.sum = sum
+
+    @classmethod
+    def from_json(cls, good):
+        if not isinstance(good, dict):
+            raise ValueError("goods: очікується JSON об'єкт товару")
+        return cls(good.get("fPName", ""), good.get("fPrice", 0), good.get("fQtty", 0), good.get("fSum", 0))
+
+
+class CartSnapshot:
+    """Знімок кошика з однієї датаграми"""
+
+    __slots__ = ("cmd", "items", "total")
+
+    def __init__(self, cmd="", items=(), total=0):
+        self.cmd = cmd
+        self.items = items
+        self.total = total
+
+    @classmethod
+    def from_json(cls, obj):
+        if not isinstance(obj, dict):
+            raise ValueError("очікується JSON об'єкт")
+        cmd = obj.get("cmd") or {}
+        total = obj.get("sum") or {}
+        goods = obj.get("goods") or ()
+        if not isinstance(cmd, dict) or not isinstance(total, dict) or not isinstance(goods, (list, tuple)):
+            raise ValueError("cmd і sum мають бути JSON об'єктами, goods - списком")
+        return cls(cmd.get("cmd", ""), [LineItem.from_json(good) for good in goods], total.get("sum", 0))
+
+
+# ----------------------------------------------------------------------
+# Розбір JSON
+# ----------------------------------------------------------------------
+
+def _dict_decoder(loads):
+    """decode_cart поверх loads, що будує дерево dict"""
+    def decode(data):
+        return CartSnapshot.from_json(loads(data))
+    return decode
+
+
+def _stdlib_decoder():
+    return _dict_decoder(json.loads)
+
+
+def _orjson_decoder():
+    import orjson
+    return _dict_decoder(orjson.loads)
+
+
+def _msgspec_decoder():
+    import msgspec
+    from typing import List, Optional, Union
+
+    Number = Union[int, float]
+
+    class MsgspecLineItem(LineItemMethods, msgspec.Struct, rename={
+            "name": "fPName", "price": "fPrice", "qty": "fQtty", "sum": "fSum"}):
+        """Рядок кошика, декодований msgspec напряму з байтів"""
+        name: Optional[str] = ""
+        price: Number = 0
+        qty: Number = 0
+        sum: Number = 0
+
+    class WireCmd(msgspec.Struct):
+        cmd: Optional[str] = ""
+
+    class WireSum(msgspec.Struct):
+        sum: Number = 0
+
+    class WireCart(msgspec.Struct):
+        cmd: Optional[WireCmd] = None
+        goods: Optional[List[MsgspecLineItem]] = None
+        sum: Optional[WireSum] = None
+
+    decode_wire = msgspec.json.Decoder(WireCart).decode
+
+    def decode(data):
+        try:
+            cart = decode_wire(data)
+        except msgspec.DecodeError as e:  # включно з ValidationError
+            raise ValueError(str(e)) from None
+        return CartSnapshot((cart.cmd.cmd or "") if cart.cmd else "", cart.goods or [],
+                            cart.sum.sum if cart.sum else 0)
+    return decode
+
+
+DECODERS = {
+    "msgspec": _msgspec_decoder,
+    "orjson": _orjson_decoder,
+}
+
+
+def select_decoder(preferred="auto"):
+    """(назва, decode_cart); "auto" - перший встановлений з msgspec, orjson, json"""
+    names = ["msgspec", "orjson"] if preferred == "auto" else [preferred]
+    for name in names:
+        factory = DECODERS.get(name)
+        if factory is None:
+            continue
+        try:
+            return name, factory()
+        except ImportError:
+            continue
+    return "json", _stdlib_decoder()
+
+
+# Байти датаграми -> CartSnapshot; некоректний JSON або структура - ValueError
+DECODER_NAME, decode_cart = select_decoder(getattr(config, 'JSON_DECODER', "auto"))
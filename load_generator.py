@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Генератор навантаження: багато симульованих принтерів на localhost.
+
+Кожен принтер має власну адресу 127.0.0.N (окрема каса на сервері),
+шле на UDP порт зростаючий кошик JSON - по одному новому товару за
+скан - і після останнього товару відкриває TCP з'єднання на порт
+статусів з "Дякуємо за покупку" або "Повернення" (cp1251). Дисплеї
+підключаються до клієнтського порту і підписуються на свою касу.
+
+Вимірюється затримка від відправки датаграми до отримання рядка
+товару дисплеєм (кожен товар має унікальну назву-мітку) і від
+відправки статусу до отримання чека.
+
+Запуск (сервер вже працює на стандартних портах):
+    python load_generator.py --printers 8 --subscribers 16 --items 30 --rate 20 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import re
+import socket
+import time
+
+PAYMENT_STATUS = "Дякуємо за покупку"
+RETURN_STATUS = "Повернення"
+
+# Унікальна мітка товару: номер принтера і номер скану
+TOKEN_RE = re.compile(rb"LG(\d{3})-(\d{7})")
+# Кінець чека продажу або повернення
+COMMIT_MARKERS = ("=== СПЛАЧЕНО ===".encode("utf-8"), "СУМА ПОВЕРНЕННЯ".encode("utf-8"))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class LatencyStats:
+    """Затримки в мс і кількість отриманих подій"""
+
+    def __init__(self):
+        self.values = []
+
+    def add(self, seconds):
+        self.values.append(seconds * 1000.0)
+
+    def summary(self):
+        values = sorted(self.values)
+        return {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else 0.0,
+        }
+
+
+class Printer:
+    """Симульований принтер: UDP кошик + TCP статус оплати"""
+
+    def __init__(self, index, args, sent_at, commits):
+        self.index = index
+        self.args = args
+        self.host = f"127.0.0.{args.first_host + index}"
+        self.sent_at = sent_at
+        self.commits = commits
+        self.sock = None
+        self.seq = 0
+        self.datagrams = 0
+        self.bytes = 0
+        self.transactions = 0
+        self.returns = 0
+
+    @property
+    def register_id(self):
+        return self.host
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.host, 0))
+        self.sock.setblocking(False)
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+
+    def send_cart(self, goods):
+        data = json.dumps({"cmd": {"cmd": ""}, "goods": goods,
+                           "sum": {"sum": round(sum(g["fSum"] for g in goods), 2)}},
+                          ensure_ascii=False).encode("utf-8")
+        try:
+            self.sock.sendto(data, (self.args.host, self.args.udp_port))
+        except BlockingIOError:
+            return False
+        self.datagrams += 1
+        self.bytes += len(data)
+        return True
+
+    async def send_status(self, text):
+        """Окреме TCP з'єднання з адреси принтера, як у реального пристрою"""
+        reader, writer = await asyncio.open_connection(
+            self.args.host, self.args.tcp_port, local_addr=(self.host, 0))
+        try:
+            writer.write(text.encode("cp1251"))
+            await writer.drain()
+            # Сервер закриває з'єднання, коли розпізнав операцію
+            try:
+                await asyncio.wait_for(reader.read(), 2.0)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            writer.close()
+
+    async def run(self, deadline):
+        interval = 1.0 / self.args.rate if self.args.rate > 0 else 0
+        loop = asyncio.get_running_loop()
+        while loop.time() < deadline:
+            goods = []
+            for _ in range(self.args.items):
+                self.seq += 1
+                price = 10.0 + self.seq % 90
+                goods.append({"fPName": f"Товар LG{self.index:03d}-{self.seq:07d}", "fPrice": price,
+                              "fQtty": 1, "fSum": price})
+                self.sent_at[(self.index, self.seq)] = time.perf_counter()
+                if not self.send_cart(goods):
+                    del self.sent_at[(self.index, self.seq)]
+                await asyncio.sleep(interval)
+                if loop.time() >= deadline:
+                    break
+
+            is_return = self.args.return_every and (self.transactions + 1) % self.args.return_every == 0
+            self.commits[self.index] = time.perf_counter()
+            try:
+                await self.send_status(RETURN_STATUS if is_return else PAYMENT_STATUS)
+            except OSError as e:
+                print(f"Принтер {self.host}: помилка TCP статусу: {e}")
+            self.transactions += 1
+            self.returns += bool(is_return)
+            await asyncio.sleep(self.args.pause)
+
+
+class Subscriber:
+    """Дисплей покупця: підписка на одну касу і облік затримок"""
+
+    def __init__(self, printer, args, sent_at, commits, scan_stats, commit_stats):
+        self.printer = printer
+        self.args = args
+        self.sent_at = sent_at
+        self.commits = commits
+        self.scan_stats = scan_stats
+        self.commit_stats = commit_stats
+        self.seen = set()
+        self.received_bytes = 0
+        self.lines = 0
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.client_port)
+        self.writer.write(f"REGISTER {self.printer.register_id}\n".encode("utf-8"))
+        await self.writer.drain()
+
+    async def run(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                now = time.perf_counter()
+                self.received_bytes += len(line)
+                self.lines += 1
+                match = TOKEN_RE.search(line)
+                if match:
+                    key = (int(match.group(1)), int(match.group(2)))
+                    # Рядок чека теж містить мітку - рахуємо лише перше отримання
+                    if key not in self.seen:
+                        self.seen.add(key)
+                        sent = self.sent_at.get(key)
+                        if sent is not None:
+                            self.scan_stats.add(now - sent)
+                elif any(marker in line for marker in COMMIT_MARKERS):
+                    sent = self.commits.get(self.printer.index)
+                    if sent is not None:
+                        self.commit_stats.add(now - sent)
+        except (ConnectionError, OSError):
+            pass
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def run_load(args):
+    sent_at = {}
+    commits = {}
+    scan_stats = LatencyStats()
+    commit_stats = LatencyStats()
+
+    printers = [Printer(i, args, sent_at, commits) for i in range(args.printers)]
+    for printer in printers:
+        try:
+            printer.open()
+        except OSError as e:
+            raise SystemExit(f"Не вдалось зайняти адресу {printer.host}: {e}")
+
+    subscribers = [Subscriber(printers[i % len(printers)], args, sent_at, commits, scan_stats, commit_stats)
+                   for i in range(args.subscribers)]
+    for subscriber in subscribers:
+        await subscriber.connect()
+    readers = [asyncio.ensure_future(s.run()) for s in subscribers]
+    # Підписки мають встигнути застосуватись до першого скану
+    await asyncio.sleep(0.3)
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    await asyncio.gather(*(p.run(loop.time() + args.duration) for p in printers))
+    elapsed = time.perf_counter() - started
+
+    # Хвіст: чекаємо останні оновлення
+    await asyncio.sleep(args.drain)
+    for subscriber in subscribers:
+        subscriber.close()
+    await asyncio.gather(*readers, return_exceptions=True)
+    for printer in printers:
+        printer.close()
+
+    report(args, printers, subscribers, sent_at, scan_stats, commit_stats, elapsed)
+
+
+def report(args, printers, subscribers, sent_at, scan_stats, commit_stats, elapsed):
+    datagrams = sum(p.datagrams for p in printers)
+    sent_bytes = sum(p.bytes for p in printers)
+    transactions = sum(p.transactions for p in printers)
+    returns = sum(p.returns for p in printers)
+    received_lines = sum(s.lines for s in subscribers)
+    received_bytes = sum(s.received_bytes for s in subscribers)
+    expected = sum(sum(1 for key in sent_at if key[0] == s.printer.index) for s in subscribers)
+    missed = expected - scan_stats.summary()["count"]
+
+    print("=" * 60)
+    print(f"Принтерів: {len(printers)}, дисплеїв: {len(subscribers)}, тривалість: {elapsed:.1f} с")
+    print(f"UDP датаграм: {datagrams} ({datagrams / elapsed:.0f}/с, {sent_bytes / elapsed / 1024:.0f} КБ/с)")
+    print(f"Транзакцій: {transactions} (повернень: {returns})")
+    print(f"Отримано дисплеями: {received_lines} рядків ({received_lines / elapsed:.0f}/с, "
+          f"{received_bytes / elapsed / 1024:.0f} КБ/с)")
+    print(f"Не отримано оновлень товарів: {missed} з {expected}")
+    print("-" * 60)
+    print(f"{'затримка, мс':<22} | {'к-сть':>7} | {'p50':>7} | {'p90':>7} | {'p99':>7} | {'max':>7}")
+    for title, stats in (("скан -> дисплей", scan_stats), ("статус -> чек", commit_stats)):
+        s = stats.summary()
+        print(f"{title:<22} | {s['count']:>7} | {s['p50']:>7.2f} | {s['p90']:>7.2f} | {s['p99']:>7.2f} | "
+              f"{s['max']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Навантажувальний тест POS сервера")
+    parser.add_argument("--host", default="127.0.0.1", help="адреса сервера")
+    parser.add_argument("--tcp-port", type=int, default=4000, help="TCP порт статусів")
+    parser.add_argument("--udp-port", type=int, default=4001, help="UDP порт JSON")
+    parser.add_argument("--client-port", type=int, default=4002, help="TCP порт клієнтів")
+    parser.add_argument("--printers", type=int, default=4, help="кількість принтерів (кас)")
+    parser.add_argument("--subscribers", type=int, default=8, help="кількість дисплеїв (по колу між касами)")
+    parser.add_argument("--items", type=int, default=20, help="товарів у транзакції")
+    parser.add_argument("--rate", type=float, default=10.0, help="сканів за секунду на принтер (0 - без пауз)")
+    parser.add_argument("--pause", type=float, default=0.2, help="пауза між транзакціями, с")
+    parser.add_argument("--return-every", type=int, default=5, help="кожна N-та транзакція - повернення (0 - ні)")
+    parser.add_argument("--duration", type=float, default=10.0, help="тривалість, с")
+    parser.add_argument("--drain", type=float, default=1.0, help="очікування хвоста після завершення, с")
+    parser.add_argument("--first-host", type=int, default=10, help="перший принтер: 127.0.0.N")
+    args = parser.parse_args()
+
+    if args.printers < 1 or args.first_host + args.printers > 255:
+        parser.error("кількість принтерів має вміщатись у 127.0.0.1-254")
+    try:
+        asyncio.run(run_load(args))
+    except ConnectionRefusedError:
+        raise SystemExit("Сервер не відповідає - запустіть його перед тестом")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Фоновий запис логів.
+
+Виробники (цикл подій, GUI) лише кладуть рядок у чергу. Один потік
+тримає файл відкритим, пише пачками і скидає буфер на диск за таймером,
+тож логування не додає затримки до оновлень кошика.
+
+Під час запису ведеться індекс зміщень рядків (LogIndex): GUI тримає
+в пам'яті лише останні рядки, а старіші читає з файлу сторінками.
+Рядок потрапляє в індекс лише після скидання буфера на диск, тож
+читання за індексом ніколи не натрапляє на ще не записаний хвіст.
+"""
+import queue
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+_TRUNCATE = object()
+_STOP = object()
+
+SCAN_BLOCK = 1024 * 1024
+
+
+class LogIndex:
+    """Зміщення початку кожного рядка у файлі логу"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('q')
+        self.size = 0  # Кінець останнього проіндексованого рядка
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def reset(self):
+        self.offsets = array('q')
+        self.size = 0
+
+    def scan(self, f):
+        """Індексація вже наявного вмісту файлу (при відкритті на дозапис)"""
+        self.reset()
+        f.seek(0)
+        offsets = self.offsets
+        position = 0
+        line_start = 0
+        while True:
+            block = f.read(SCAN_BLOCK)
+            if not block:
+                break
+            index = block.find(b"\n")
+            while index != -1:
+                offsets.append(line_start)
+                line_start = position + index + 1
+                index = block.find(b"\n", index + 1)
+            position += len(block)
+        if line_start < position:
+            # Останній рядок без \n теж рахуємо
+            offsets.append(line_start)
+        self.size = position
+
+    def add(self, length):
+        self.offsets.append(self.size)
+        self.size += length
+
+    def _end(self, line):
+        return self.offsets[line] if line < len(self.offsets) else self.size
+
+    def _read_range(self, f, start, end):
+        """Рядки [start, end) без символів кінця рядка"""
+        begin = self.offsets[start]
+        f.seek(begin)
+        data = f.read(self._end(end) - begin)
+        return data.decode("utf-8", errors="replace").split("\n")[:end - start]
+
+    def read(self, start, count):
+        """Рядки [start, start + count) з файлу; лише те, що вже скинуто на диск"""
+        start = max(0, start)
+        end = min(len(self.offsets), start + count)
+        if start >= end:
+            return []
+        try:
+            with open(self.path, "rb") as f:
+                return self._read_range(f, start, end)
+        except (OSError, IndexError):
+            # IndexError - файл очищено під час читання
+            return []
+
+    def line_at(self, offset):
+        """Номер рядка, що містить байт з цим зміщенням"""
+        return max(0, bisect_right(self.offsets, offset) - 1)
+
+    def search(self, text, limit=500):
+        """Номери рядків, що містять текст (без урахування регістру), від найновіших"""
+        needle = text.lower()
+        found = []
+        if not needle:
+            return found
+        end = len(self.offsets)
+        try:
+            with open(self.path, "rb") as f:
+                # Блоками з кінця файлу, межі блоків - на початках рядків
+                while end > 0 and len(found) < limit:
+                    start = min(end - 1, self.line_at(self._end(end) - SCAN_BLOCK))
+                    lines = self._read_range(f, start, end)
+                    for number in range(len(lines) - 1, -1, -1):
+                        if needle in lines[number].lower():
+                            found.append(start + number)
+                    end = start
+        except (OSError, IndexError):
+            pass
+        return found[:limit]
+
+
+class LogWriter:
+    """Пакетний запис рядків логу в файл у фоновому потоці"""
+
+    def __init__(self, path, flush_interval=0.5, batch_size=500, echo=True):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.echo = echo
+        self.written_lines = 0
+        self.index = LogIndex(path)
+        self._unflushed = []  # Довжини записаних рядків, що ще в буфері файлу (не в індексі)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """Дешево: лише постановка в чергу (рядок має закінчуватись \\n)"""
+        self._queue.put(line)
+
+    def truncate(self):
+        """Очищення файлу логу (файл відкритий потоком запису, тому не видаляємо його)"""
+        self._queue.put(_TRUNCATE)
+
+    def flush(self, timeout=2.0):
+        """Дочекатись запису всього, що вже в черзі (напр. перед копіюванням файлу)"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def stop(self, timeout=2.0):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _open(self, mode="ab"):
+        self._unflushed = []
+        try:
+            f = open(self.path, mode, buffering=64 * 1024)
+        except OSError:
+            return None
+        try:
+            if mode == "ab":
+                with open(self.path, "rb") as existing:
+                    self.index.scan(existing)
+            else:
+                self.index.reset()
+        except OSError:
+            self.index.reset()
+        return f
+
+    def _run(self):
+        f = self._open()
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            batch = []
+            while item is not None:
+                if item is _STOP:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    self._write_batch(f, batch)
+                    batch = []
+                    self._flush(f)
+                    item.set()
+                elif item is _TRUNCATE:
+                    self._write_batch(f, batch)
+                    batch = []
+                    if f:
+                        f.close()
+                    f = self._open("wb")
+                elif len(batch) < self.batch_size:
+                    batch.append(item)
+                else:
+                    self._write_batch(f, batch)
+                    batch = [item]
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            self._write_batch(f, batch)
+
+            now = time.monotonic()
+            if not running or now - last_flush >= self.flush_interval:
+                self._flush(f)
+                last_flush = now
+
+        if f:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+    def _flush(self, f):
+        """Скидання буфера на диск; лише після цього рядки з'являються в індексі"""
+        if not f:
+            return
+        try:
+            f.flush()
+        except OSError:
+            return
+        index = self.index
+        for length in self._unflushed:
+            index.add(length)
+        self._unflushed = []
+
+    def _write_batch(self, f, batch):
+        if not batch:
+            return
+        text = "".join(batch)
+        self.written_lines += len(batch)
+        if f:
+            encoded = [line.encode("utf-8") for line in batch]
+            try:
+                f.write(b"".join(encoded))
+            except OSError:
+                pass
+            else:
+                unflushed = self._unflushed
+                for line in encoded:
+                    if line.count(b"\n") <= 1:
+                        unflushed.append(len(line))
+                    else:
+                        # Багаторядковий запис - індексуємо кожен рядок
+                        for part in line.split(b"\n")[:-1]:
+                            unflushed.append(len(part) + 1)
+        if self.echo and sys.stdout:
+            try:
+                sys.stdout.write(text)
+            except Exception:
+                pass
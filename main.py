@@ -5,7 +5,10 @@ import json
 import time
 import sys
 import os
+import re
 import configparser
+import shutil
+from collections import deque
 from datetime import datetime
 from tkinter import *
 from tkinter import ttk, messagebox, scrolledtext
@@ -32,61 +35,28 @@ except ImportError:
     TRAY_AVAILABLE = False
     print("Увага: pystray недоступний, функції трею вимкнено")
 
-# Імпорт модулів проекту
+from server_core import POSServerCore, VIEW_ITEM, VIEW_TOTAL, VIEW_RESET
+from log_writer import LogWriter
+from metrics import (STAGE_TITLES, DATAGRAMS, DATAGRAM_MALFORMED, DATAGRAM_TRUNCATED, DATAGRAM_DROPPED,
+                     STATUS_REJECTED, STATUS_IDLE_CLOSED)
+from receipt_archive import ReceiptArchive, KIND_TITLES
+from config_template import render_config_py, set_config_ports
+
 try:
-    from data_processor import DataProcessor
-    from receipt_formatter import ReceiptFormatter
+    import config
 except ImportError:
-    # Якщо модулі недоступні, створюємо заглушки
-    class DataProcessor:
-        def __init__(self):
-            self.json_products = {}
-            self.current_transaction_lines = []
-            self.transaction_total = 0.0
-            self.transaction_active = False
-            self.is_return_operation = False
-    
-    class ReceiptFormatter:
-        @staticmethod
-        def format_success_receipt(products, total):
-            lines = ["=== ЧЕК ==="]
-            for product in products.values():
-                lines.append(product.get('fPName', ''))
-                qty = product.get('fQtty', 0)
-                price = product.get('fPrice', 0)
-                sum_val = product.get('fSum', 0)
-                lines.append(f"{qty} x {price:.2f} = {sum_val:.2f} грн")
-            lines.append("")
-            lines.append(f"РАЗОМ: {total:.2f} грн")
-            lines.append("=== СПЛАЧЕНО ===")
-            lines.append("Дякуємо за покупку!")
-            return "\n".join(lines)
-        
-        @staticmethod
-        def format_return_receipt(products, total):
-            lines = ["=== ПОВЕРНЕННЯ ==="]
-            for product in products.values():
-                lines.append(f"ПОВЕРНУТО: {product.get('fPName', '')}")
-                lines.append(f"Сума: {product.get('fSum', 0):.2f} грн")
-            lines.append("")
-            lines.append(f"СУМА ПОВЕРНЕННЯ: {total:.2f} грн")
-            lines.append("=== ОПЕРАЦІЮ СКАСОВАНО ===")
-            return "\n".join(lines)
+    config = None
+
+# Імпорт модулів проекту
+from data_processor import DataProcessor
+from receipt_formatter import ReceiptFormatter
 
 # Глобальні змінні
-products = {}
-total = 0.0
-clients = []
-active = False
-prev_products = {}
-server_running = False
-tcp_log_file = None
-udp_socket = None
-tcp_socket = None
-cli_socket = None
-data_processor = DataProcessor()
 receipt_formatter = ReceiptFormatter()
-last_total_sent = 0.0  # Для відстеження останньої відправленої суми
+
+
+# Періоди пошуку в архіві чеків: назва -> днів (None - весь архів)
+RECEIPT_PERIODS = {"Сьогодні": 1, "7 днів": 7, "30 днів": 30, "Весь архів": None}
 
 # Налаштування за замовчуванням
 DEFAULT_CONFIG = {
@@ -106,6 +76,23 @@ class POSServerGUI:
         self.root.geometry("950x750")
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # Фоновий запис логів у файл і черга рядків для вкладки логів
+        self.log_writer = LogWriter("pos_server.log")
+        self.log_writer.start()
+        self.pending_log_lines = deque()
+        
+        # Вкладка логів тримає лише останні рядки, старіші читаються з файлу за індексом
+        self.log_view_limit = max(100, int(getattr(config, 'LOG_VIEW_MAX_LINES', 2000)))
+        self.log_ring = deque(maxlen=self.log_view_limit)
+        self.log_view_lines = 0
+        self.log_page_start = None  # None - живий режим, інакше номер першого рядка сторінки файлу
+        self.search_results = deque()
+        
+        # Архів чеків: запити з фонового потоку, запис - у ядрі сервера
+        archive_path = getattr(config, 'RECEIPT_ARCHIVE', "receipts.db")
+        self.receipt_archive = ReceiptArchive(archive_path) if archive_path else None
+        self.receipt_results = deque()
+        
         # Встановлення іконки
         try:
             self.root.iconbitmap(default='pos.ico')
@@ -120,6 +107,19 @@ class POSServerGUI:
         self.minimize_to_tray = BooleanVar(value=False)
         self.start_minimized = BooleanVar(value=False)
         
+        # Асинхронне ядро сервера (GUI лише спостерігає за його станом)
+        # Правила оплати - з config.py поруч з exe, а не з вбудованої в exe копії
+        self.server = POSServerCore(self.log, DataProcessor, receipt_formatter,
+                                    os.path.join(application_path, "config.py"))
+        
+        # Власна модель кошиків для GUI: заповнюється лише подіями з ядра
+        self.view_events = self.server.subscribe_view()
+        self.cart_models = {}   # каса -> {назва: (кількість, ціна, сума)}
+        self.cart_totals = {}   # каса -> сума
+        self.cart_units = {}    # каса -> кількість одиниць
+        self.latest_register = None
+        self.shown_register = None
+        
         # Завантаження конфігурації
         self.load_config()
         
@@ -244,6 +244,9 @@ class POSServerGUI:
         self.cart_items = StringVar(value="0")
         self.total_amount = StringVar(value="0.00 грн")
         self.connected_clients = StringVar(value="0")
+        self.registers_info = StringVar(value="0")
+        self.udp_info = StringVar(value="0")
+        self.status_peers_info = StringVar(value="0")
         
         # Використовуємо grid для кращого вирівнювання
         ttk.Label(info_frame, text="Статус:").grid(row=0, column=0, sticky=W, pady=2)
@@ -262,6 +265,15 @@ class POSServerGUI:
         ttk.Label(info_frame, text="Підключено клієнтів:").grid(row=4, column=0, sticky=W, pady=2)
         ttk.Label(info_frame, textvariable=self.connected_clients).grid(row=4, column=1, sticky=W, padx=10, pady=2)
         
+        ttk.Label(info_frame, text="Кас (активних):").grid(row=5, column=0, sticky=W, pady=2)
+        ttk.Label(info_frame, textvariable=self.registers_info).grid(row=5, column=1, sticky=W, padx=10, pady=2)
+        
+        ttk.Label(info_frame, text="UDP датаграм:").grid(row=6, column=0, sticky=W, pady=2)
+        ttk.Label(info_frame, textvariable=self.udp_info).grid(row=6, column=1, sticky=W, padx=10, pady=2)
+        
+        ttk.Label(info_frame, text="З'єднань статусів:").grid(row=7, column=0, sticky=W, pady=2)
+        ttk.Label(info_frame, textvariable=self.status_peers_info).grid(row=7, column=1, sticky=W, padx=10, pady=2)
+        
         # Вкладка логів
         log_frame = ttk.Frame(notebook)
         notebook.add(log_frame, text="📝 Логи")
@@ -276,6 +288,18 @@ class POSServerGUI:
         self.autoscroll = BooleanVar(value=True)
         ttk.Checkbutton(log_toolbar, text="Автопрокрутка", variable=self.autoscroll).pack(side=LEFT, padx=10)
         
+        # Історія з файлу логу: сторінки і пошук
+        ttk.Button(log_toolbar, text="⬆ Старіші", command=self.show_older_logs).pack(side=LEFT, padx=2)
+        ttk.Button(log_toolbar, text="⬇ Новіші", command=self.show_newer_logs).pack(side=LEFT, padx=2)
+        ttk.Button(log_toolbar, text="Наживо", command=self.show_live_logs).pack(side=LEFT, padx=2)
+        self.log_search_text = StringVar()
+        search_entry = ttk.Entry(log_toolbar, textvariable=self.log_search_text, width=20)
+        search_entry.pack(side=LEFT, padx=(10, 2))
+        search_entry.bind("<Return>", lambda e: self.search_logs())
+        ttk.Button(log_toolbar, text="Знайти", command=self.search_logs).pack(side=LEFT, padx=2)
+        self.log_position = StringVar(value="Наживо")
+        ttk.Label(log_toolbar, textvariable=self.log_position, foreground="gray").pack(side=LEFT, padx=10)
+        
         # Область логів з покращеним форматуванням
         self.log_text = scrolledtext.ScrolledText(log_frame, height=30, width=100, wrap=WORD)
         self.log_text.pack(fill=BOTH, expand=True, padx=5, pady=5)
@@ -290,389 +314,107 @@ class POSServerGUI:
         monitor_frame = ttk.Frame(notebook)
         notebook.add(monitor_frame, text="📊 Моніторинг")
         
+        # Вибір каси для відображення
+        register_frame = ttk.Frame(monitor_frame)
+        register_frame.pack(fill=X, padx=5, pady=(5, 0))
+        ttk.Label(register_frame, text="Каса:").pack(side=LEFT)
+        self.selected_register = StringVar(value="")
+        self.register_combo = ttk.Combobox(register_frame, textvariable=self.selected_register,
+                                           state="readonly", width=25)
+        self.register_combo.pack(side=LEFT, padx=5)
+        ttk.Label(register_frame, text="(порожньо - остання активна)", foreground="gray").pack(side=LEFT)
+        
         # Поточний кошик
         cart_label_frame = ttk.LabelFrame(monitor_frame, text="Поточний кошик", padding=10)
         cart_label_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
         
-        self.cart_text = scrolledtext.ScrolledText(cart_label_frame, height=15, width=80)
-        self.cart_text.pack(fill=BOTH, expand=True)
+        cart_columns = ("qty", "price", "sum")
+        self.cart_tree = ttk.Treeview(cart_label_frame, columns=cart_columns, height=12)
+        self.cart_tree.heading("#0", text="Товар")
+        self.cart_tree.column("#0", width=420, anchor=W)
+        for column, title in [("qty", "Кількість"), ("price", "Ціна"), ("sum", "Сума")]:
+            self.cart_tree.heading(column, text=title)
+            self.cart_tree.column(column, width=100, anchor=E)
+        cart_scroll = ttk.Scrollbar(cart_label_frame, orient=VERTICAL, command=self.cart_tree.yview)
+        self.cart_tree.configure(yscrollcommand=cart_scroll.set)
+        cart_scroll.pack(side=RIGHT, fill=Y)
+        self.cart_tree.pack(fill=BOTH, expand=True)
+        self.cart_total_var = StringVar(value="Кошик порожній")
+        ttk.Label(cart_label_frame, textvariable=self.cart_total_var, font=("Arial", 11, "bold")).pack(anchor=E)
+        
+        # Черги підключених клієнтів
+        clients_label_frame = ttk.LabelFrame(monitor_frame, text="Клієнти (черги відправки)", padding=10)
+        clients_label_frame.pack(fill=X, padx=5, pady=5)
+        
+        client_columns = ("addr", "register", "proto", "depth", "lag", "sent", "dropped")
+        self.clients_tree = ttk.Treeview(clients_label_frame, columns=client_columns, show="headings", height=5)
+        for column, title, width in [("addr", "Адреса", 180), ("register", "Каса", 100), ("proto", "Протокол", 80),
+                                     ("depth", "Черга", 70),
+                                     ("lag", "Затримка, мс", 100), ("sent", "Відправлено", 100),
+                                     ("dropped", "Втрачено", 80)]:
+            self.clients_tree.heading(column, text=title)
+            self.clients_tree.column(column, width=width, anchor=W if column == "addr" else E)
+        self.clients_tree.pack(fill=X)
+        
+        # Затримки етапів обробки
+        metrics_label_frame = ttk.LabelFrame(monitor_frame, text=f"Затримки обробки (останні ~{self.server.metrics.window:.0f} с), мкс",
+                                             padding=10)
+        metrics_label_frame.pack(fill=X, padx=5, pady=5)
+        
+        metric_columns = ("stage", "count", "p50", "p90", "p99", "max")
+        self.metrics_tree = ttk.Treeview(metrics_label_frame, columns=metric_columns, show="headings", height=7)
+        for column, title, width in [("stage", "Етап", 180), ("count", "К-сть", 80), ("p50", "p50", 80),
+                                     ("p90", "p90", 80), ("p99", "p99", 80), ("max", "max", 80)]:
+            self.metrics_tree.heading(column, text=title)
+            self.metrics_tree.column(column, width=width, anchor=W if column == "stage" else E)
+        self.metrics_tree.pack(fill=X)
+        ttk.Button(metrics_label_frame, text="Вивантажити метрики", command=self.dump_metrics).pack(anchor=W, pady=(5, 0))
+        
+        # Вкладка архіву чеків
+        receipts_frame = ttk.Frame(notebook)
+        notebook.add(receipts_frame, text="🧾 Чеки")
+        
+        receipt_filters = ttk.Frame(receipts_frame)
+        receipt_filters.pack(fill=X, padx=5, pady=5)
+        self.receipt_period = StringVar(value="Сьогодні")
+        self.receipt_product = StringVar()
+        self.receipt_register = StringVar()
+        self.receipt_min_total = StringVar()
+        ttk.Label(receipt_filters, text="Період:").pack(side=LEFT)
+        ttk.Combobox(receipt_filters, textvariable=self.receipt_period, state="readonly", width=10,
+                     values=list(RECEIPT_PERIODS)).pack(side=LEFT, padx=(2, 8))
+        for title, variable, width in [("Товар:", self.receipt_product, 20), ("Каса:", self.receipt_register, 12),
+                                       ("Сума від:", self.receipt_min_total, 8)]:
+            ttk.Label(receipt_filters, text=title).pack(side=LEFT)
+            entry = ttk.Entry(receipt_filters, textvariable=variable, width=width)
+            entry.pack(side=LEFT, padx=(2, 8))
+            entry.bind("<Return>", lambda e: self.search_receipts())
+        ttk.Button(receipt_filters, text="Знайти", command=self.search_receipts).pack(side=LEFT, padx=2)
+        
+        self.receipt_status = StringVar(value="")
+        ttk.Label(receipts_frame, textvariable=self.receipt_status, foreground="gray").pack(anchor=W, padx=5)
+        
+        receipt_columns = ("time", "register", "kind", "total", "items")
+        self.receipts_tree = ttk.Treeview(receipts_frame, columns=receipt_columns, show="headings", height=12)
+        for column, title, width in [("time", "Час", 160), ("register", "Каса", 120), ("kind", "Вид", 100),
+                                     ("total", "Сума", 100), ("items", "Товарів", 80)]:
+            self.receipts_tree.heading(column, text=title)
+            self.receipts_tree.column(column, width=width, anchor=E if column in ("total", "items") else W)
+        self.receipts_tree.pack(fill=BOTH, expand=True, padx=5, pady=5)
+        self.receipts_tree.bind("<<TreeviewSelect>>", lambda e: self.show_receipt())
+        
+        self.receipt_text = scrolledtext.ScrolledText(receipts_frame, height=12, width=100, wrap=WORD)
+        self.receipt_text.pack(fill=BOTH, expand=True, padx=5, pady=5)
         
         # Статус бар
         self.status_var = StringVar(value="Сервер зупинено")
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=SUNKEN)
         status_bar.pack(side=BOTTOM, fill=X)
         
-        # Запуск оновлення статусу
+        # Запуск оновлення статусу, кошика і виводу логів
         self.update_status()
-    
-    def send_to_all_clients(self, message):
-        """Відправка повідомлення всім підключеним клієнтам"""
-        global clients
-        disconnected = []
-        for client in clients:
-            try:
-                client.send(message.encode("utf-8"))
-            except:
-                disconnected.append(client)
-        
-        # Видаляємо відключені клієнти
-        for client in disconnected:
-            try:
-                clients.remove(client)
-                client.close()
-            except:
-                pass
-    
-    def format_product_update(self, action, product_name, product_data=None, old_data=None):
-        """Форматування повідомлення про зміну товару - БЕЗ ANSI КОДІВ"""
-        if action == "ADD":
-            qty = product_data.get('fQtty', 0) if product_data else 0
-            price = product_data.get('fPrice', 0) if product_data else 0
-            sum_val = product_data.get('fSum', 0) if product_data else 0
-            # Просто плюс без зайвого
-            return f"+ {product_name}  {qty}x{price:.2f} = {sum_val:.2f} грн\n"
-        
-        elif action == "REMOVE":
-            qty = old_data.get('fQtty', 0) if old_data else 0
-            price = old_data.get('fPrice', 0) if old_data else 0  
-            sum_val = old_data.get('fSum', 0) if old_data else 0
-            # Крестик вместо минуса для лучшей видимости
-            return f"❌ {product_name}  {qty}x{price:.2f} = {sum_val:.2f} грн\n"
-        
-        elif action == "UPDATE":
-            old_qty = old_data.get('fQtty', 0) if old_data else 0
-            new_qty = product_data.get('fQtty', 0) if product_data else 0
-            price = product_data.get('fPrice', 0) if product_data else 0
-            sum_val = product_data.get('fSum', 0) if product_data else 0
-            
-            if new_qty > old_qty:
-                # Збільшення кількості
-                diff = new_qty - old_qty
-                return f"+ {product_name}  +{diff} (всього: {new_qty}x{price:.2f} = {sum_val:.2f} грн)\n"
-            else:
-                # Зменшення кількості
-                diff = old_qty - new_qty
-                return f"➖ {product_name}  -{diff} (всього: {new_qty}x{price:.2f} = {sum_val:.2f} грн)\n"
-        
-        return ""
-    
-    def udp_server(self, port):
-        """UDP сервер для прийому JSON даних з правильним підрахунком кількості"""
-        global products, total, active, prev_products, udp_socket, data_processor, last_total_sent
-        
-        try:
-            udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            udp_socket.bind(("0.0.0.0", port))
-            self.log(f"UDP сервер запущено на порту {port}", "success")
-            
-            while server_running:
-                try:
-                    udp_socket.settimeout(1.0)
-                    data, addr = udp_socket.recvfrom(4096)
-                    
-                    obj = json.loads(data)
-                    cmd = obj.get("cmd", {}).get("cmd", "")
-                    
-                    if cmd == "clear":
-                        # Простіша логіка - просто перевіряємо флаг active
-                        if active:
-                            # Відправляємо скасування тільки якщо транзакція активна
-                            self.send_to_all_clients("❌ === ОПЕРАЦІЮ СКАСОВАНО ===\n\n")
-                            self.log("ТРАНЗАКЦІЮ СКАСОВАНО", "warning")
-                        else:
-                            self.log("Clear received - no active transaction", "info")
-                        
-                        # Очищаємо дані в будь-якому випадку
-                        products = {}
-                        prev_products = {}
-                        total = 0.0
-                        active = False
-                        last_total_sent = 0.0
-                        data_processor.reset_transaction()
-                    else:
-                        # Зберігаємо старий стан
-                        old_products = dict(prev_products)
-                        
-                        # Оновлюємо поточні товари з об'єднанням однакових
-                        products = {}
-                        prev_products = {}
-                        
-                        for item in obj.get("goods", []):
-                            name = item.get("fPName", "")
-                            if name:
-                                if name in products:
-                                    # Товар з такою назвою вже є - додаємо кількість і суму
-                                    products[name]['fQtty'] = products[name].get('fQtty', 0) + item.get('fQtty', 0)
-                                    products[name]['fSum'] = products[name].get('fSum', 0) + item.get('fSum', 0)
-                                else:
-                                    # Новий товар - копіюємо весь словник
-                                    products[name] = dict(item)
-                                
-                                # Те саме для prev_products
-                                if name in prev_products:
-                                    prev_products[name]['fQtty'] = prev_products[name].get('fQtty', 0) + item.get('fQtty', 0)
-                                    prev_products[name]['fSum'] = prev_products[name].get('fSum', 0) + item.get('fSum', 0)
-                                else:
-                                    prev_products[name] = dict(item)
-                        
-                        # Якщо це перший товар - початок транзакції
-                        if products and not active:
-                            self.send_to_all_clients("🛒 === ПОЧАТОК ОПЕРАЦІЇ ===\n\n")
-                            active = True
-                            last_total_sent = 0.0
-                            self.log("НОВА ТРАНЗАКЦІЯ РОЗПОЧАТА", "success")
-                        
-                        # REAL-TIME оновлення з правильною обробкою кількості
-                        if active:
-                            changes_made = False
-                            
-                            # Перевіряємо зміни в товарах
-                            for name, item in products.items():
-                                if name not in old_products:
-                                    # Новий товар додано
-                                    msg = self.format_product_update("ADD", name, item)
-                                    self.send_to_all_clients(msg)
-                                    self.log(f"+ ДОДАНО: {name}", "info")
-                                    changes_made = True
-                                    
-                                elif (old_products[name].get('fQtty') != item.get('fQtty') or
-                                      old_products[name].get('fSum') != item.get('fSum')):
-                                    # Кількість або сума змінилась
-                                    msg = self.format_product_update("UPDATE", name, item, old_products[name])
-                                    self.send_to_all_clients(msg)
-                                    self.log(f"~ ОНОВЛЕНО: {name} (кількість: {item.get('fQtty')})", "info")
-                                    changes_made = True
-                            
-                            # Перевіряємо видалені товари
-                            for name in old_products:
-                                if name not in products:
-                                    # Товар видалено
-                                    msg = self.format_product_update("REMOVE", name, None, old_products[name])
-                                    self.send_to_all_clients(msg)
-                                    self.log(f"❌ ВИДАЛЕНО: {name}", "warning")
-                                    changes_made = True
-                            
-                            # Оновлюємо загальну суму ТІЛЬКИ якщо були зміни і сума дійсно змінилась
-                            total = obj.get("sum", {}).get("sum", 0)
-                            
-                            # Відправляємо суму тільки якщо:
-                            # 1. Були зміни в товарах
-                            # 2. Сума дійсно змінилась більш ніж на 0.01
-                            if changes_made and abs(total - last_total_sent) > 0.01:
-                                self.send_to_all_clients(f"💰 СУМА: {total:.2f} грн\n" + "="*30 + "\n")
-                                last_total_sent = total
-                                self.log(f"СУМА ОНОВЛЕНА: {total:.2f} грн")
-                        
-                        if products:
-                            # Підраховуємо унікальні товари (не кількість одиниць)
-                            unique_items = len(products)
-                            total_units = sum(item.get('fQtty', 0) for item in products.values())
-                            self.log(f"КОШИК: {unique_items} товарів ({total_units} одиниць) | Сума: {total} грн")
-                            
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if server_running:
-                        self.log(f"UDP помилка: {e}", "error")
-        except Exception as e:
-            self.log(f"UDP сервер помилка: {e}", "error")
-    
-    def tcp_server(self, port):
-        """TCP сервер для прийому статусів від принтера"""
-        global products, total, clients, active, prev_products, tcp_socket, tcp_log_file, last_total_sent
-        try:
-            tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            tcp_socket.bind(("0.0.0.0", port))
-            tcp_socket.listen(5)
-            self.log(f"TCP сервер запущено на порту {port}", "success")
-            
-            # Відкриття файлу логів
-            try:
-                tcp_log_file = open("tcp_server.log", "a", buffering=1, encoding="utf-8")
-                self.log("TCP файл логів відкрито: tcp_server.log")
-            except:
-                self.log("Увага: не вдалось відкрити TCP файл логів", "warning")
-            
-            while server_running:
-                try:
-                    tcp_socket.settimeout(1.0)
-                    c, a = tcp_socket.accept()
-                    self.log(f"TCP з'єднання від {a}")
-                    threading.Thread(target=self.handle_tcp_client, args=(c, a), daemon=True).start()
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if server_running:
-                        self.log(f"TCP Accept помилка: {e}", "error")
-        except Exception as e:
-            self.log(f"TCP сервер помилка: {e}", "error")
-    
-    def handle_tcp_client(self, client_socket, addr):
-        """Обробка TCP клієнта з покращеною перевіркою оплати"""
-        global products, total, active, prev_products, tcp_log_file, receipt_formatter, last_total_sent
-        buf = b""
-        try:
-            while server_running:
-                try:
-                    client_socket.settimeout(1.0)
-                    d = client_socket.recv(1024)
-                    if not d:
-                        break
-                    buf += d
-                    
-                    # Детальне логування
-                    if tcp_log_file:
-                        tcp_log_file.write("\n" + "="*60 + "\n")
-                        tcp_log_file.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Від: {addr}\n")
-                        tcp_log_file.write(f"RAW байти ({len(d)}): {d}\n")
-                        tcp_log_file.write(f"HEX: {d.hex()}\n")
-                        
-                        # Пробуємо різні декодування
-                        for encoding in ['cp1251', 'utf-8', 'cp1252', 'iso-8859-5']:
-                            try:
-                                decoded = d.decode(encoding, errors='ignore')
-                                tcp_log_file.write(f"{encoding.upper()}: {decoded}\n")
-                            except:
-                                pass
-                        tcp_log_file.flush()
-                    
-                    # Пробуємо декодувати з різними кодуваннями
-                    text = ""
-                    for encoding in ['cp1251', 'utf-8', 'cp1252']:
-                        try:
-                            text = buf.decode(encoding, errors='ignore')
-                            break
-                        except:
-                            continue
-                    
-                    text_lower = text.lower()
-                    
-                    # ПОКРАЩЕНА ПЕРЕВІРКА УСПІШНОЇ ОПЛАТИ
-                    success_patterns = [
-                        "дякуємо за покупку",
-                        "дякуємо за покупку",  # з іншою е
-                        "дякуемо за покупку",  # без діакритики
-                        "покупку",  # часткове співпадіння
-                        "сплачено",
-                        "оплачено"
-                    ]
-                    
-                    payment_confirmed = False
-                    for pattern in success_patterns:
-                        if pattern in text_lower:
-                            payment_confirmed = True
-                            self.log(f"Патерн оплати знайдено: '{pattern}'", "info")
-                            break
-                    
-                    # Перевірка по HEX патернах
-                    hex_data = buf.hex().lower()
-                    hex_patterns = [
-                        "c4ffea",  # "Дяк" в CP1251
-                        "d0b4d18f",  # "Дя" в UTF-8
-                        "efeeea",  # "пок" в CP1251
-                    ]
-                    
-                    for hex_pattern in hex_patterns:
-                        if hex_pattern in hex_data:
-                            payment_confirmed = True
-                            self.log(f"HEX патерн оплати знайдено: {hex_pattern}", "info")
-                            break
-                    
-                    # Перевірка повернення
-                    if "повернення" in text_lower or "возврат" in text_lower:
-                        self.log("ВИЯВЛЕНО ОПЕРАЦІЮ ПОВЕРНЕННЯ", "warning")
-                        if products:
-                            msg = receipt_formatter.format_return_receipt(products, total)
-                            self.send_to_all_clients(msg)
-                            self.log(f"ПОВЕРНЕННЯ ЗАВЕРШЕНО | Сума: {total} грн", "warning")
-                        else:
-                            msg = "=== ПОВЕРНЕННЯ ===\nПовернення виконано\n=== ОПЕРАЦІЮ СКАСОВАНО ===\n"
-                            self.send_to_all_clients(msg)
-                            self.log("ПОВЕРНЕННЯ БЕЗ ТОВАРІВ", "warning")
-                        
-                        # Очищення даних
-                        products = {}
-                        prev_products = {}
-                        total = 0.0
-                        active = False
-                        last_total_sent = 0.0
-                        data_processor.reset_transaction()
-                        break
-                    
-                    # Перевірка успішної оплати
-                    elif payment_confirmed and products:
-                        self.log("ОПЛАТУ ПІДТВЕРДЖЕНО - Транзакція завершена!", "success")
-                        self.log(f"Знайдений текст: '{text[:100]}'", "info")
-                        
-                        # Відправляємо фінальний чек
-                        msg = "\n" + "="*40 + "\n"
-                        msg += receipt_formatter.format_success_receipt(products, total)
-                        msg += "\n" + "="*40 + "\n"
-                        
-                        self.send_to_all_clients(msg)
-                        self.log(f"ТРАНЗАКЦІЮ ЗАВЕРШЕНО | Сума: {total} грн", "success")
-                        
-                        # ВАЖЛИВО: Очищення даних і встановлення active = False
-                        products = {}
-                        prev_products = {}
-                        total = 0.0
-                        active = False  # КРИТИЧНО: вимикаємо флаг активності!
-                        last_total_sent = 0.0
-                        data_processor.reset_transaction()
-                        break
-                    
-                    # Логуємо, якщо не розпізнали
-                    elif len(buf) > 0:
-                        self.log(f"TCP дані не розпізнані: {text[:50]}", "warning")
-                        
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if server_running:
-                        self.log(f"TCP клієнт помилка: {e}", "error")
-                    break
-                    
-        except Exception as e:
-            self.log(f"TCP обробка помилка: {e}", "error")
-        finally:
-            client_socket.close()
-            self.log(f"TCP з'єднання закрито: {addr}")
-    
-    def client_server(self, port):
-        """TCP сервер для клієнтських підключень"""
-        global clients, cli_socket
-        try:
-            cli_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            cli_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            cli_socket.bind(("0.0.0.0", port))
-            cli_socket.listen(10)
-            self.log(f"Клієнтський сервер запущено на порту {port}", "success")
-            
-            while server_running:
-                try:
-                    cli_socket.settimeout(1.0)
-                    c, a = cli_socket.accept()
-                    self.log(f"КЛІЄНТ ПІДКЛЮЧЕНО: {a}", "info")
-                    clients.append(c)
-                    
-                    # Відправка привітального повідомлення
-                    try:
-                        welcome_msg = "🔌 === UniPro POS Server v28 ===\n"
-                        welcome_msg += "📡 Real-time оновлення увімкнено\n"
-                        welcome_msg += "⏳ Очікування транзакції...\n"
-                        welcome_msg += "="*40 + "\n"
-                        c.send(welcome_msg.encode("utf-8"))
-                    except:
-                        pass
-                        
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if server_running:
-                        self.log(f"Клієнтський сервер помилка: {e}", "error")
-        except Exception as e:
-            self.log(f"Клієнтський сервер помилка: {e}", "error")
+        self.flush_view_events()
+        self.flush_log_view()
     
     def apply_ports(self):
         """Застосування змінених портів і оновлення config.py"""
@@ -698,7 +440,7 @@ class POSServerGUI:
             messagebox.showinfo("Успіх", "Порти успішно застосовано!\nПерезапустіть сервер для застосування змін.")
             
             # Якщо сервер працює, пропонуємо перезапуск
-            if server_running:
+            if self.server.running:
                 if messagebox.askyesno("Перезапуск", "Сервер працює. Перезапустити зараз?"):
                     self.stop_server()
                     self.root.after(500, self.start_server)
@@ -709,23 +451,22 @@ class POSServerGUI:
             messagebox.showerror("Помилка", f"Не вдалось застосувати порти: {e}")
     
     def update_config_py(self, tcp_status, udp_json, tcp_client):
-        """Оновлення файлу config.py з новими портами"""
-        config_content = f'''# Мережеві налаштування
-TCP_STATUS_PORT = {tcp_status}    # TCP для статусів від принтера
-UDP_JSON_PORT = {udp_json}      # UDP для JSON даних від принтера
-TCP_CLIENT_PORT = {tcp_client}    # TCP для відправки клієнтам
-
-# Кодування
-ENCODINGS = ['utf-8', 'cp1251', 'ascii', 'latin1']
-
-# Індикатори операцій
-SUCCESS_INDICATORS = ["Дякуємо за покупку", "дякуємо за покупку", "покупку", "сплачено"]
-RETURN_INDICATORS = ["Повернення", "повернення", "Возврат", "возврат"]
-DELETE_INDICATORS = ["Видалено товар:", "видалено товар:"]
-
-# HEX патерни для надійного визначення
-SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
-'''
+        """Оновлення портів у config.py зі збереженням решти налаштувань"""
+        ports = {'TCP_STATUS_PORT': tcp_status, 'UDP_JSON_PORT': udp_json, 'TCP_CLIENT_PORT': tcp_client}
+        try:
+            if os.path.exists('config.py'):
+                with open('config.py', 'r', encoding='utf-8') as f:
+                    config_content = set_config_ports(f.read(), ports)
+                with open('config.py', 'w', encoding='utf-8') as f:
+                    f.write(config_content)
+                self.log("config.py оновлено з новими портами", "success")
+                return
+        except Exception as e:
+            self.log(f"Помилка оновлення config.py: {e}", "error")
+            return
+        
+        # config.py немає поруч з програмою: повний шаблон з коментарями і новими портами
+        config_content = render_config_py(ports)
         
         try:
             with open('config.py', 'w', encoding='utf-8') as f:
@@ -848,37 +589,42 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
     
     def update_status(self):
         """Оновлення статусу в реальному часі"""
-        global server_running, active, products, total, clients
-        
-        self.server_status.set("🟢 Працює" if server_running else "⭕ Зупинено")
-        self.active_transaction.set("Так" if active else "Ні")
+        # Лише опублікований ядром знімок: стан кас і клієнтів змінює тільки цикл ядра
+        snap = self.server.snapshot
+        
+        # Каса для відображення: вибрана в моніторингу або остання активна
+        register_ids = sorted(s.register_id for s in snap.sessions)
+        self.register_combo['values'] = [""] + register_ids
+        register_id = self.displayed_register()
+        session = next((s for s in snap.sessions if s.register_id == register_id), None)
+        active_count = sum(1 for s in snap.sessions if s.active)
+        
+        self.server_status.set("🟢 Працює" if snap.running else "⭕ Зупинено")
+        if session and len(register_ids) > 1:
+            self.active_transaction.set(f"{'Так' if session.active else 'Ні'} ({session.label})")
+        else:
+            self.active_transaction.set("Так" if session and session.active else "Ні")
+        self.registers_info.set(f"{len(register_ids)} ({active_count})")
         
-        # Правильний підрахунок товарів
-        unique_items = len(products)
-        total_units = sum(item.get('fQtty', 0) for item in products.values())
+        # Кількість товарів і сума - з моделі GUI, без обходу кошика ядра
+        unique_items = len(self.cart_models.get(register_id, {}))
+        total_units = self.cart_units.get(register_id, 0)
         self.cart_items.set(f"{unique_items} ({total_units} од.)")
         
-        self.total_amount.set(f"{total:.2f} грн")
-        self.connected_clients.set(str(len(clients)))
-        
-        # Оновлення кошика в моніторингу
-        if products:
-            cart_info = "=== ПОТОЧНИЙ КОШИК ===\n"
-            for name, item in products.items():
-                qty = item.get('fQtty', 0)
-                price = item.get('fPrice', 0)
-                sum_val = item.get('fSum', 0)
-                cart_info += f"\n{name}\n  {qty} x {price:.2f} = {sum_val:.2f} грн\n"
-            cart_info += f"\n{'='*30}\nРАЗОМ: {total:.2f} грн"
-            
-            self.cart_text.delete(1.0, END)
-            self.cart_text.insert(END, cart_info)
-        else:
-            self.cart_text.delete(1.0, END)
-            self.cart_text.insert(END, "Кошик порожній")
+        self.total_amount.set(f"{self.cart_totals.get(register_id, 0.0):.2f} грн")
+        self.connected_clients.set(str(len(snap.clients)))
+        counters = snap.counters
+        self.udp_info.set(f"{counters.get(DATAGRAMS, 0)} | некоректних: {counters.get(DATAGRAM_MALFORMED, 0)}, "
+                          f"завеликих: {counters.get(DATAGRAM_TRUNCATED, 0)}, "
+                          f"втрачено ядром: {counters.get(DATAGRAM_DROPPED, 0)}")
+        self.status_peers_info.set(f"{sum(p['open'] for p in snap.peers)} ({len(snap.peers)} адрес) | "
+                                   f"відхилено: {counters.get(STATUS_REJECTED, 0)}, "
+                                   f"за простоєм: {counters.get(STATUS_IDLE_CLOSED, 0)}")
+        self.update_clients_view(snap)
+        self.update_metrics_view(snap)
         
         # Оновлення статус бару
-        if server_running:
+        if snap.running:
             self.status_var.set(f"Сервер працює | Порти: TCP {self.tcp_status_port.get()}, "
                                f"UDP {self.udp_json_port.get()}, Клієнт {self.tcp_client_port.get()}")
         else:
@@ -887,9 +633,124 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
         # Повторний виклик через 1 секунду
         self.root.after(1000, self.update_status)
     
+    def displayed_register(self):
+        """Вибрана в моніторингу каса або та, що оновлювалась останньою"""
+        return self.selected_register.get() or self.latest_register
+    
+    def flush_view_events(self):
+        """Застосування накопичених подій кошика раз на кадр (у потоці Tk)"""
+        if self.view_events:
+            # Об'єднуємо події кадру: для кожного рядка важливий лише останній стан
+            changed = {}
+            while self.view_events:
+                event = self.view_events.popleft()
+                kind, register_id = event[0], event[1]
+                self.latest_register = register_id
+                if kind == VIEW_ITEM:
+                    self.set_cart_row(register_id, event[2], event[3])
+                    changed.setdefault(register_id, set()).add(event[2])
+                elif kind == VIEW_TOTAL:
+                    self.cart_totals[register_id] = event[2]
+                    changed.setdefault(register_id, set())
+                elif kind == VIEW_RESET:
+                    self.cart_models[register_id] = {}
+                    self.cart_totals[register_id] = 0.0
+                    self.cart_units[register_id] = 0
+                    changed[register_id] = None  # Повне перемальовування
+            
+            register_id = self.displayed_register()
+            if register_id != self.shown_register:
+                self.redraw_cart(register_id)
+            elif register_id in changed:
+                if changed[register_id] is None:
+                    self.redraw_cart(register_id)
+                else:
+                    self.update_cart_rows(register_id, changed[register_id])
+        elif self.displayed_register() != self.shown_register:
+            self.redraw_cart(self.displayed_register())
+        
+        self.root.after(50, self.flush_view_events)
+    
+    def set_cart_row(self, register_id, name, values):
+        model = self.cart_models.setdefault(register_id, {})
+        old = model.pop(name, None) if values is None else model.get(name)
+        units = self.cart_units.get(register_id, 0) - (old[0] if old else 0)
+        if values is not None:
+            model[name] = values
+            units += values[0]
+        self.cart_units[register_id] = units
+    
+    def update_cart_rows(self, register_id, names):
+        """Оновлення лише змінених рядків кошика"""
+        model = self.cart_models.get(register_id, {})
+        for name in names:
+            values = model.get(name)
+            exists = self.cart_tree.exists(name)
+            if values is None:
+                if exists:
+                    self.cart_tree.delete(name)
+            elif exists:
+                self.cart_tree.item(name, values=self.cart_row_values(values))
+            else:
+                self.cart_tree.insert("", END, iid=name, text=name, values=self.cart_row_values(values))
+        self.update_cart_total(register_id)
+    
+    def redraw_cart(self, register_id):
+        """Повне перемальовування - лише при зміні каси або очищенні кошика"""
+        self.shown_register = register_id
+        self.cart_tree.delete(*self.cart_tree.get_children())
+        for name, values in self.cart_models.get(register_id, {}).items():
+            self.cart_tree.insert("", END, iid=name, text=name, values=self.cart_row_values(values))
+        self.update_cart_total(register_id)
+    
+    @staticmethod
+    def cart_row_values(values):
+        qty, price, sum_val = values
+        return (qty, f"{price:.2f}", f"{sum_val:.2f}")
+    
+    def update_cart_total(self, register_id):
+        if self.cart_models.get(register_id):
+            self.cart_total_var.set(f"РАЗОМ: {self.cart_totals.get(register_id, 0.0):.2f} грн")
+        else:
+            self.cart_total_var.set("Кошик порожній")
+    
+    def update_clients_view(self, snap):
+        """Глибина черги і затримка кожного клієнта"""
+        self.clients_tree.delete(*self.clients_tree.get_children())
+        for stats in snap.clients:
+            addr = stats['addr']
+            addr_text = f"{addr[0]}:{addr[1]}" if isinstance(addr, tuple) else str(addr)
+            self.clients_tree.insert("", END, values=(
+                addr_text, stats['register'] or "всі",
+                stats['proto'] if stats['format'] == "text" else f"{stats['proto']} ({stats['format']})", stats['depth'], f"{stats['lag'] * 1000:.0f}", stats['sent'], stats['dropped']))
+    
+    def update_metrics_view(self, snap):
+        """Процентилі затримок етапів за свіжим вікном"""
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        for stage, stats in snap.stages.items():
+            self.metrics_tree.insert("", END, values=(
+                STAGE_TITLES[stage], stats['count'], f"{stats['p50'] * 1e6:.0f}", f"{stats['p90'] * 1e6:.0f}",
+                f"{stats['p99'] * 1e6:.0f}", f"{stats['max'] * 1e6:.0f}"))
+    
+    def dump_metrics(self):
+        """Таблиця затримок у лог і в файл metrics_dump.txt"""
+        snap = self.server.snapshot
+        table = self.server.metrics.format_table(snap.stages)
+        if snap.rules:
+            # Спрацювання правил оплати - для налаштування ознак у config.py
+            table += "\n" + "\n".join([f"{'правило':<50} {'спрацювань':>10}"] +
+                                       [f"{rule:<50} {hits:>10}" for rule, hits in snap.rules])
+        try:
+            with open('metrics_dump.txt', 'a', encoding='utf-8') as f:
+                f.write(table + "\n\n")
+            self.log("Метрики дописано в metrics_dump.txt", "success")
+        except Exception as e:
+            self.log(f"Помилка запису метрик: {e}", "error")
+        for line in table.split("\n"):
+            self.log(line)
+    
     def start_server(self):
-        global server_running
-        if server_running:
+        if self.server.running:
             self.log("Сервер вже працює", "warning")
             return
             
@@ -901,11 +762,7 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
             if not all(1024 <= p <= 65535 for p in [tcp_status, udp_json, tcp_client]):
                 raise ValueError("Порти мають бути в діапазоні 1024-65535")
             
-            threading.Thread(target=self.udp_server, args=(udp_json,), daemon=True).start()
-            threading.Thread(target=self.tcp_server, args=(tcp_status,), daemon=True).start()
-            threading.Thread(target=self.client_server, args=(tcp_client,), daemon=True).start()
-            
-            server_running = True
+            self.server.start(tcp_status, udp_json, tcp_client)
             
             self.log(f"Сервер запущено на портах: TCP {tcp_status}, UDP {udp_json}, Клієнт {tcp_client}", "success")
             
@@ -917,31 +774,7 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
             self.log(f"Помилка запуску сервера: {e}", "error")
     
     def stop_server(self):
-        global server_running, udp_socket, tcp_socket, cli_socket, tcp_log_file, clients
-        server_running = False
-        
-        for client in clients:
-            try:
-                client.close()
-            except:
-                pass
-        clients = []
-        
-        try:
-            if udp_socket:
-                udp_socket.close()
-                udp_socket = None
-            if tcp_socket:
-                tcp_socket.close()
-                tcp_socket = None
-            if cli_socket:
-                cli_socket.close()
-                cli_socket = None
-            if tcp_log_file:
-                tcp_log_file.close()
-                tcp_log_file = None
-        except:
-            pass
+        self.server.stop()
         
         self.log("Сервер зупинено", "warning")
         
@@ -949,38 +782,202 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
         self.stop_button.config(state=DISABLED)
     
     def log(self, message, tag=None):
-        """Покращене логування з тегами"""
+        """Покращене логування з тегами (можна викликати з будь-якого потоку)"""
         timestamp = datetime.now().strftime("[%H:%M:%S]")
         log_message = f"{timestamp} {message}\n"
         
-        try:
-            if hasattr(self, 'log_text') and self.log_text.winfo_exists():
-                self.log_text.insert(END, log_message, tag)
-                if self.autoscroll.get():
-                    self.log_text.see(END)
-        except:
-            pass
+        # Файл і консоль - фоновий потік, віджет - потік Tk; тут лише черги
+        self.log_writer.write(log_message)
+        self.pending_log_lines.append((log_message, tag))
+    
+    def flush_log_view(self):
+        """Пакетний вивід накопичених рядків у вкладку логів (у потоці Tk)"""
+        if self.pending_log_lines:
+            lines = []
+            while self.pending_log_lines:
+                lines.append(self.pending_log_lines.popleft())
+            self.log_ring.extend(lines)
+            # Переглядаємо історію - нові рядки лише в кільце, віджет не чіпаємо
+            if self.log_page_start is None:
+                try:
+                    self.insert_log_lines(lines[-self.log_view_limit:])
+                    self.trim_log_view()
+                    if self.autoscroll.get():
+                        self.log_text.see(END)
+                except:
+                    pass
         
+        self.root.after(100, self.flush_log_view)
+    
+    def insert_log_lines(self, lines):
+        """Сусідні рядки з однаковим тегом вставляємо одним викликом"""
+        run_tag = None
+        run = []
+        for line, tag in lines:
+            if run and tag != run_tag:
+                self.log_text.insert(END, "".join(run), run_tag)
+                run = []
+            run_tag = tag
+            run.append(line)
+            self.log_view_lines += line.count("\n")
+        if run:
+            self.log_text.insert(END, "".join(run), run_tag)
+    
+    def trim_log_view(self):
+        """Віджет логів - кільце: найстаріші рядки видаляються"""
+        excess = self.log_view_lines - self.log_view_limit
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_view_lines -= excess
+    
+    def show_live_logs(self):
+        """Повернення до живого режиму: віджет заповнюється з кільця"""
+        self.log_page_start = None
+        self.log_text.delete(1.0, END)
+        self.log_view_lines = 0
+        self.insert_log_lines(list(self.log_ring))
+        self.trim_log_view()
+        self.log_text.see(END)
+        self.log_position.set("Наживо")
+    
+    def show_log_page(self, start):
+        """Сторінка рядків файлу логу за індексом зміщень"""
+        index = self.log_writer.index
+        page = self.log_view_limit // 2
+        start = max(0, min(start, len(index) - page))
+        lines = index.read(start, page)
+        self.log_page_start = start
+        self.log_text.delete(1.0, END)
+        self.log_text.insert(END, "\n".join(lines))
+        self.log_text.see("1.0")
+        self.log_position.set(f"Файл: рядки {start + 1}-{start + len(lines)} з {len(index)}")
+    
+    def show_older_logs(self):
+        page = self.log_view_limit // 2
+        if self.log_page_start is None:
+            # Перша сторінка історії - одразу перед рядками, що вже у вікні
+            self.show_log_page(len(self.log_writer.index) - len(self.log_ring) - page)
+        else:
+            self.show_log_page(self.log_page_start - page)
+    
+    def show_newer_logs(self):
+        if self.log_page_start is None:
+            return
+        page = self.log_view_limit // 2
+        start = self.log_page_start + page
+        if start + page >= len(self.log_writer.index):
+            self.show_live_logs()
+        else:
+            self.show_log_page(start)
+    
+    def search_logs(self):
+        """Пошук у всьому файлі логу у фоновому потоці (результат - в потоці Tk)"""
+        text = self.log_search_text.get().strip()
+        if not text:
+            return
+        self.log_position.set(f"Пошук '{text}'...")
+        
+        def worker():
+            # Свіжі рядки ще в буфері запису - скидаємо, щоб пошук їх бачив
+            self.log_writer.flush()
+            index = self.log_writer.index
+            numbers = index.search(text, limit=self.log_view_limit // 2)
+            lines = [(number, (index.read(number, 1) or [""])[0]) for number in sorted(numbers)]
+            self.search_results.append((text, lines))
+        
+        threading.Thread(target=worker, name="log-search", daemon=True).start()
+        self.root.after(100, self.show_search_results)
+    
+    def show_search_results(self):
+        if not self.search_results:
+            self.root.after(100, self.show_search_results)
+            return
+        text, lines = self.search_results.popleft()
+        self.log_page_start = len(self.log_writer.index)  # Поза живим режимом
+        self.log_text.delete(1.0, END)
+        for number, line in lines:
+            self.log_text.insert(END, f"#{number + 1}: ", "info")
+            self.log_text.insert(END, line + "\n")
+        self.log_text.see(END)
+        self.log_position.set(f"Знайдено '{text}': {len(lines)} рядків (Наживо - повернутись)")
+    
+    def search_receipts(self):
+        """Запит до архіву чеків у фоновому потоці (результат - в потоці Tk)"""
+        if self.receipt_archive is None:
+            self.receipt_status.set("Архів чеків вимкнено (RECEIPT_ARCHIVE у config.py)")
+            return
         try:
-            print(log_message.strip())
-        except:
-            pass
+            min_total = float(self.receipt_min_total.get().replace(",", ".")) if self.receipt_min_total.get().strip() else None
+        except ValueError:
+            self.receipt_status.set("Некоректна сума")
+            return
+        days = RECEIPT_PERIODS.get(self.receipt_period.get())
+        start = None
+        if days is not None:
+            midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start = midnight.timestamp() - (days - 1) * 86400
+        product = self.receipt_product.get().strip()
+        register = self.receipt_register.get().strip()
+        self.receipt_status.set("Пошук...")
+        
+        def worker():
+            t0 = time.perf_counter()
+            try:
+                rows = self.receipt_archive.query(start=start, register=register, product=product,
+                                                  min_total=min_total)
+                sales = self.receipt_archive.product_sales(product, start=start, register=register) if product else []
+                error = None
+            except Exception as e:
+                rows, sales, error = [], [], e
+            self.receipt_results.append((rows, sales, error, time.perf_counter() - t0))
         
-        try:
-            with open("pos_server.log", "a", encoding="utf-8") as f:
-                f.write(log_message)
-        except:
-            pass
+        threading.Thread(target=worker, name="receipt-search", daemon=True).start()
+        self.root.after(50, self.show_receipt_results)
+    
+    def show_receipt_results(self):
+        if not self.receipt_results:
+            self.root.after(50, self.show_receipt_results)
+            return
+        rows, sales, error, elapsed = self.receipt_results.popleft()
+        self.receipts_tree.delete(*self.receipts_tree.get_children())
+        self.receipt_text.delete(1.0, END)
+        if error is not None:
+            self.receipt_status.set(f"Помилка архіву: {error}")
+            return
+        for row in rows:
+            self.receipts_tree.insert("", END, iid=str(row['id']), values=(
+                datetime.fromtimestamp(row['ts']).strftime('%Y-%m-%d %H:%M:%S'), row['register'],
+                KIND_TITLES.get(row['kind'], row['kind']), f"{row['total']:.2f}", row['items']))
+        status = f"Знайдено чеків: {len(rows)} ({elapsed * 1000:.0f} мс)"
+        if sales:
+            status += " | " + "; ".join(f"{name}: {qty:g} шт, {amount:.2f} грн" for name, _, qty, amount in sales[:5])
+        self.receipt_status.set(status)
+    
+    def show_receipt(self):
+        selection = self.receipts_tree.selection()
+        if not selection or self.receipt_archive is None:
+            return
+        receipt = self.receipt_archive.receipt(int(selection[0]))
+        self.receipt_text.delete(1.0, END)
+        if receipt:
+            self.receipt_text.insert(END, receipt['text'])
     
     def clear_logs(self):
         self.log_text.delete(1.0, END)
+        self.log_ring.clear()
+        self.log_view_lines = 0
+        self.log_page_start = None
+        self.log_position.set("Наживо")
         self.log("Логи очищено", "info")
     
     def clear_all_logs(self):
         if messagebox.askyesno("Підтвердження", "Очистити всі файли логів?"):
             self.clear_logs()
             try:
-                for log_file in ['pos_server.log', 'tcp_server.log', 'tcp_4000.log']:
+                # pos_server.log відкритий потоком запису - очищаємо через нього
+                self.log_writer.truncate()
+                self.server.clear_capture()
+                for log_file in ['tcp_server.log', 'tcp_4000.log']:
                     if os.path.exists(log_file):
                         os.remove(log_file)
                 self.log("Всі файли логів очищено", "success")
@@ -995,8 +992,13 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
         )
         if filename:
             try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(self.log_text.get(1.0, END))
+                # Повна історія - з файлу логу, а не лише видимі у вікні рядки
+                self.log_writer.flush()
+                if os.path.exists(self.log_writer.path):
+                    shutil.copyfile(self.log_writer.path, filename)
+                else:
+                    with open(filename, 'w', encoding='utf-8') as f:
+                        f.write("".join(line for line, _ in self.log_ring))
                 messagebox.showinfo("Успіх", "Логи збережено")
             except Exception as e:
                 messagebox.showerror("Помилка", f"Не вдалось зберегти логи: {e}")
@@ -1067,7 +1069,7 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
         if self.minimize_to_tray.get() and TRAY_AVAILABLE:
             self.hide_window()
         else:
-            if server_running:
+            if self.server.running:
                 if messagebox.askyesno("Підтвердження", "Сервер працює. Зупинити і вийти?"):
                     self.quit_application()
             else:
@@ -1095,6 +1097,7 @@ SUCCESS_HEX_PATTERNS = ["c4ffea", "d0b4d18f", "efeeea"]
         if self.tray_icon:
             self.tray_icon.stop()
         self.save_config()
+        self.log_writer.stop()
         self.root.quit()
         self.root.destroy()
         sys.exit(0)
@@ -1112,7 +1115,11 @@ if __name__ == "__main__":
     print("="*50)
     
     # Перевіряємо наявність необхідних файлів
-    required_files = ['config.py', 'data_processor.py', 'receipt_formatter.py']
+    required_files = ['config.py', 'data_processor.py', 'receipt_formatter.py', 'server_core.py', 'log_writer.py',
+                      'tcp_capture.py', 'metrics.py', 'metrics_http.py', 'line_items.py', 'cart_diff.py',
+                      'client_fanout.py', 'client_protocol.py', 'payment_matcher.py', 'register_session.py',
+                      'journal.py', 'receipt_archive.py', 'udp_ingest.py', 'status_peers.py', 'status_encoding.py',
+                      'config_template.py']
     for file in required_files:
         file_path = os.path.join(os.getcwd(), file)
         if os.path.exists(file_path):
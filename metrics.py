@@ -0,0 +1,151 @@
+"""Вимірювання затримок конвеєра UDP -> дисплей.
+
+Кожен етап (прийом, розбір JSON, порівняння кошика, форматування,
+розсилка, черга клієнта) пише час у гістограму з логарифмічними
+кошиками: запис - це bisect і інкремент, без списків значень.
+Процентилі рахуються по "свіжому" вікну з двох половин, що
+чергуються, тож показують останні 30-60 секунд, а не весь час роботи.
+"""
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+# Етапи конвеєра
+RECEIVE = "receive"    # сесія каси + відсіювання повторного знімка
+DECODE = "decode"      # розбір JSON у CartSnapshot
+DIFF = "diff"          # CartDiff.apply
+FORMAT = "format"      # format_product_update / ReceiptFormatter
+FANOUT = "fanout"      # кодування і постановка в черги клієнтів
+TOTAL = "total"        # вся обробка датаграми
+QUEUE = "queue"        # від постановки в чергу до запису в сокет клієнта
+STAGES = (RECEIVE, DECODE, DIFF, FORMAT, FANOUT, TOTAL, QUEUE)
+
+STAGE_TITLES = {
+    RECEIVE: "Прийом",
+    DECODE: "Розбір JSON",
+    DIFF: "Зміни кошика",
+    FORMAT: "Форматування",
+    FANOUT: "Розсилка",
+    TOTAL: "Датаграма (всього)",
+    QUEUE: "Черга клієнта",
+}
+
+# Лічильники (монотонні, для експорту)
+DATAGRAMS = "udp_datagrams"          # прийнято UDP датаграм
+DATAGRAM_BYTES = "udp_bytes"         # байтів UDP
+DATAGRAM_ERRORS = "udp_errors"       # датаграм з помилкою обробки
+DATAGRAM_MALFORMED = "udp_malformed"  # датаграм з некоректним JSON
+DATAGRAM_TRUNCATED = "udp_truncated"  # датаграм, більших за UDP_MAX_DATAGRAM (не розбираються)
+DATAGRAM_DROPPED = "udp_dropped"      # відкинуто ядром через переповнений буфер (Linux)
+STATUS_BYTES = "status_bytes"        # байтів статусів принтера (TCP)
+STATUS_CONNECTIONS = "status_connections"  # прийнято з'єднань на порту статусів
+STATUS_REJECTED = "status_rejected"  # з'єднань понад ліміт (закрито одразу)
+STATUS_IDLE_CLOSED = "status_idle_closed"  # з'єднань, закритих за простоєм
+UPDATE_FLUSHES = "update_flushes"    # розсилок змін кошика (закритих вікон об'єднання)
+UPDATES_COALESCED = "updates_coalesced"  # датаграм зі змінами, що потрапили у вже відкрите вікно
+COUNTERS = (DATAGRAMS, DATAGRAM_BYTES, DATAGRAM_ERRORS, DATAGRAM_MALFORMED, DATAGRAM_TRUNCATED, DATAGRAM_DROPPED,
+            STATUS_BYTES, STATUS_CONNECTIONS, STATUS_REJECTED, STATUS_IDLE_CLOSED, UPDATE_FLUSHES, UPDATES_COALESCED)
+
+# Межі кошиків у секундах: 4 на октаву, від 1 мкс до ~30 с
+BUCKETS_PER_OCTAVE = 4
+BUCKET_BOUNDS = [2 ** (i / BUCKETS_PER_OCTAVE) * 1e-6 for i in range(BUCKETS_PER_OCTAVE * 25)]
+
+
+class LatencyHistogram:
+    """Гістограма затримок: накопичена за весь час і свіже вікно"""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        size = len(BUCKET_BOUNDS) + 1
+        self.counts = [0] * size  # за весь час (для експорту)
+        self.count = 0
+        self.sum = 0.0
+        self._current = [0] * size
+        self._previous = [0] * size
+        self._current_max = 0.0
+        self._previous_max = 0.0
+        self._rotate_at = time.monotonic() + window / 2
+
+    def observe(self, seconds):
+        index = bisect_left(BUCKET_BOUNDS, seconds)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+        now = time.monotonic()
+        if now >= self._rotate_at:
+            self._rotate(now)
+        self._current[index] += 1
+        if seconds > self._current_max:
+            self._current_max = seconds
+
+    def _rotate(self, now):
+        half = self.window / 2
+        if now - self._rotate_at >= half:
+            # Даних не було більше половини вікна - обидві половини застаріли
+            self._previous = [0] * len(self.counts)
+            self._previous_max = 0.0
+        else:
+            self._previous = self._current
+            self._previous_max = self._current_max
+        self._current = [0] * len(self.counts)
+        self._current_max = 0.0
+        self._rotate_at = now + half
+
+    def recent(self):
+        """Кількість, процентилі (с) і максимум по свіжому вікну"""
+        if time.monotonic() >= self._rotate_at:
+            # Читання з іншого потоку: лише дивимось, ротацію робить observe
+            if time.monotonic() - self._rotate_at >= self.window / 2:
+                return {"count": 0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+            merged = list(self._current)
+            top = self._current_max
+        else:
+            merged = [a + b for a, b in zip(self._current, self._previous)]
+            top = max(self._current_max, self._previous_max)
+        total = sum(merged)
+        result = {"count": total, "max": top}
+        for name, p in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99)):
+            result[name] = min(self._quantile(merged, total, p), top)
+        return result
+
+    @staticmethod
+    def _quantile(counts, total, p):
+        """Верхня межа кошика, в який потрапляє процентиль"""
+        if not total:
+            return 0.0
+        rank = p * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else float("inf")
+        return float("inf")
+
+
+class PipelineMetrics:
+    """Гістограми всіх етапів конвеєра"""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self.stages = {stage: LatencyHistogram(window) for stage in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def recent(self):
+        return {stage: histogram.recent() for stage, histogram in self.stages.items()}
+
+    def format_table(self, recent=None):
+        """Текстова таблиця свіжих процентилів (мкс) для логу або файлу; recent - готовий знімок"""
+        lines = [f"Затримки конвеєра за останні ~{self.window:.0f} с, мкс "
+                 f"({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})",
+                 f"{'етап':<20} {'к-сть':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"]
+        for stage, stats in (recent or self.recent()).items():
+            lines.append(f"{STAGE_TITLES[stage]:<20} {stats['count']:>8} {stats['p50'] * 1e6:>9.0f} "
+                         f"{stats['p90'] * 1e6:>9.0f} {stats['p99'] * 1e6:>9.0f} {stats['max'] * 1e6:>9.0f}")
+        return "\n".join(lines)
@@ -0,0 +1,196 @@
+"""HTTP ендпоінт моніторингу для збору метрик без відкриття GUI.
+
+Працює в тому ж циклі asyncio, що й ядро сервера: відповідь будується
+зі стану ядра без блокувань і без окремого потоку.
+
+    GET /metrics  - текстовий формат Prometheus
+    GET /health   - JSON зі станом сервера
+"""
+import asyncio
+import json
+import time
+
+from metrics import (BUCKET_BOUNDS, BUCKETS_PER_OCTAVE, STAGES, DATAGRAMS, DATAGRAM_BYTES, DATAGRAM_ERRORS,
+                     DATAGRAM_MALFORMED, DATAGRAM_TRUNCATED, DATAGRAM_DROPPED, STATUS_BYTES, STATUS_CONNECTIONS,
+                     STATUS_REJECTED, STATUS_IDLE_CLOSED, UPDATE_FLUSHES, UPDATES_COALESCED)
+
+# Межі кошиків гістограм в експорті: по одній на октаву, щоб не роздувати відповідь
+EXPORT_BUCKETS = list(range(BUCKETS_PER_OCTAVE - 1, len(BUCKET_BOUNDS), BUCKETS_PER_OCTAVE))
+
+MAX_REQUEST_HEAD = 8192
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _peer(addr):
+    if isinstance(addr, tuple):
+        return f"{addr[0]}:{addr[1]}"
+    return str(addr)
+
+
+def render_prometheus(core):
+    """Всі лічильники ядра у текстовому форматі Prometheus"""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+            else:
+                lines.append(f"{name} {value}")
+
+    counters = core.metrics.counters
+    fanout = core.fanout
+    sessions = list(core.sessions)
+    clients = fanout.stats()
+    peers = core.status_peers.stats()
+
+    metric("unipro_up", "gauge", "Server is running", [(None, int(core.running))])
+    metric("unipro_uptime_seconds", "gauge", "Seconds since server start",
+           [(None, f"{time.time() - core.started_at:.1f}" if core.started_at else 0)])
+    metric("unipro_udp_datagrams_total", "counter", "UDP cart datagrams received", [(None, counters[DATAGRAMS])])
+    metric("unipro_udp_bytes_total", "counter", "UDP cart bytes received", [(None, counters[DATAGRAM_BYTES])])
+    metric("unipro_udp_errors_total", "counter", "UDP datagrams that failed processing",
+           [(None, counters[DATAGRAM_ERRORS])])
+    metric("unipro_udp_malformed_total", "counter", "UDP datagrams with invalid JSON",
+           [(None, counters[DATAGRAM_MALFORMED])])
+    metric("unipro_udp_truncated_total", "counter", "UDP datagrams larger than the configured maximum",
+           [(None, counters[DATAGRAM_TRUNCATED])])
+    metric("unipro_udp_dropped_total", "counter", "UDP datagrams dropped by the kernel on buffer overflow",
+           [(None, counters[DATAGRAM_DROPPED])])
+    metric("unipro_status_bytes_total", "counter", "Printer status bytes received over TCP",
+           [(None, counters[STATUS_BYTES])])
+    metric("unipro_status_connections_total", "counter", "Printer status connections accepted",
+           [(None, counters[STATUS_CONNECTIONS])])
+    metric("unipro_status_rejected_total", "counter", "Printer status connections over the limit",
+           [(None, counters[STATUS_REJECTED])])
+    metric("unipro_status_idle_closed_total", "counter", "Printer status connections closed as idle",
+           [(None, counters[STATUS_IDLE_CLOSED])])
+    metric("unipro_status_connections", "gauge", "Open printer status connections",
+           [(None, core.status_peers.open)])
+    metric("unipro_status_peer_connections", "gauge", "Open printer status connections per peer",
+           [({"peer": p['host']}, p['open']) for p in peers])
+    metric("unipro_status_peer_bytes_total", "counter", "Printer status bytes per peer",
+           [({"peer": p['host']}, p['bytes']) for p in peers])
+    metric("unipro_status_peer_rejected_total", "counter", "Rejected printer status connections per peer",
+           [({"peer": p['host']}, p['rejected']) for p in peers])
+    metric("unipro_payment_rule_hits_total", "counter", "Printer status chunks matched by a payment/return rule",
+           [({"rule": rule}, hits) for rule, hits in core.rules.stats()])
+    metric("unipro_cart_update_flushes_total", "counter", "Coalesced cart updates sent to clients",
+           [(None, counters[UPDATE_FLUSHES])])
+    metric("unipro_cart_updates_coalesced_total", "counter", "Cart datagrams merged into a pending update",
+           [(None, counters[UPDATES_COALESCED])])
+    metric("unipro_client_messages_sent_total", "counter", "Messages written to display clients",
+           [(None, fanout.sent_total)])
+    metric("unipro_client_bytes_sent_total", "counter", "Bytes written to display clients",
+           [(None, fanout.sent_bytes_total)])
+    metric("unipro_client_dropped_total", "counter", "Incremental messages dropped for slow clients",
+           [(None, fanout.dropped_total)])
+    metric("unipro_client_slow_disconnects_total", "counter", "Clients disconnected for queue overflow",
+           [(None, fanout.disconnected_slow)])
+    metric("unipro_clients", "gauge", "Connected display clients", [(None, len(clients))])
+    metric("unipro_client_queue_depth", "gauge", "Messages waiting in a client queue",
+           [({"client": _peer(c['addr']), "register": c['register'] or "*"}, c['depth']) for c in clients])
+    metric("unipro_client_queue_lag_seconds", "gauge", "Age of the oldest queued message",
+           [({"client": _peer(c['addr']), "register": c['register'] or "*"}, f"{c['lag']:.6f}") for c in clients])
+
+    metric("unipro_transactions_completed_total", "counter", "Completed sales",
+           [({"register": s.register_id}, s.completed) for s in sessions])
+    metric("unipro_transactions_returned_total", "counter", "Returns",
+           [({"register": s.register_id}, s.returns) for s in sessions])
+    metric("unipro_transactions_cancelled_total", "counter", "Cancelled transactions",
+           [({"register": s.register_id}, s.cancelled) for s in sessions])
+    metric("unipro_transaction_active", "gauge", "Transaction in progress",
+           [({"register": s.register_id}, int(s.active)) for s in sessions])
+    metric("unipro_cart_items", "gauge", "Distinct items in the current cart",
+           [({"register": s.register_id}, len(s.products)) for s in sessions])
+
+    # Гістограми етапів: накопичені кошики за весь час роботи
+    name = "unipro_stage_latency_seconds"
+    lines.append(f"# HELP {name} Processing latency per pipeline stage")
+    lines.append(f"# TYPE {name} histogram")
+    for stage in STAGES:
+        histogram = core.metrics.stages[stage]
+        counts = list(histogram.counts)
+        cumulative = 0
+        previous = 0
+        for index in EXPORT_BUCKETS:
+            cumulative += sum(counts[previous:index + 1])
+            previous = index + 1
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{BUCKET_BOUNDS[index]:.6g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {sum(counts)}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {sum(counts)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def render_health(core):
+    sessions = list(core.sessions)
+    return json.dumps({
+        "status": "ok" if core.running else "stopped",
+        "uptime": round(time.time() - core.started_at, 1) if core.started_at else 0,
+        "registers": len(sessions),
+        "active_transactions": sum(1 for s in sessions if s.active),
+        "clients": len(core.fanout.clients),
+        "status_connections": core.status_peers.open,
+    }, ensure_ascii=False)
+
+
+class MetricsHTTPServer:
+    """Мінімальний HTTP/1.0 сервер: лише GET і HEAD, з'єднання закривається після відповіді"""
+
+    def __init__(self, core):
+        self.core = core
+        self.server = None
+        self.requests = 0
+
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self._handle, host, port, reuse_address=True)
+
+    async def stop(self):
+        if self.server is None:
+            return
+        self.server.close()
+        try:
+            await asyncio.wait_for(self.server.wait_closed(), 1.0)
+        except Exception:
+            pass
+        self.server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5.0)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        self.requests += 1
+        parts = head[:MAX_REQUEST_HEAD].split(b"\r\n", 1)[0].decode("latin-1").split()
+        method = parts[0] if parts else ""
+        path = parts[1].split("?", 1)[0] if len(parts) > 1 else ""
+
+        if method not in ("GET", "HEAD"):
+            status, content_type, body = "405 Method Not Allowed", "text/plain", "method not allowed\n"
+        elif path == "/metrics":
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4", render_prometheus(self.core)
+        elif path == "/health":
+            status = "200 OK" if self.core.running else "503 Service Unavailable"
+            content_type, body = "application/json", render_health(self.core)
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+
+        payload = body.encode("utf-8")
+        header = (f"HTTP/1.0 {status}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                  f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n").encode("ascii")
+        try:
+            writer.write(header if method == "HEAD" else header + payload)
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,328 @@
+"""Потоковий пошук ознак оплати і повернення в статусах принтера.
+
+Замість накопичення всього потоку, повторного декодування і buf.hex()
+на кожен шматок - один прохід по байтах автоматом Aho-Corasick.
+Шаблони шукаються одразу як послідовності байтів у cp1251 і UTF-8
+без урахування регістру (кожен символ - обидва регістри в своєму
+кодуванні, тож і "Дякуємо За Покупку"), стан автомата переноситься
+між шматками, тому шаблон, розірваний межею recv(), теж знаходиться.
+Час обробки - константа на байт незалежно від довжини потоку.
+
+Правила беруться з config.py (RuleEngine):
+    SUCCESS_INDICATORS, RETURN_INDICATORS - текстові ознаки;
+    ENCODINGS                             - кодування для байтових шаблонів;
+    PAYMENT_HEX_PATTERNS                  - [(тип, "hex")] сирі байти;
+    PAYMENT_REGEX_RULES                   - [(тип, r"regex")] без урахування
+        регістру, по останніх TAIL_SIZE байтах, декодованих кожним кодуванням.
+Правила компілюються один раз; після зміни config.py - заново, без
+перезапуску (нові з'єднання отримують нові правила). Для кожного
+правила рахуються спрацювання.
+"""
+import re
+from collections import deque
+
+SUCCESS = "success"
+RETURN = "return"
+KINDS = (SUCCESS, RETURN)
+
+# Текстові ознаки операцій, якщо їх немає в config.py
+SUCCESS_PATTERNS = [
+    "дякуємо за покупку",
+    "дякуемо за покупку",  # без діакритики
+]
+RETURN_PATTERNS = ["повернення", "возврат"]
+
+PATTERN_ENCODINGS = ("cp1251", "utf-8")
+
+# Скільки останніх байтів потоку тримаємо для логів
+TAIL_SIZE = 256
+
+
+def char_variants(char, encoding):
+    """Байти символу в кодуванні в обох регістрах (відсортовані, без повторів)"""
+    variants = [char.encode(encoding)]
+    for variant in (char.lower(), char.upper()):
+        if len(variant) != 1:
+            continue
+        try:
+            data = variant.encode(encoding)
+        except UnicodeEncodeError:
+            continue
+        if data not in variants:
+            variants.append(data)
+    return tuple(sorted(variants))
+
+
+def build_patterns(success=SUCCESS_PATTERNS, returns=RETURN_PATTERNS, hex_patterns=(), encodings=PATTERN_ENCODINGS):
+    """Список (тип, мітка, (кодування, символи), правило) для всіх кодувань
+
+    Символи - кортеж варіантів байтів кожного символу (обидва регістри);
+    для HEX шаблонів кодування None, а кожен байт - окремий символ.
+    Правило - ключ лічильника спрацювань: кодування однієї ознаки
+    рахуються разом.
+    """
+    patterns = []
+    for kind, texts in ((SUCCESS, success), (RETURN, returns)):
+        for text in texts:
+            rule = f"{kind}: '{text.lower()}'"
+            for encoding in encodings:
+                try:
+                    symbols = tuple(char_variants(char, encoding) for char in text)
+                except (UnicodeEncodeError, LookupError):
+                    continue
+                patterns.append((kind, f"'{text}' ({encoding})", (encoding, symbols), rule))
+    for kind, hex_pattern in hex_patterns:
+        label = f"HEX {hex_pattern}"
+        symbols = tuple((bytes([byte]),) for byte in bytes.fromhex(hex_pattern))
+        patterns.append((kind, label, (None, symbols), f"{kind}: {label}"))
+    return patterns
+
+
+def build_automaton(patterns):
+    """Таблиця DFA Aho-Corasick і виходи станів для [(номер, символи)] одного кодування
+
+    Усі варіанти регістру символу ведуть у той самий стан, тож стан - це
+    префікс шаблону без урахування регістру, і "Дякуємо За Покупку"
+    знаходиться так само, як "дякуємо за покупку". Багатобайтні символи
+    (UTF-8) проходять через проміжні стани. ValueError - варіанти
+    символів конфліктують (кодування з неоднозначним розбором байтів).
+    """
+    goto = [{}]
+    outputs = [[]]
+    nodes = {(): 0}  # префікс (символи без регістру) -> стан
+    for index, symbols in patterns:
+        state = 0
+        prefix = ()
+        for variants in symbols:
+            prefix += (min(variants),)
+            target = nodes.get(prefix)
+            for data in variants:
+                current = state
+                for position, byte in enumerate(data):
+                    last = position == len(data) - 1
+                    nxt = goto[current].get(byte)
+                    if nxt is None:
+                        if last and target is not None:
+                            nxt = target
+                        else:
+                            nxt = len(goto)
+                            goto.append({})
+                            outputs.append([])
+                        goto[current][byte] = nxt
+                    current = nxt
+                if target is None:
+                    target = nodes[prefix] = current
+                elif current != target:
+                    raise ValueError(f"неоднозначні варіанти регістру байтів {data.hex()}")
+            state = target
+        outputs[state].append(index)
+
+    # Суфіксні посилання (BFS) і повна таблиця переходів DFA.
+    # Стан може мати кілька вхідних байтів (регістри) - обробляється один раз.
+    size = len(goto)
+    fail = [0] * size
+    table = [0] * (size * 256)
+    queued = [False] * size
+    queue = deque()
+    for byte, nxt in goto[0].items():
+        table[byte] = nxt
+        if not queued[nxt]:
+            queued[nxt] = True
+            queue.append(nxt)
+    while queue:
+        state = queue.popleft()
+        outputs[state].extend(outputs[fail[state]])
+        base = state << 8
+        fail_base = fail[state] << 8
+        for byte in range(256):
+            nxt = goto[state].get(byte)
+            if nxt is None:
+                table[base | byte] = table[fail_base | byte]
+            else:
+                table[base | byte] = nxt
+                if not queued[nxt]:
+                    queued[nxt] = True
+                    fail[nxt] = table[fail_base | byte]
+                    queue.append(nxt)
+    return table, [tuple(out) if out else None for out in outputs]
+
+
+def combine_automata(automata):
+    """Один DFA з кількох, що йдуть паралельно по тих самих байтах
+
+    Стан - кортеж станів окремих автоматів (лише досяжні), виходи -
+    об'єднання їх виходів; на байт лишається один перехід по таблиці.
+    """
+    if not automata:
+        return [0] * 256, [None]
+    if len(automata) == 1:
+        return automata[0]
+    start = (0,) * len(automata)
+    numbers = {start: 0}
+    order = [start]
+    table = []
+    outputs = []
+    for current in order:  # order доповнюється під час обходу
+        out = []
+        for (_, sub_outputs), sub in zip(automata, current):
+            out.extend(sub_outputs[sub] or ())
+        outputs.append(tuple(out) if out else None)
+        steps = [(sub_table, sub << 8) for (sub_table, _), sub in zip(automata, current)]
+        for byte in range(256):
+            nxt = tuple([sub_table[base | byte] for sub_table, base in steps])
+            number = numbers.get(nxt)
+            if number is None:
+                number = numbers[nxt] = len(order)
+                order.append(nxt)
+            table.append(number)
+    return table, outputs
+
+
+def build_regexes(rules):
+    """[(тип, r"regex")] -> список (тип, мітка, скомпільований regex, правило)"""
+    regexes = []
+    for kind, pattern in rules:
+        label = f"/{pattern}/"
+        regexes.append((kind, label, re.compile(pattern, re.IGNORECASE), f"{kind}: {label}"))
+    return regexes
+
+
+class PaymentPatterns:
+    """Скомпільований автомат Aho-Corasick (спільний для всіх з'єднань, незмінний)
+
+    hits - лічильники спрацювань за правилами (спільні для всіх
+    з'єднань і переживають перекомпіляцію в RuleEngine).
+    """
+
+    def __init__(self, patterns, regexes=(), encodings=PATTERN_ENCODINGS, hits=None):
+        self.patterns = []
+        seen = set()
+        groups = {}  # кодування -> [(номер, символи)]
+        for kind, label, (encoding, symbols), rule in patterns:
+            # Ті самі байти без урахування регістру (і ASCII в різних кодуваннях) - один шаблон
+            if symbols and (kind, symbols) not in seen:
+                seen.add((kind, symbols))
+                groups.setdefault(encoding, []).append((len(self.patterns), symbols))
+                self.patterns.append((kind, label, symbols, rule))
+
+        # Регулярні вирази - після байтових шаблонів, у спільній нумерації
+        self.regexes = []
+        for kind, label, regex, rule in regexes:
+            self.regexes.append((len(self.patterns), regex))
+            self.patterns.append((kind, label, None, rule))
+        self.encodings = tuple(encodings)
+
+        self.rules = list(dict.fromkeys(pattern[3] for pattern in self.patterns))
+        self.hits = {} if hits is None else hits
+        for rule in self.rules:
+            self.hits.setdefault(rule, 0)
+
+        # Окремий автомат на кодування (регістр розгортається по-своєму
+        # в кожному), далі - один спільний DFA
+        self.table, self.outputs = combine_automata([build_automaton(group) for group in groups.values()])
+
+    def matcher(self):
+        return StreamMatcher(self)
+
+
+class StreamMatcher:
+    """Стан пошуку для одного TCP з'єднання принтера"""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.state = 0
+        self.found = {}  # тип -> мітка першого знайденого шаблону
+        self.tail = b""
+        self.total_bytes = 0
+
+    def feed(self, data):
+        """Обробка нового шматка; повертає (тип, мітка) шаблонів, знайдених у ньому"""
+        table = self.compiled.table
+        outputs = self.compiled.outputs
+        state = self.state
+        hits = None
+        for byte in data:
+            state = table[(state << 8) | byte]
+            if outputs[state] is not None:
+                if hits is None:
+                    hits = []
+                hits.extend(outputs[state])
+        self.state = state
+        self.total_bytes += len(data)
+        previous = self.tail
+        self.tail = (previous + data)[-TAIL_SIZE:]
+
+        if self.compiled.regexes:
+            hits = self._search_regexes(previous, data, hits)
+
+        new = []
+        if hits:
+            rule_hits = self.compiled.hits
+            for index in dict.fromkeys(hits):
+                kind, label, _, rule = self.compiled.patterns[index]
+                # Правило могло зникнути після перезавантаження, поки з'єднання відкрите
+                rule_hits[rule] = rule_hits.get(rule, 0) + 1
+                if kind not in self.found:
+                    self.found[kind] = label
+                new.append((kind, label))
+        return new
+
+    def _search_regexes(self, previous, data, hits):
+        """Regex правила по хвосту потоку; рахуються лише збіги, що закінчуються в новому шматку"""
+        for encoding in self.compiled.encodings:
+            try:
+                skip = len(previous.decode(encoding, errors="ignore"))
+                text = (previous + data).decode(encoding, errors="ignore")
+            except LookupError:
+                continue
+            for index, regex in self.compiled.regexes:
+                if any(match.end() > skip for match in regex.finditer(text)):
+                    if hits is None:
+                        hits = []
+                    hits.append(index)
+        return hits
+
+    def has(self, kind):
+        return kind in self.found
+
+    def tail_text(self, encoding="cp1251"):
+        return self.tail.decode(encoding, errors="ignore")
+
+
+class RuleEngine:
+    """Поточні правила з config.py і лічильники їх спрацювань"""
+
+    def __init__(self):
+        self.hits = {}
+        self.compiled = PaymentPatterns(build_patterns(), hits=self.hits)
+        self.version = 0
+
+    def load(self, config):
+        """Компіляція правил з модуля config; ValueError/re.error - правила не змінено"""
+        success = list(getattr(config, 'SUCCESS_INDICATORS', SUCCESS_PATTERNS))
+        returns = list(getattr(config, 'RETURN_INDICATORS', RETURN_PATTERNS))
+        encodings = tuple(getattr(config, 'ENCODINGS', PATTERN_ENCODINGS))
+        hex_patterns = list(getattr(config, 'PAYMENT_HEX_PATTERNS', []))
+        regex_rules = list(getattr(config, 'PAYMENT_REGEX_RULES', []))
+        for kind, _ in hex_patterns + regex_rules:
+            if kind not in KINDS:
+                raise ValueError(f"невідомий тип правила '{kind}' (можливі: {', '.join(KINDS)})")
+
+        compiled = PaymentPatterns(build_patterns(success, returns, hex_patterns, encodings),
+                                   build_regexes(regex_rules), encodings, self.hits)
+        # Лічильники лишаються лише для чинних правил
+        for rule in set(self.hits) - set(compiled.rules):
+            del self.hits[rule]
+        self.compiled = compiled
+        self.version += 1
+        return compiled
+
+    def matcher(self):
+        return self.compiled.matcher()
+
+    def stats(self):
+        """[(правило, спрацювань)] у порядку правил"""
+        return [(rule, self.hits[rule]) for rule in self.compiled.rules]
+
+
+DEFAULT_PATTERNS = PaymentPatterns(build_patterns())
@@ -0,0 +1,248 @@
+"""Архів чеків у SQLite з індексами для швидкого пошуку.
+
+Кожен чек продажу і повернення (текст з ReceiptFormatter, рядки
+кошика, сума, каса, час) зберігається в базі. Цикл подій лише кладе
+чек у чергу; окремий потік пише накопичене однією транзакцією.
+
+Індекси покривають типові запити по місяцях даних:
+    - за часом:            receipts(ts)
+    - каса + час:          receipts(register, ts)
+    - сума:                receipts(total, ts)
+    - товар + час:         receipt_items(name_key, ts)
+name_key - назва в casefold (SQLite lower() не знає кирилиці), пошук
+товару - за префіксом назви, тож використовує індекс.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from receipt_formatter import KIND_SALE, KIND_RETURN
+
+KIND_TITLES = {KIND_SALE: "Продаж", KIND_RETURN: "Повернення"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    register TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    total REAL NOT NULL,
+    items INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS receipts_ts ON receipts(ts);
+CREATE INDEX IF NOT EXISTS receipts_register_ts ON receipts(register, ts);
+CREATE INDEX IF NOT EXISTS receipts_total_ts ON receipts(total, ts);
+CREATE TABLE IF NOT EXISTS receipt_items (
+    receipt_id INTEGER NOT NULL REFERENCES receipts(id),
+    ts REAL NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    qty REAL NOT NULL,
+    price REAL NOT NULL,
+    sum REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS receipt_items_name_ts ON receipt_items(name_key, ts);
+CREATE INDEX IF NOT EXISTS receipt_items_receipt ON receipt_items(receipt_id);
+"""
+
+# Верхня межа для пошуку за префіксом: name_key >= key AND name_key < key + MAX_CHAR
+MAX_CHAR = "\U0010ffff"
+
+_STOP = object()
+
+
+def name_key(name):
+    return str(name).strip().casefold()
+
+
+class ReceiptArchive:
+    """Архів чеків: фоновий запис і запити (з будь-якого потоку)"""
+
+    def __init__(self, path, batch_interval=0.2):
+        self.path = path
+        self.batch_interval = batch_interval
+        self.written = 0
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def ensure_schema(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    # ------------------------------------------------------------------
+    # Запис
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.ensure_schema()
+        self._thread = threading.Thread(target=self._run, name="receipt-archive", daemon=True)
+        self._thread.start()
+
+    def add(self, register_id, kind, products, total, text, ts=None):
+        """Чек у чергу запису; products - {назва: LineItem}. Виклик не блокує"""
+        items = [(item.name, item.qty, item.price, item.sum) for item in products.values()]
+        self._queue.put((time.time() if ts is None else ts, str(register_id), kind, total, items, text))
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        try:
+            connection = self._connect()
+        except sqlite3.Error as e:
+            self.error = e
+            return
+        running = True
+        while running:
+            item = self._queue.get()
+            batch = []
+            while True:
+                if item is _STOP:
+                    running = False
+                    break
+                batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(connection, batch)
+                if self.batch_interval and running:
+                    time.sleep(self.batch_interval)
+        connection.close()
+
+    def _write(self, connection, batch):
+        try:
+            with connection:
+                for ts, register_id, kind, total, items, text in batch:
+                    cursor = connection.execute(
+                        "INSERT INTO receipts (ts, register, kind, total, items, text) VALUES (?, ?, ?, ?, ?, ?)",
+                        (ts, register_id, kind, total, len(items), text))
+                    receipt_id = cursor.lastrowid
+                    connection.executemany(
+                        "INSERT INTO receipt_items (receipt_id, ts, name, name_key, qty, price, sum) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(receipt_id, ts, name, name_key(name), qty, price, amount)
+                         for name, qty, price, amount in items])
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.error = e
+
+    # ------------------------------------------------------------------
+    # Запити
+    # ------------------------------------------------------------------
+
+    def query(self, start=None, end=None, register=None, product=None, min_total=None, max_total=None,
+              kind=None, limit=500):
+        """Чеки за фільтрами, новіші першими
+
+        start/end - час (epoch, с), product - префікс назви товару без
+        урахування регістру. Рядок результату - dict без тексту чека.
+        """
+        where, params = self._receipt_filters(start, end, register, min_total, max_total, kind)
+        if product:
+            key = name_key(product)
+            item_where = ["name_key >= ?", "name_key < ?"]
+            item_params = [key, key + MAX_CHAR]
+            if start is not None:
+                item_where.append("ts >= ?")
+                item_params.append(start)
+            if end is not None:
+                item_where.append("ts < ?")
+                item_params.append(end)
+            where.append(f"id IN (SELECT receipt_id FROM receipt_items WHERE {' AND '.join(item_where)})")
+            params.extend(item_params)
+        sql = "SELECT id, ts, register, kind, total, items FROM receipts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+        return [dict(id=row[0], ts=row[1], register=row[2], kind=row[3], total=row[4], items=row[5])
+                for row in self._fetch(sql, params)]
+
+    def product_sales(self, product, start=None, end=None, register=None, kind=KIND_SALE):
+        """Підсумок по товарах з префіксом назви: [(назва, чеків, кількість, сума)]"""
+        key = name_key(product)
+        where = ["i.name_key >= ?", "i.name_key < ?"]
+        params = [key, key + MAX_CHAR]
+        if start is not None:
+            where.append("i.ts >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("i.ts < ?")
+            params.append(end)
+        if register:
+            where.append("r.register = ?")
+            params.append(str(register))
+        if kind:
+            where.append("r.kind = ?")
+            params.append(kind)
+        sql = ("SELECT i.name, COUNT(DISTINCT i.receipt_id), SUM(i.qty), SUM(i.sum) "
+               "FROM receipt_items i JOIN receipts r ON r.id = i.receipt_id "
+               f"WHERE {' AND '.join(where)} GROUP BY i.name ORDER BY SUM(i.sum) DESC")
+        return self._fetch(sql, params)
+
+    def receipt(self, receipt_id):
+        """Повний чек: dict з текстом і рядками або None"""
+        rows = self._fetch("SELECT id, ts, register, kind, total, items, text FROM receipts WHERE id = ?",
+                           [receipt_id])
+        if not rows:
+            return None
+        row = rows[0]
+        items = self._fetch("SELECT name, qty, price, sum FROM receipt_items WHERE receipt_id = ? ORDER BY rowid",
+                            [receipt_id])
+        return dict(id=row[0], ts=row[1], register=row[2], kind=row[3], total=row[4], items=items, text=row[6])
+
+    def _receipt_filters(self, start, end, register, min_total, max_total, kind):
+        where, params = [], []
+        if start is not None:
+            where.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("ts < ?")
+            params.append(end)
+        if register:
+            where.append("register = ?")
+            params.append(str(register))
+        if min_total is not None:
+            where.append("total >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            where.append("total <= ?")
+            params.append(max_total)
+        if kind:
+            where.append("kind = ?")
+            params.append(kind)
+        return where, params
+
+    def _fetch(self, sql, params):
+        # Окреме з'єднання на запит: запити йдуть з потоків GUI, запис - з потоку архіву
+        if not os.path.exists(self.path):
+            return []
+        connection = self._connect()
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
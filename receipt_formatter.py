@@ -1,3 +1,56 @@
+"""Чеки продажу і повернення.
+
+ReceiptFormatter будує текстовий чек (дисплеї, лог, архів).
+RenderedReceipt - той самий чек для клієнтів інших форматів
+(команда FORMAT на клієнтському порту або CLIENT_RECEIPT_FORMATS):
+    text    - текст, як у дисплеїв
+    escpos  - команди ESC/POS для додаткового чекового принтера
+    json    - JSON рядок з рядками чека
+    html    - HTML фрагмент
+Кожен формат рендериться і кодується один раз на чек, при першому
+клієнті цього формату; решта клієнтів отримують ті самі байти.
+"""
+import html
+import json
+
+try:
+    import config
+except ImportError:
+    config = None
+
+# Формати чека для клієнтів
+FORMAT_TEXT = "text"
+FORMAT_ESCPOS = "escpos"
+FORMAT_JSON = "json"
+FORMAT_HTML = "html"
+FORMATS = (FORMAT_TEXT, FORMAT_ESCPOS, FORMAT_JSON, FORMAT_HTML)
+
+# Види чеків
+KIND_SALE = "sale"
+KIND_RETURN = "return"
+
+# ESC/POS: ширина рядка в символах (48 - 80 мм, 32 - 58 мм) і кодова сторінка принтера
+ESCPOS_WIDTH = getattr(config, 'ESCPOS_WIDTH', 48)
+ESCPOS_CODEPAGE = getattr(config, 'ESCPOS_CODEPAGE', 46)  # ESC t n; 46 - WPC1251 у більшості принтерів
+ESCPOS_ENCODING = getattr(config, 'ESCPOS_ENCODING', "cp1251")
+
+ESC_INIT = b"\x1b@"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_DOUBLE_HEIGHT = b"\x1d!\x01"
+ESC_NORMAL_SIZE = b"\x1d!\x00"
+ESC_FEED_CUT = b"\x1bd\x04\x1dV\x01"  # Прогін 4 рядки і частковий відріз
+
+
+def real_qty(item):
+    """Кількість через ділення суми на ціну, як у текстовому чеку"""
+    if item.price > 0:
+        return int(item.sum / item.price + 0.5)
+    return item.qty
+
+
 class ReceiptFormatter:
     @staticmethod
     def format_success_receipt(products, total):
@@ -5,11 +58,11 @@ class ReceiptFormatter:
         lines = ["=== ЧЕК ==="]
         
         for product in products.values():
-            # Використовуємо правильні ключі з JSON
-            name = product.get('fPName', 'Невідомий товар')
-            original_qty = product.get('fQtty', 1)
-            price = product.get('fPrice', 0)
-            sum_val = product.get('fSum', 0)
+            # Рядок кошика (LineItem)
+            name = product.name or 'Невідомий товар'
+            original_qty = product.qty
+            price = product.price
+            sum_val = product.sum
             
             # ВАЖЛИВО: Вираховуємо реальну кількість через ділення
             if price > 0:
@@ -34,10 +87,10 @@ class ReceiptFormatter:
         lines = ["=== ПОВЕРНЕННЯ ==="]
         
         for product in products.values():
-            name = product.get('fPName', 'Невідомий товар')
-            qty = product.get('fQtty', 0)
-            price = product.get('fPrice', 0)
-            sum_val = product.get('fSum', 0)
+            name = product.name or 'Невідомий товар'
+            qty = product.qty
+            price = product.price
+            sum_val = product.sum
             
             # ВАЖЛИВО: Вираховуємо реальну кількість через ділення
             if price > 0:
@@ -59,3 +112,79 @@ class ReceiptFormatter:
     def format_cancel_receipt():
         """Форматування скасування"""
         return "=== ОПЕРАЦІЯ СКАСОВАНА ===\nКошик очищено"
+
+
+RECEIPT_TITLES = {KIND_SALE: "ЧЕК", KIND_RETURN: "ПОВЕРНЕННЯ"}
+RECEIPT_FOOTERS = {KIND_SALE: "Дякуємо за покупку!", KIND_RETURN: "Повернення виконано"}
+
+
+class RenderedReceipt:
+    """Чек, відрендерений один раз на формат: спільні байти для всіх клієнтів формату"""
+
+    __slots__ = ("kind", "register_id", "items", "total", "text", "_encoded")
+
+    def __init__(self, kind, register_id, products, total, text):
+        self.kind = kind
+        self.register_id = register_id
+        self.items = list(products.values())  # Знімок: кошик очищується одразу після чека
+        self.total = total
+        self.text = text
+        self._encoded = {}
+
+    def encoded(self, fmt):
+        data = self._encoded.get(fmt)
+        if data is None:
+            data = self._encoded[fmt] = RENDERERS.get(fmt, render_text)(self)
+        return data
+
+
+def render_text(receipt):
+    return receipt.text.encode("utf-8")
+
+
+def render_json(receipt):
+    obj = {"type": "receipt", "kind": receipt.kind, "register": receipt.register_id, "total": receipt.total,
+           "items": [{"name": item.name, "qty": real_qty(item), "price": item.price, "sum": item.sum}
+                     for item in receipt.items]}
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def render_html(receipt):
+    title = RECEIPT_TITLES.get(receipt.kind, "ЧЕК")
+    rows = "".join(f"<tr><td>{html.escape(item.name or 'Невідомий товар')}</td>"
+                   f"<td>{real_qty(item)} x {item.price:.2f}</td><td>{item.sum:.2f}</td></tr>"
+                   for item in receipt.items)
+    return (f'<div class="receipt receipt-{receipt.kind}" data-register="{html.escape(str(receipt.register_id))}">'
+            f"<h3>{title}</h3><table>{rows}</table>"
+            f'<p class="total">РАЗОМ: {receipt.total:.2f} грн</p>'
+            f"<p>{RECEIPT_FOOTERS.get(receipt.kind, '')}</p></div>\n").encode("utf-8")
+
+
+def render_escpos(receipt):
+    width = ESCPOS_WIDTH
+
+    def line(text):
+        return text.encode(ESCPOS_ENCODING, errors="replace") + b"\n"
+
+    def columns(left, right):
+        return line(left[:max(0, width - len(right) - 1)].ljust(width - len(right)) + right)
+
+    out = [ESC_INIT, b"\x1bt" + bytes([ESCPOS_CODEPAGE]),
+           ESC_ALIGN_CENTER, ESC_BOLD_ON, line(RECEIPT_TITLES.get(receipt.kind, "ЧЕК")), ESC_BOLD_OFF,
+           ESC_ALIGN_LEFT, line("-" * width)]
+    for item in receipt.items:
+        out.append(line((item.name or "Невідомий товар")[:width]))
+        out.append(columns(f"  {real_qty(item)} x {item.price:.2f}", f"{item.sum:.2f}"))
+    out.append(line("-" * width))
+    out += [ESC_BOLD_ON, ESC_DOUBLE_HEIGHT, columns("РАЗОМ", f"{receipt.total:.2f} грн"), ESC_NORMAL_SIZE,
+            ESC_BOLD_OFF, ESC_ALIGN_CENTER, line(RECEIPT_FOOTERS.get(receipt.kind, "")), ESC_ALIGN_LEFT,
+            ESC_FEED_CUT]
+    return b"".join(out)
+
+
+RENDERERS = {
+    FORMAT_TEXT: render_text,
+    FORMAT_ESCPOS: render_escpos,
+    FORMAT_JSON: render_json,
+    FORMAT_HTML: render_html,
+}
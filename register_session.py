@@ -0,0 +1,113 @@
+"""Сесії кас: окремий кошик для кожного принтера.
+
+Один сервер обслуговує кілька кас; стан транзакції (товари, сума,
+прапорець активності) тримається окремо для кожної каси і ніде не
+перетинається з іншими.
+"""
+import time
+from collections import deque
+
+from cart_diff import CartDiff
+
+# Скільки останніх подій v2 тримати для відновлення після перепідключення
+EVENT_RING_SIZE = 256
+
+
+class RegisterSession:
+    """Стан транзакції однієї каси"""
+
+    def __init__(self, register_id, data_processor, ring_size=EVENT_RING_SIZE):
+        self.register_id = register_id
+        self.data_processor = data_processor
+        self.cart = CartDiff()
+        self.total = 0.0
+        self.active = False
+        self.last_total_sent = 0.0  # Для відстеження останньої відправленої суми
+        self.last_seen = time.time()
+        self.completed = 0
+        self.returns = 0
+        self.cancelled = 0
+        self.seq = 0  # Номер останньої події протоколу v2 цієї каси
+        self.events = deque(maxlen=ring_size)  # Останні EncodedEvent для відновлення
+        self.flush_handle = None  # Таймер закриття вікна об'єднання змін
+        self.status_encoding = None  # Визначене кодування статусів принтера (StatusDecoder)
+
+    @property
+    def products(self):
+        return self.cart.items
+
+    @property
+    def label(self):
+        return f"Каса {self.register_id}"
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def events_after(self, seq):
+        """Події з номером більше seq або None, якщо кільце їх вже не містить"""
+        if seq > self.seq:
+            # Клієнт бачив номери, яких тут немає (сервер перезапущено)
+            return None
+        if seq == self.seq:
+            return []
+        if not self.events or self.events[0].event["seq"] > seq + 1:
+            return None
+        return [e for e in self.events if e.event["seq"] > seq]
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def reset_transaction(self):
+        """Очищення стану транзакції"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.cart.reset()
+        self.total = 0.0
+        self.active = False
+        self.last_total_sent = 0.0
+        self.data_processor.reset_transaction()
+
+
+class SessionManager:
+    """Сесії кас за джерелом даних (IP принтера) або налаштованим номером каси"""
+
+    def __init__(self, data_processor_factory, registers=None, ring_size=EVENT_RING_SIZE):
+        self.data_processor_factory = data_processor_factory
+        self.ring_size = ring_size
+        # IP принтера -> номер каси; незнайомий IP сам стає номером каси
+        self.registers = dict(registers or {})
+        self.sessions = {}
+
+    def register_id_for(self, addr):
+        host = addr[0] if isinstance(addr, tuple) else str(addr)
+        return str(self.registers.get(host, host))
+
+    def for_addr(self, addr):
+        """Сесія каси для UDP адреси або TCP peer; створюється при першому зверненні"""
+        session = self.for_register(self.register_id_for(addr))
+        session.touch()
+        return session
+
+    def for_register(self, register_id):
+        session = self.sessions.get(register_id)
+        if session is None:
+            session = RegisterSession(register_id, self.data_processor_factory(), self.ring_size)
+            self.sessions[register_id] = session
+        return session
+
+    def get(self, register_id):
+        return self.sessions.get(register_id)
+
+    def latest(self):
+        """Сесія, що оновлювалась останньою (для однокасового відображення)"""
+        if not self.sessions:
+            return None
+        return max(self.sessions.values(), key=lambda s: s.last_seen)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def __len__(self):
+        return len(self.sessions)
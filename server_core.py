@@ -0,0 +1,958 @@
+#!/usr/bin/env python3
+"""Асинхронне ядро POS сервера.
+
+Один цикл asyncio у фоновому потоці обслуговує всі порти:
+UDP JSON від принтера, TCP статуси принтера і TCP клієнтів (дисплеї).
+
+Цикл - єдиний власник стану кас і клієнтів: датаграми, статуси і
+команди клієнтів обробляються по черзі в його потоці, без блокувань.
+Інші потоки стан не змінюють (лише через call_in_loop) і не читають
+напряму: раз на SNAPSHOT_INTERVAL цикл публікує незмінний знімок
+(CoreSnapshot), який GUI читає без блокувань.
+"""
+import asyncio
+import importlib.util
+import os
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from types import MappingProxyType
+from time import perf_counter
+
+from cart_diff import ADD, UPDATE, REMOVE
+from client_fanout import ClientFanOut, POLICY_DROP_OLDEST
+from client_protocol import (PROTO_V2, FRAMING_JSON, EncodedEvent, make_event, item_fields, parse_proto, encode_json,
+                             EVENT_HELLO, EVENT_SUBSCRIBED, EVENT_START, EVENT_DELTA, EVENT_TOTAL, EVENT_COMMIT,
+                             EVENT_RETURN, EVENT_CANCEL, EVENT_SNAPSHOT)
+from journal import Journal
+from line_items import DECODER_NAME, CartSnapshot, LineItem, decode_cart
+from metrics import (PipelineMetrics, RECEIVE, DECODE, DIFF, FORMAT, FANOUT, TOTAL, DATAGRAMS, DATAGRAM_BYTES,
+                     DATAGRAM_ERRORS, DATAGRAM_MALFORMED, STATUS_BYTES, STATUS_CONNECTIONS, STATUS_REJECTED,
+                     STATUS_IDLE_CLOSED, UPDATE_FLUSHES, UPDATES_COALESCED)
+from metrics_http import MetricsHTTPServer
+from data_processor import set_delete_indicators
+from payment_matcher import RuleEngine, SUCCESS, RETURN
+from receipt_archive import ReceiptArchive
+from receipt_formatter import FORMATS, FORMAT_TEXT, KIND_SALE, KIND_RETURN, RenderedReceipt
+from tcp_capture import CaptureWriter, KIND_OPEN, KIND_CLOSE
+from register_session import SessionManager
+from status_encoding import AUTO, FALLBACK_ENCODING, StatusDecoder
+from status_peers import StatusPeers, REJECT_TOTAL
+from udp_ingest import UDPReceiver, MAX_UDP_PAYLOAD
+
+try:
+    import config
+except ImportError:
+    config = None
+
+
+def load_config_file(path):
+    """Модуль налаштувань з файлу path поруч з програмою (в exe вбудований config - базовий)
+
+    Байткод з __pycache__ не використовується: правка файлу в межах тієї
+    самої секунди і того самого розміру інакше могла б не потрапити.
+    """
+    spec = importlib.util.spec_from_file_location("config", path)
+    module = importlib.util.module_from_spec(spec)
+    exec(spec.loader.source_to_code(spec.loader.get_data(path), path), module.__dict__)
+    return module
+
+# Події кошика для GUI
+VIEW_ITEM = "item"    # (VIEW_ITEM, каса, назва, (кількість, ціна, сума) або None - видалено)
+VIEW_TOTAL = "total"  # (VIEW_TOTAL, каса, сума)
+VIEW_RESET = "reset"  # (VIEW_RESET, каса) - кошик очищено
+
+# Незмінні знімки стану для читачів з інших потоків
+SessionSnapshot = namedtuple("SessionSnapshot", "register_id label active items units total completed returns cancelled")
+CoreSnapshot = namedtuple("CoreSnapshot", "taken_at running sessions clients peers rules counters stages")
+EMPTY_SNAPSHOT = CoreSnapshot(0.0, False, (), (), (), (), MappingProxyType({}), MappingProxyType({}))
+
+WELCOME_MESSAGE = (
+    "🔌 === UniPro POS Server v28 ===\n"
+    "📡 Real-time оновлення увімкнено\n"
+    "⏳ Очікування транзакції...\n"
+    + "=" * 40 + "\n"
+)
+
+
+class POSServerCore:
+    """Сесії кас і мережеві сервери в одному циклі подій"""
+
+    def __init__(self, log, data_processor_factory, receipt_formatter, config_path="config.py"):
+        self.log = log
+        self.receipt_formatter = receipt_formatter
+
+        # Окремий кошик для кожної каси
+        self.sessions = SessionManager(data_processor_factory, getattr(config, 'REGISTERS', {}),
+                                       getattr(config, 'CLIENT_EVENT_RING', 256))
+
+        # Затримки етапів обробки (переживають перезапуск сервера)
+        self.metrics = PipelineMetrics(getattr(config, 'METRICS_WINDOW', 60.0))
+
+        # Вікно об'єднання змін кошика, с (0 - кожна датаграма розсилається одразу)
+        self.coalesce_window = max(0.0, float(getattr(config, 'UPDATE_COALESCE_WINDOW', 0.03)))
+
+        self.fanout = ClientFanOut(log)
+        self.status_peers = StatusPeers()  # З'єднання порту статусів принтера
+        self.rules = RuleEngine()  # Ознаки оплати/повернення з config.py
+        self.config_path = os.path.abspath(config_path)  # config.py, який редагує оператор
+        self.rules_config = config  # Модуль, з якого взято правила
+        self._config_mtime = None
+        self.running = False
+        self.capture = None  # Двійкове захоплення трафіку принтера
+        self.journal = None  # Журнал транзакцій (відновлення після збою)
+        self.archive = None  # Архів чеків (SQLite)
+
+        self.started_at = None
+        self.http = None
+        self.loop = None
+        self._thread = None
+        self._servers = []
+        self.udp = None  # UDPReceiver
+        self._udp_paused = False
+        self._printer_writers = set()
+        self._handler_tasks = set()
+        self._view_queues = []
+
+        # Останній опублікований знімок (заміна посилання атомарна)
+        self.snapshot_interval = getattr(config, 'SNAPSHOT_INTERVAL', 0.25)
+        self.snapshot = EMPTY_SNAPSHOT
+
+    @property
+    def clients(self):
+        return self.fanout.clients
+
+    def subscribe_view(self):
+        """Черга подій кошика для GUI: пишеться з циклу подій, читається в потоці Tk"""
+        events = deque()
+        self._view_queues.append(events)
+        return events
+
+    def _notify_view(self, event):
+        for events in self._view_queues:
+            events.append(event)
+
+    def call_in_loop(self, func, *args):
+        """Зміна стану ядра з іншого потоку: виконується в циклі подій, після поточної обробки"""
+        loop = self.loop
+        if loop is None or not self.running:
+            # Ядро зупинено - конкуренції немає
+            func(*args)
+        else:
+            loop.call_soon_threadsafe(func, *args)
+
+    def publish_snapshot(self):
+        """Знімок стану для GUI; лише в потоці циклу"""
+        sessions = tuple(
+            SessionSnapshot(s.register_id, s.label, s.active, len(s.products),
+                            sum(item.qty for item in s.products.values()), s.total,
+                            s.completed, s.returns, s.cancelled)
+            for s in self.sessions)
+        self.snapshot = CoreSnapshot(time.time(), self.running, sessions, tuple(self.fanout.stats()),
+                                     tuple(self.status_peers.stats()), tuple(self.rules.stats()),
+                                     MappingProxyType(dict(self.metrics.counters)),
+                                     MappingProxyType(self.metrics.recent()))
+
+    def _schedule_snapshot(self):
+        if self.loop is None:
+            return
+        self.publish_snapshot()
+        self.loop.call_later(self.snapshot_interval, self._schedule_snapshot)
+
+    def _reset_session(self, session):
+        session.reset_transaction()
+        if self._view_queues:
+            self._notify_view((VIEW_RESET, session.register_id))
+
+    # ------------------------------------------------------------------
+    # Запуск і зупинка
+    # ------------------------------------------------------------------
+
+    def start(self, tcp_status_port, udp_json_port, tcp_client_port):
+        """Запуск циклу подій і всіх серверів; помилки bind піднімаються одразу"""
+        if self.running:
+            return
+
+        # Selector, а не Proactor (Windows): UDP вичитується через add_reader
+        self.loop = asyncio.SelectorEventLoop()
+        self._thread = threading.Thread(target=self._run_loop, name="pos-core", daemon=True)
+        self._thread.start()
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._start_servers(tcp_status_port, udp_json_port, tcp_client_port), self.loop)
+        try:
+            future.result()
+        except Exception:
+            self._stop_loop()
+            raise
+        self.running = True
+        self.loop.call_soon_threadsafe(self._schedule_snapshot)
+
+    def stop(self):
+        """Миттєва зупинка: закриваємо сокети і зупиняємо цикл без очікування таймаутів"""
+        if self.loop is None:
+            return
+        self.running = False
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_servers(), self.loop).result(timeout=5)
+        except Exception as e:
+            self.log(f"Помилка зупинки сервера: {e}", "error")
+        self._stop_loop()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            # Завершуємо обробники з'єднань, що ще лишились
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    def _stop_loop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self.loop = None
+        self._thread = None
+
+    async def _start_servers(self, tcp_status_port, udp_json_port, tcp_client_port):
+        loop = asyncio.get_running_loop()
+        self.fanout = ClientFanOut(
+            self.log,
+            getattr(config, 'CLIENT_QUEUE_LIMIT', 256),
+            getattr(config, 'CLIENT_OVERFLOW_POLICY', POLICY_DROP_OLDEST),
+            self.metrics)
+        self.status_peers = StatusPeers(
+            getattr(config, 'STATUS_MAX_CONNECTIONS', 32),
+            getattr(config, 'STATUS_MAX_PER_PEER', 4),
+            getattr(config, 'STATUS_IDLE_TIMEOUT', 300.0))
+        try:
+            self._config_mtime = self._config_stat()
+            if self._config_mtime is not None:
+                self._read_config_file()
+            self._load_rules()
+            reload_interval = float(getattr(config, 'RULES_RELOAD_INTERVAL', 2.0) or 0)
+            if reload_interval > 0:
+                loop.call_later(reload_interval, self._schedule_config_check, reload_interval)
+
+            self._open_journal()
+
+            self.udp = UDPReceiver(loop, self.handle_datagram, self.metrics, self.log,
+                                   getattr(config, 'UDP_MAX_DATAGRAM', MAX_UDP_PAYLOAD),
+                                   getattr(config, 'UDP_RCVBUF', 4 * 1024 * 1024),
+                                   getattr(config, 'UDP_DRAIN_BATCH', 256))
+            self.udp.open("0.0.0.0", udp_json_port)
+            self.log(f"UDP сервер запущено на порту {udp_json_port} (JSON: {DECODER_NAME}, "
+                     f"до {self.udp.max_size} байт, буфер {self.udp.effective_rcvbuf // 1024} КБ)", "success")
+
+            # Захоплення сирого трафіку принтера (перегляд: python tcp_capture.py view ...)
+            capture_path = getattr(config, 'TCP_CAPTURE_FILE', "tcp_capture.bin")
+            if capture_path:
+                try:
+                    self.capture = CaptureWriter(capture_path)
+                    self.capture.open()
+                    self._schedule_capture_flush()
+                    self.log(f"TCP захоплення трафіку: {capture_path}")
+                except OSError:
+                    self.capture = None
+                    self.log("Увага: не вдалось відкрити файл захоплення TCP", "warning")
+
+            # Архів чеків для пошуку (вкладка "Чеки")
+            archive_path = getattr(config, 'RECEIPT_ARCHIVE', "receipts.db")
+            if archive_path:
+                try:
+                    self.archive = ReceiptArchive(archive_path)
+                    self.archive.start()
+                    self.log(f"Архів чеків: {archive_path}")
+                except Exception as e:
+                    self.archive = None
+                    self.log(f"Увага: архів чеків недоступний: {e}", "warning")
+
+            printer_server = await asyncio.start_server(
+                self._handle_printer, "0.0.0.0", tcp_status_port, reuse_address=True,
+                backlog=getattr(config, 'STATUS_BACKLOG', 128))
+            self._servers.append(printer_server)
+            self.log(f"TCP сервер запущено на порту {tcp_status_port} "
+                     f"(до {self.status_peers.max_connections} з'єднань)", "success")
+
+            client_server = await asyncio.start_server(
+                self._handle_client, "0.0.0.0", tcp_client_port, reuse_address=True)
+            self._servers.append(client_server)
+            self.log(f"Клієнтський сервер запущено на порту {tcp_client_port}", "success")
+
+            # Необов'язковий HTTP для моніторингу (Prometheus), 0 - вимкнено
+            http_port = int(getattr(config, 'METRICS_HTTP_PORT', 0) or 0)
+            if http_port:
+                http_host = getattr(config, 'METRICS_HTTP_HOST', "127.0.0.1")
+                self.http = MetricsHTTPServer(self)
+                try:
+                    await self.http.start(http_host, http_port)
+                    self.log(f"HTTP метрики: http://{http_host}:{http_port}/metrics", "success")
+                except OSError as e:
+                    # Моніторинг не має заважати роботі каси
+                    self.http = None
+                    self.log(f"Не вдалось запустити HTTP метрики на порту {http_port}: {e}", "warning")
+            self.started_at = time.time()
+        except Exception:
+            await self._close_servers()
+            raise
+
+    def _open_journal(self):
+        """Відновлення незавершених кошиків з журналу і запуск запису"""
+        directory = getattr(config, 'JOURNAL_DIR', "journal")
+        if not directory:
+            return
+        journal = Journal(directory,
+                          getattr(config, 'JOURNAL_SEGMENT_SIZE', 4 * 1024 * 1024),
+                          getattr(config, 'JOURNAL_COMPACT_SEGMENTS', 4),
+                          getattr(config, 'JOURNAL_FSYNC_INTERVAL', 0.05))
+        try:
+            state = journal.recover()
+            journal.start()
+        except OSError as e:
+            self.log(f"Журнал транзакцій недоступний: {e}", "warning")
+            return
+        self.journal = journal
+        if state.corrupt:
+            self.log(f"Журнал: пропущено пошкоджених записів: {state.corrupt}", "warning")
+        self.restore_carts(state)
+        self.log(f"Журнал транзакцій: {directory} (подій: {state.events})")
+
+    def restore_carts(self, state):
+        for cart in state.carts.values():
+            session = self.sessions.for_register(cart.register_id)
+            # Номери seq продовжуються після перезапуску
+            session.seq = max(session.seq, cart.seq)
+            if not (cart.active and cart.items) or session.active:
+                continue
+            session.cart.items = {name: LineItem(name, item.get("price", 0), item.get("qty", 0), item.get("sum", 0))
+                                  for name, item in cart.items.items()}
+            session.total = cart.total
+            session.last_total_sent = cart.total
+            session.active = True
+            session.data_processor.process_json_data(CartSnapshot("", list(session.products.values()), cart.total))
+            for name, item in session.products.items():
+                self._notify_view((VIEW_ITEM, session.register_id, name, item.values()))
+            self._notify_view((VIEW_TOTAL, session.register_id, session.total))
+            self.session_log(session, f"ВІДНОВЛЕНО КОШИК З ЖУРНАЛУ: {len(session.products)} товарів | "
+                                      f"Сума: {session.total} грн", "warning")
+
+    async def _close_servers(self):
+        if self.http:
+            await self.http.stop()
+            self.http = None
+        for server in self._servers:
+            server.close()
+        if self.udp:
+            self.udp.close()
+            self.udp = None
+        self._udp_paused = False
+
+        self.fanout.close_all()
+        for writer in list(self._printer_writers):
+            try:
+                writer.close()
+            except:
+                pass
+        self._printer_writers.clear()
+
+        # Даємо обробникам з'єднань завершитись до зупинки циклу
+        if self._handler_tasks:
+            await asyncio.wait(list(self._handler_tasks), timeout=1.0)
+
+        for server in self._servers:
+            try:
+                await asyncio.wait_for(server.wait_closed(), 1.0)
+            except Exception:
+                pass
+        self._servers = []
+
+        if self.capture:
+            try:
+                self.capture.close()
+            except OSError:
+                pass
+            self.capture = None
+
+        if self.archive:
+            self.archive.stop()
+            if self.archive.error:
+                self.log(f"Помилка запису архіву чеків: {self.archive.error}", "error")
+            self.archive = None
+
+        if self.journal:
+            self.journal.stop()
+            if self.journal.error:
+                self.log(f"Помилка запису журналу: {self.journal.error}", "error")
+            self.journal = None
+
+        # Останній знімок - вже зі станом "зупинено"
+        self.publish_snapshot()
+
+    def _load_rules(self):
+        """Компіляція ознак оплати/повернення і видалення з config.py; при помилці лишаються попередні"""
+        try:
+            compiled = self.rules.load(self.rules_config)
+            set_delete_indicators(getattr(self.rules_config, 'DELETE_INDICATORS', ["Видалено товар:"]))
+        except (ValueError, TypeError, re.error) as e:
+            self.log(f"Помилка правил оплати в config.py: {e}; діють попередні правила", "error")
+            return False
+        self.log(f"Правила оплати: {len(compiled.rules)} (шаблонів: {len(compiled.patterns)}, "
+                 f"regex: {len(compiled.regexes)})")
+        return True
+
+    def _config_stat(self):
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_config_file(self):
+        """Читання config.py оператора; при помилці лишається попередній модуль"""
+        try:
+            self.rules_config = load_config_file(self.config_path)
+        except Exception as e:
+            self.log(f"config.py не завантажено: {e}; діють попередні правила", "error")
+            return False
+        return True
+
+    def _schedule_config_check(self, interval):
+        """Перезавантаження правил після зміни config.py (лише stat раз на interval)"""
+        if self.loop is None or not self.running:
+            return
+        mtime = self._config_stat()
+        if mtime is not None and mtime != self._config_mtime:
+            self._config_mtime = mtime
+            if self._read_config_file() and self._load_rules():
+                self.log("Правила оплати перезавантажено з config.py", "success")
+        self.loop.call_later(interval, self._schedule_config_check, interval)
+
+    def _schedule_capture_flush(self):
+        """Скидання буфера захоплення на диск раз на секунду, а не на кожен шматок"""
+        if self.capture is None:
+            return
+        try:
+            self.capture.flush()
+        except OSError:
+            pass
+        self.loop.call_later(1.0, self._schedule_capture_flush)
+
+    def clear_capture(self):
+        """Очищення файлу захоплення (виклик з потоку GUI)"""
+        if self.running:
+            self.call_in_loop(lambda: self.capture and self.capture.truncate())
+            return
+        path = getattr(config, 'TCP_CAPTURE_FILE', "tcp_capture.bin")
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    # ------------------------------------------------------------------
+    # Клієнти (дисплеї покупця)
+    # ------------------------------------------------------------------
+
+    def send_to_all_clients(self, message, incremental=False, register_id=None):
+        """Відправка повідомлення клієнтам каси через їхні черги (без блокування)
+
+        incremental=True - оновлення кошика, які можна викинути з черги
+        повільного клієнта; чеки і початок/скасування операції не губляться.
+        register_id=None - всім клієнтам незалежно від каси.
+        """
+        self.fanout.broadcast(message.encode("utf-8"), incremental, register_id)
+        self._apply_backpressure()
+
+    def send_to_session(self, session, message, incremental=False):
+        self.send_to_all_clients(message, incremental, session.register_id)
+
+    def send_receipt(self, session, kind, text):
+        """Чек клієнтам каси: текст - дисплеям, інші формати рендеряться один раз на формат"""
+        receipt = RenderedReceipt(kind, session.register_id, session.products, session.total, text)
+        self.fanout.broadcast_receipt(receipt, session.register_id)
+        self._apply_backpressure()
+        return receipt
+
+    def send_event(self, session, kind, incremental=False, **fields):
+        """Подія протоколу v2 з наступним номером seq каси"""
+        encoded = EncodedEvent(make_event(kind, session.register_id, session.next_seq(), **fields))
+        # Кільце подій каси - для клієнтів, що перепідключаються
+        session.events.append(encoded)
+        if self.journal:
+            # Ті самі байти, що й клієнтам JSON - кодування один раз
+            self.journal.append(encoded.framed(FRAMING_JSON))
+        self.fanout.broadcast_event(encoded, incremental, session.register_id)
+        self._apply_backpressure()
+
+    def session_log(self, session, message, tag=None):
+        self.log(f"[{session.label}] {message}", tag)
+
+    def _apply_backpressure(self):
+        """Політика block: пригальмовуємо прийом UDP, поки повільний клієнт не розвантажиться"""
+        if self._udp_paused or self.udp is None or not self.fanout.blocked:
+            return
+        self.udp.pause()
+        self._udp_paused = True
+        self.loop.create_task(self._resume_udp())
+
+    async def _resume_udp(self):
+        await self.fanout.wait_for_space()
+        self._udp_paused = False
+        if self.udp:
+            self.udp.resume()
+
+    async def _handle_client(self, reader, writer):
+        """TCP підключення клієнта: привітання і очікування відключення"""
+        addr = writer.get_extra_info("peername")
+        client = self.fanout.add(writer, addr)
+        # Дисплей прив'язується до каси налаштуванням або командою "REGISTER <номер>"
+        client_registers = getattr(config, 'CLIENT_REGISTERS', {})
+        if addr and addr[0] in client_registers:
+            client.register_id = str(client_registers[addr[0]])
+        # Чековий принтер або інший клієнт чеків - формат з налаштувань або командою "FORMAT <формат>"
+        client_formats = getattr(config, 'CLIENT_RECEIPT_FORMATS', {})
+        if addr and client_formats.get(addr[0]) in FORMATS:
+            client.receipt_format = client_formats[addr[0]]
+        self.log(f"КЛІЄНТ ПІДКЛЮЧЕНО: {addr} (каса: {client.register_id or 'всі'}, чеки: {client.receipt_format})",
+                 "info")
+        if client.receipt_format == FORMAT_TEXT:
+            # Привітання і поточні кошики - одним записом
+            client.enqueue((WELCOME_MESSAGE + self.catch_up_text(client.register_id)).encode("utf-8"),
+                           incremental=False)
+        task = asyncio.current_task()
+        self._handler_tasks.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.handle_client_command(client, line)
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self._handler_tasks.discard(task)
+            self.fanout.remove(client)
+
+    def handle_client_command(self, client, line):
+        """Команди від клієнта (звичайні дисплеї нічого не надсилають)"""
+        parts = line.decode("utf-8", errors="ignore").split()
+        if len(parts) == 2 and parts[0].upper() == "REGISTER":
+            client.register_id = None if parts[1] == "*" else parts[1]
+            self.log(f"Клієнт {client.addr} підписано на касу: {client.register_id or 'всі'}", "info")
+            if client.proto == PROTO_V2:
+                event = {"type": EVENT_SUBSCRIBED, "register": client.register_id}
+                client.enqueue(EncodedEvent(event).framed(client.framing), incremental=False)
+            else:
+                text = f"📟 Каса: {client.register_id or 'всі'}\n"
+                if client.register_id is not None:
+                    text += self.catch_up_text(client.register_id)
+                client.enqueue(text.encode("utf-8"), incremental=False)
+        elif parts and parts[0].upper() == "PROTO":
+            self.negotiate_protocol(client, parts[1:])
+        elif len(parts) == 2 and parts[0].upper() == "FORMAT":
+            fmt = parts[1].lower()
+            if fmt not in FORMATS:
+                client.enqueue(f"⚠ FORMAT: невідомий формат {parts[1]} ({', '.join(FORMATS)})\n".encode("utf-8"),
+                               incremental=False)
+                return
+            client.receipt_format = fmt
+            self.log(f"Клієнт {client.addr}: формат чеків {fmt}", "info")
+
+    def negotiate_protocol(self, client, args):
+        """Перемикання клієнта між текстом (v1) і подіями (v2)"""
+        try:
+            proto, framing, resume = parse_proto(args)
+        except ValueError as e:
+            client.enqueue(f"⚠ {e}\n".encode("utf-8"), incremental=False)
+            return
+        if proto != PROTO_V2:
+            client.proto, client.framing = proto, None
+            self.log(f"Клієнт {client.addr}: текстовий протокол", "info")
+            return
+        # hello - завжди JSON рядок; після нього - лише кадри вибраного формату
+        sessions = [s for s in self.sessions if client.register_id in (None, s.register_id)]
+        hello = {"type": EVENT_HELLO, "proto": PROTO_V2, "format": framing, "register": client.register_id,
+                 "seq": {s.register_id: s.seq for s in sessions}}
+        parts = [encode_json(hello) + b"\n"]
+
+        # Наздоганяння: пропущені події з кільця каси, інакше знімок поточного кошика
+        replayed = 0
+        for session in sessions:
+            last = resume.get(session.register_id, resume.get(None) if client.register_id else None)
+            events = session.events_after(last) if last is not None else None
+            if events is None:
+                if session.active or last is not None:
+                    parts.append(EncodedEvent(self.snapshot_event(session)).framed(framing))
+            else:
+                parts.extend(e.framed(framing) for e in events)
+                replayed += len(events)
+        client.enqueue(b"".join(parts), incremental=False)
+        client.proto, client.framing = PROTO_V2, framing
+        self.log(f"Клієнт {client.addr}: протокол v2 ({framing}), повторено подій: {replayed}", "info")
+
+    def snapshot_event(self, session):
+        """Поточний стан кошика каси; seq - номер останньої події (без нового номера)"""
+        return make_event(EVENT_SNAPSHOT, session.register_id, session.seq, active=session.active,
+                          total=session.total, items=[item_fields(item) for item in session.products.values()])
+
+    def catch_up_text(self, register_id):
+        """Активні кошики каси (або всіх кас) текстом для дисплея, що щойно підключився"""
+        parts = []
+        for session in self.sessions:
+            if register_id not in (None, session.register_id) or not (session.active and session.products):
+                continue
+            parts.append("🛒 === ПОТОЧНА ОПЕРАЦІЯ ===\n\n")
+            for name, item in session.products.items():
+                parts.append(self.format_product_update(ADD, name, item))
+            parts.append(f"💰 СУМА: {session.total:.2f} грн\n" + "=" * 30 + "\n")
+        return "".join(parts)
+
+    # ------------------------------------------------------------------
+    # UDP: кошик від принтера
+    # ------------------------------------------------------------------
+
+    def _schedule_flush(self, session):
+        """Перша зміна відкриває вікно; наступні датаграми вікна лише доповнюють відкладені зміни"""
+        if self.coalesce_window <= 0:
+            self.flush_updates(session)
+        elif session.flush_handle is None:
+            session.flush_handle = self.loop.call_later(self.coalesce_window, self.flush_updates, session)
+        else:
+            self.metrics.count(UPDATES_COALESCED)
+
+    def flush_updates(self, session):
+        """Розсилка змін кошика за вікно: один текстовий кадр з однією сумою, одна подія delta"""
+        if session.flush_handle is not None:
+            session.flush_handle.cancel()
+            session.flush_handle = None
+        events = session.cart.take_pending()
+        if not events or not session.active:
+            return
+        metrics = self.metrics
+
+        # Спочатку форматуємо всі зміни, потім розсилаємо - окремі заміри етапів
+        t0 = perf_counter()
+        parts = [self.format_product_update(action, name, item, old_item)
+                 for action, name, item, old_item in events]
+        # Сума - тільки якщо дійсно змінилась більш ніж на 0.01
+        total_changed = abs(session.total - session.last_total_sent) > 0.01
+        if total_changed:
+            parts.append(f"💰 СУМА: {session.total:.2f} грн\n" + "=" * 30 + "\n")
+        t = perf_counter()
+        metrics.observe(FORMAT, t - t0)
+
+        self.send_to_session(session, "".join(parts), incremental=True)
+        # v2: усі зміни вікна - однією подією
+        self.send_event(session, EVENT_DELTA, incremental=True, changes=[
+            dict(op=action.lower(), **item_fields(old_item if action == REMOVE else item))
+            for action, name, item, old_item in events])
+        if total_changed:
+            self.send_event(session, EVENT_TOTAL, incremental=True, total=session.total)
+            session.last_total_sent = session.total
+        metrics.observe(FANOUT, perf_counter() - t)
+        metrics.count(UPDATE_FLUSHES)
+
+        for action, name, item, old_item in events:
+            if action == ADD:
+                self.session_log(session, f"+ ДОДАНО: {name}", "info")
+            elif action == UPDATE:
+                self.session_log(session, f"~ ОНОВЛЕНО: {name} (кількість: {item.qty})", "info")
+            elif action == REMOVE:
+                self.session_log(session, f"❌ ВИДАЛЕНО: {name}", "warning")
+        if total_changed:
+            self.session_log(session, f"СУМА ОНОВЛЕНА: {session.total:.2f} грн")
+
+        products = session.products
+        if products:
+            # Підраховуємо унікальні товари (не кількість одиниць)
+            unique_items = len(products)
+            total_units = sum(item.qty for item in products.values())
+            self.session_log(session, f"КОШИК: {unique_items} товарів ({total_units} одиниць) | Сума: {session.total} грн")
+
+    def format_product_update(self, action, product_name, product_data=None, old_data=None):
+        """Форматування повідомлення про зміну товару - БЕЗ ANSI КОДІВ"""
+        if action == "ADD":
+            qty = product_data.qty if product_data else 0
+            price = product_data.price if product_data else 0
+            sum_val = product_data.sum if product_data else 0
+            # Просто плюс без зайвого
+            return f"+ {product_name}  {qty}x{price:.2f} = {sum_val:.2f} грн\n"
+
+        elif action == "REMOVE":
+            qty = old_data.qty if old_data else 0
+            price = old_data.price if old_data else 0
+            sum_val = old_data.sum if old_data else 0
+            # Крестик вместо минуса для лучшей видимости
+            return f"❌ {product_name}  {qty}x{price:.2f} = {sum_val:.2f} грн\n"
+
+        elif action == "UPDATE":
+            old_qty = old_data.qty if old_data else 0
+            new_qty = product_data.qty if product_data else 0
+            price = product_data.price if product_data else 0
+            sum_val = product_data.sum if product_data else 0
+
+            if new_qty > old_qty:
+                # Збільшення кількості
+                diff = new_qty - old_qty
+                return f"+ {product_name}  +{diff} (всього: {new_qty}x{price:.2f} = {sum_val:.2f} грн)\n"
+            else:
+                # Зменшення кількості
+                diff = old_qty - new_qty
+                return f"➖ {product_name}  -{diff} (всього: {new_qty}x{price:.2f} = {sum_val:.2f} грн)\n"
+
+        return ""
+
+    def handle_datagram(self, data, addr):
+        """Обробка JSON датаграми з правильним підрахунком кількості"""
+        metrics = self.metrics
+        started = perf_counter()
+        metrics.count(DATAGRAMS)
+        metrics.count(DATAGRAM_BYTES, len(data))
+        session = self.sessions.for_addr(addr)
+        try:
+            # Принтер повторює весь кошик на кожне натискання - ідентичний знімок не розбираємо
+            duplicate = session.cart.is_duplicate(data)
+            t = perf_counter()
+            metrics.observe(RECEIVE, t - started)
+            if duplicate:
+                return
+
+            # Одразу в рядки кошика/CartSnapshot (msgspec - без проміжних dict)
+            try:
+                snapshot = decode_cart(data)
+            except ValueError as e:
+                metrics.count(DATAGRAM_MALFORMED)
+                self.session_log(session, f"UDP: некоректний JSON ({len(data)} байт): {e}", "warning")
+                return
+            t, t0 = perf_counter(), t
+            metrics.observe(DECODE, t - t0)
+
+            if snapshot.cmd == "clear":
+                # Відкладені зміни - до скасування, щоб дисплеї бачили послідовний потік
+                self.flush_updates(session)
+                # Простіша логіка - просто перевіряємо флаг active
+                if session.active:
+                    # Відправляємо скасування тільки якщо транзакція активна
+                    self.send_to_session(session, "❌ === ОПЕРАЦІЮ СКАСОВАНО ===\n\n")
+                    self.send_event(session, EVENT_CANCEL)
+                    self.session_log(session, "ТРАНЗАКЦІЮ СКАСОВАНО", "warning")
+                    session.cancelled += 1
+                else:
+                    self.session_log(session, "Clear received - no active transaction", "info")
+
+                # Очищаємо дані в будь-якому випадку
+                self._reset_session(session)
+                return
+
+            # Оновлюємо кошик з об'єднанням однакових і отримуємо лише зміни
+            events = session.cart.apply(snapshot.items)
+            products = session.products
+            if events:
+                # Індекс коротких назв для зіставлення рядків з порту статусів
+                session.data_processor.process_json_data(snapshot)
+            t, t0 = perf_counter(), t
+            metrics.observe(DIFF, t - t0)
+
+            # Якщо це перший товар - початок транзакції
+            if products and not session.active:
+                self.send_to_session(session, "🛒 === ПОЧАТОК ОПЕРАЦІЇ ===\n\n")
+                self.send_event(session, EVENT_START)
+                session.active = True
+                session.last_total_sent = 0.0
+                self.session_log(session, "НОВА ТРАНЗАКЦІЯ РОЗПОЧАТА", "success")
+
+            # REAL-TIME оновлення: зміни накопичуються у вікні і розсилаються разом (flush_updates)
+            if session.active:
+                total = snapshot.total
+                if self._view_queues:
+                    # GUI отримує лише незмінні значення, а не посилання на рядки кошика
+                    for action, name, item, _ in events:
+                        values = None if action == REMOVE else item.values()
+                        self._notify_view((VIEW_ITEM, session.register_id, name, values))
+                    if total != session.total:
+                        self._notify_view((VIEW_TOTAL, session.register_id, total))
+                session.total = total
+
+                if events:
+                    session.cart.hold(events)
+                    self._schedule_flush(session)
+
+            metrics.observe(TOTAL, perf_counter() - started)
+
+        except Exception as e:
+            metrics.count(DATAGRAM_ERRORS)
+            if self.running:
+                self.log(f"UDP помилка: {e}", "error")
+
+    # ------------------------------------------------------------------
+    # TCP: статуси принтера
+    # ------------------------------------------------------------------
+
+    async def _handle_printer(self, reader, writer):
+        """Обробка TCP клієнта з покращеною перевіркою оплати"""
+        addr = writer.get_extra_info("peername")
+        host = addr[0] if isinstance(addr, tuple) else str(addr)
+        peers = self.status_peers
+        rejected = peers.admit(host)
+        if rejected:
+            # Понад ліміт: закриваємо одразу, без обробника і без запису в лог на кожну спробу
+            self.metrics.count(STATUS_REJECTED)
+            peer = peers.peers[host]
+            if peer.rejected == 1 or peer.rejected % 100 == 0:
+                limit = (f"{peers.max_connections} з'єднань" if rejected == REJECT_TOTAL
+                         else f"{peers.max_per_peer} з'єднань з адреси")
+                self.log(f"TCP з'єднання від {host} відхилено: ліміт {limit} (відхилено: {peer.rejected})",
+                         "warning")
+            writer.close()
+            return
+        self.metrics.count(STATUS_CONNECTIONS)
+        self.log(f"TCP з'єднання від {addr}")
+        self._printer_writers.add(writer)
+        task = asyncio.current_task()
+        self._handler_tasks.add(task)
+        # Потоковий пошук шаблонів: без накопичення всього потоку в буфері
+        matcher = self.rules.matcher()
+        session = self.sessions.for_addr(addr)
+        decoder = self._status_decoder(session, host)
+        idle = False
+        if self.capture:
+            self.capture.write(addr, b"", KIND_OPEN)
+        try:
+            while True:
+                # Політика block: не читаємо нові статуси, поки клієнти не розвантажаться
+                await self.fanout.wait_for_space()
+                try:
+                    d = await asyncio.wait_for(reader.read(1024), peers.idle_timeout)
+                except asyncio.TimeoutError:
+                    idle = True
+                    self.metrics.count(STATUS_IDLE_CLOSED)
+                    self.log(f"TCP з'єднання {addr} закрито: немає даних {peers.idle_timeout:g} с", "warning")
+                    break
+                if not d:
+                    break
+                peers.received(host, len(d))
+                if self.process_status(session, matcher, decoder, d, addr):
+                    break
+        except (ConnectionError, OSError) as e:
+            if self.running:
+                self.log(f"TCP клієнт помилка: {e}", "error")
+        except Exception as e:
+            self.log(f"TCP обробка помилка: {e}", "error")
+        finally:
+            peers.closed(host, idle)
+            session.data_processor.end_status_stream()
+            self._handler_tasks.discard(task)
+            self._printer_writers.discard(writer)
+            if self.capture:
+                self.capture.write(addr, b"", KIND_CLOSE)
+            writer.close()
+            self.log(f"TCP з'єднання закрито: {addr}")
+
+    def _status_decoder(self, session, host):
+        """Декодер статусів з'єднання: кодування з config.py, визначене раніше для каси або ще невідоме"""
+        overrides = getattr(config, 'PRINTER_ENCODINGS', {}) or {}
+        encoding = (overrides.get(host) or overrides.get(session.register_id)
+                    or getattr(config, 'STATUS_ENCODING', AUTO))
+        if encoding == AUTO:
+            encoding = session.status_encoding
+        candidates = getattr(config, 'ENCODINGS', ["utf-8", FALLBACK_ENCODING])
+        try:
+            return StatusDecoder(encoding, candidates)
+        except LookupError:
+            self.session_log(session, f"Невідоме кодування статусів '{encoding}', визначаємо автоматично", "warning")
+            return StatusDecoder(session.status_encoding, candidates)
+
+    def process_status(self, session, matcher, decoder, d, addr):
+        """Обробка нового шматка статусів принтера; True - операцію завершено"""
+        self.metrics.count(STATUS_BYTES, len(d))
+
+        # Сирі байти в файл захоплення; декодування - лише при перегляді
+        if self.capture:
+            self.capture.write(addr, d)
+
+        # Один прохід по нових байтах; стан пошуку переноситься між шматками
+        for kind, label in matcher.feed(d):
+            if kind == SUCCESS:
+                self.session_log(session, f"Патерн оплати знайдено: {label}", "info")
+                break
+
+        # Лише нові байти, одним декодером (кодування визначається один раз на касу)
+        text, detected = decoder.decode(d)
+        if detected:
+            session.status_encoding = detected
+            self.session_log(session, f"Кодування статусів принтера: {detected}", "info")
+
+        # Рядки чека і "Видалено товар:" - до товарів кошика через індекс назв DataProcessor
+        # (для кожного шматка: незавершений рядок чекає продовження в DataProcessor)
+        data_processor = session.data_processor
+        deleted, _ = data_processor.process_status_text(text)
+        for item in deleted:
+            self.session_log(session, f"ПРИНТЕР: ВИДАЛЕНО ТОВАР {item.name} ({item.qty} x {item.price:.2f})",
+                             "warning")
+
+        # Завершення операції: відкладені зміни кошика - до чека
+        if matcher.has(RETURN) or matcher.has(SUCCESS):
+            self.flush_updates(session)
+
+        # Перевірка повернення
+        if matcher.has(RETURN):
+            self.session_log(session, "ВИЯВЛЕНО ОПЕРАЦІЮ ПОВЕРНЕННЯ", "warning")
+            if session.products:
+                t0 = perf_counter()
+                msg = self.receipt_formatter.format_return_receipt(session.products, session.total)
+                t = perf_counter()
+                self.metrics.observe(FORMAT, t - t0)
+                if self.archive:
+                    self.archive.add(session.register_id, KIND_RETURN, session.products, session.total, msg)
+                self.send_receipt(session, KIND_RETURN, msg)
+                self.send_event(session, EVENT_RETURN, total=session.total,
+                                items=[item_fields(item) for item in session.products.values()])
+                self.metrics.observe(FANOUT, perf_counter() - t)
+                self.session_log(session, f"ПОВЕРНЕННЯ ЗАВЕРШЕНО | Сума: {session.total} грн", "warning")
+            else:
+                msg = "=== ПОВЕРНЕННЯ ===\nПовернення виконано\n=== ОПЕРАЦІЮ СКАСОВАНО ===\n"
+                self.send_to_session(session, msg)
+                self.send_event(session, EVENT_RETURN, total=0, items=[])
+                self.session_log(session, "ПОВЕРНЕННЯ БЕЗ ТОВАРІВ", "warning")
+            session.returns += 1
+
+            # Очищення даних
+            self._reset_session(session)
+            return True
+
+        # Перевірка успішної оплати
+        elif matcher.has(SUCCESS) and session.products:
+            self.session_log(session, "ОПЛАТУ ПІДТВЕРДЖЕНО - Транзакція завершена!", "success")
+            tail = matcher.tail_text(decoder.encoding or FALLBACK_ENCODING)
+            self.session_log(session, f"Знайдений текст: '{tail[-100:]}'", "info")
+            if data_processor.current_transaction_lines:
+                self.session_log(session, f"Рядків чека принтера зіставлено з кошиком: "
+                                          f"{len(data_processor.current_transaction_lines)} з {len(session.products)}")
+
+            # Відправляємо фінальний чек
+            t0 = perf_counter()
+            msg = "\n" + "=" * 40 + "\n"
+            msg += self.receipt_formatter.format_success_receipt(session.products, session.total)
+            msg += "\n" + "=" * 40 + "\n"
+            t = perf_counter()
+            self.metrics.observe(FORMAT, t - t0)
+            if self.archive:
+                self.archive.add(session.register_id, KIND_SALE, session.products, session.total, msg.strip("\n"))
+
+            self.send_receipt(session, KIND_SALE, msg)
+            self.send_event(session, EVENT_COMMIT, total=session.total,
+                            items=[item_fields(item) for item in session.products.values()])
+            self.metrics.observe(FANOUT, perf_counter() - t)
+            self.session_log(session, f"ТРАНЗАКЦІЮ ЗАВЕРШЕНО | Сума: {session.total} грн", "success")
+            session.completed += 1
+
+            # ВАЖЛИВО: Очищення даних і встановлення active = False
+            self._reset_session(session)
+            return True
+
+        # Логуємо, якщо не розпізнали
+        elif not matcher.found:
+            self.session_log(session, f"TCP дані не розпізнані: {text[:50]}", "warning")
+
+        return False
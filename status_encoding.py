@@ -0,0 +1,88 @@
+"""Кодування статусів принтера: визначення один раз і потокове декодування.
+
+Раніше кожен шматок декодувався з нуля як cp1251 з errors="ignore" -
+cp1251 "декодує" будь-які байти, тож UTF-8 принтер давав кракозябри.
+Тепер кодування визначається за першими не-ASCII байтами трафіку
+(перше з ENCODINGS, що декодує їх без помилок; UTF-8 перевіряється
+першим, бо випадково валідний UTF-8 з cp1251 тексту майже неможливий)
+і кешується для каси. Рішення приймається лише після хоча б одного
+повного не-ASCII символу: обірваний межею шматка початок UTF-8
+символу чекає наступних байтів, а не вважається доказом UTF-8. Далі кожен новий шматок декодується лише одним
+інкрементальним декодером, тож символ, розірваний межею recv(), не
+губиться.
+
+Перевизначення в config.py:
+    STATUS_ENCODING   = "auto" або кодування для всіх принтерів;
+    PRINTER_ENCODINGS = {IP принтера або номер каси: кодування}.
+"""
+import codecs
+import re
+
+AUTO = "auto"
+
+# Кодування до визначення (лише ASCII байти) і якщо жодне з кандидатів не підійшло
+FALLBACK_ENCODING = "cp1251"
+
+NON_ASCII = re.compile(rb"[\x80-\xff]")
+
+
+def known_encodings(names):
+    """Кодування з names, які знає Python (без дублікатів, у тому ж порядку)"""
+    result = []
+    for name in names:
+        try:
+            codec = codecs.lookup(name).name
+        except LookupError:
+            continue
+        if codec not in result:
+            result.append(codec)
+    return tuple(result)
+
+
+def detect_encoding(data, candidates):
+    """Кодування байтів статусу; None - визначати рано (лише ASCII або не-ASCII символ не завершено)"""
+    if data.isascii():
+        return None
+    for encoding in candidates:
+        try:
+            # final=False: обірваний межею шматка символ в кінці - не помилка
+            text = codecs.getincrementaldecoder(encoding)().decode(data, False)
+        except UnicodeDecodeError:
+            continue
+        if text.isascii():
+            # Жодного повного не-ASCII символу - лише початок в кінці шматка
+            return None
+        return encoding
+    return FALLBACK_ENCODING
+
+
+class StatusDecoder:
+    """Декодування статусів одного TCP з'єднання"""
+
+    def __init__(self, encoding=None, candidates=("utf-8", FALLBACK_ENCODING)):
+        self.candidates = known_encodings(candidates)
+        self.encoding = None
+        self._decoder = None
+        self._pending = b""  # Байти від першого не-ASCII, поки кодування не визначено
+        if encoding:
+            self._use(encoding)
+
+    def _use(self, encoding):
+        self.encoding = codecs.lookup(encoding).name
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="ignore")
+
+    def decode(self, data):
+        """Текст нового шматка; повертає (текст, щойно визначене кодування або None)"""
+        detected = None
+        if self._decoder is None:
+            data = self._pending + data
+            detected = detect_encoding(data, self.candidates)
+            if detected is None:
+                # ASCII початок однаковий в усіх кандидатах; решта чекає наступного шматка
+                match = NON_ASCII.search(data)
+                end = match.start() if match else len(data)
+                self._pending = data[end:]
+                return data[:end].decode("ascii"), None
+            self._pending = b""
+            self._use(detected)
+        return self._decoder.decode(data), detected
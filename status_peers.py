@@ -0,0 +1,106 @@
+"""Облік з'єднань на порту статусів принтера.
+
+Всі з'єднання обслуговує один цикл подій (без потоку на з'єднання),
+а цей облік не дає несправному пристрою чи скануванню портів
+роздути кількість відкритих з'єднань:
+    - STATUS_MAX_CONNECTIONS - всього відкритих з'єднань;
+    - STATUS_MAX_PER_PEER    - з однієї IP адреси;
+    - STATUS_IDLE_TIMEOUT    - з'єднання без даних закривається.
+Зайві з'єднання закриваються одразу після прийому.
+
+Для кожної адреси ведеться статистика (з'єднання, байти, відхилені,
+закриті за простоєм); адрес без відкритих з'єднань зберігається не
+більше max_peers - найдавніші забуваються.
+"""
+import time
+
+REJECT_TOTAL = "total"
+REJECT_PEER = "peer"
+
+
+class PeerStats:
+    """Статистика однієї IP адреси"""
+
+    __slots__ = ("host", "open", "connections", "rejected", "idle_closed", "bytes", "chunks",
+                 "first_seen", "last_seen")
+
+    def __init__(self, host):
+        self.host = host
+        self.open = 0
+        self.connections = 0
+        self.rejected = 0
+        self.idle_closed = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.first_seen = self.last_seen = time.time()
+
+    def stats(self):
+        return {
+            'host': self.host,
+            'open': self.open,
+            'connections': self.connections,
+            'rejected': self.rejected,
+            'idle_closed': self.idle_closed,
+            'bytes': self.bytes,
+            'chunks': self.chunks,
+            'last_seen': self.last_seen,
+        }
+
+
+class StatusPeers:
+    """Ліміти і статистика з'єднань порту статусів (лише в потоці циклу)"""
+
+    def __init__(self, max_connections=32, max_per_peer=4, idle_timeout=300.0, max_peers=256):
+        self.max_connections = max(1, int(max_connections))
+        self.max_per_peer = max(1, int(max_per_peer))
+        self.idle_timeout = float(idle_timeout or 0) or None
+        self.max_peers = max(1, int(max_peers))
+        self.peers = {}
+        self.open = 0
+
+    def _peer(self, host):
+        peer = self.peers.get(host)
+        if peer is None:
+            if len(self.peers) >= self.max_peers:
+                self._forget_idle()
+            peer = self.peers[host] = PeerStats(host)
+        return peer
+
+    def _forget_idle(self):
+        closed = [peer for peer in self.peers.values() if not peer.open]
+        if closed:
+            del self.peers[min(closed, key=lambda peer: peer.last_seen).host]
+
+    def admit(self, host):
+        """Реєстрація нового з'єднання; None - прийнято, інакше причина відмови"""
+        peer = self._peer(host)
+        peer.last_seen = time.time()
+        if self.open >= self.max_connections:
+            reason = REJECT_TOTAL
+        elif peer.open >= self.max_per_peer:
+            reason = REJECT_PEER
+        else:
+            peer.open += 1
+            peer.connections += 1
+            self.open += 1
+            return None
+        peer.rejected += 1
+        return reason
+
+    def received(self, host, size):
+        peer = self.peers.get(host)
+        if peer is not None:
+            peer.bytes += size
+            peer.chunks += 1
+            peer.last_seen = time.time()
+
+    def closed(self, host, idle=False):
+        self.open -= 1
+        peer = self.peers.get(host)
+        if peer is not None:
+            peer.open -= 1
+            if idle:
+                peer.idle_closed += 1
+
+    def stats(self):
+        return [peer.stats() for peer in self.peers.values()]
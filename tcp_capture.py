@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Компактне захоплення сирого TCP трафіку принтера (порт статусів).
+
+Замість текстового tcp_server.log (роздільник, repr, HEX і чотири
+декодування на кожен шматок) пишемо двійкові записи з префіксом довжини:
+час, тип запису, адреса принтера і сирі байти. Декодування - лише
+при перегляді, у будь-якому кодуванні.
+
+Формат файлу:
+    заголовок  MAGIC (8 байт)
+    запис      <d B H I> час, тип, довжина адреси, довжина даних
+               далі адреса (UTF-8 "ip:port") і дані
+
+Перегляд і повтор у сервер:
+    python tcp_capture.py view tcp_capture.bin -e cp1251 -e utf-8 --hex
+    python tcp_capture.py replay tcp_capture.bin --port 4000 --speed 0
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+
+MAGIC = b"UPCAP\x01\r\n"
+RECORD_HEADER = struct.Struct("<dBHI")
+
+# Типи записів
+KIND_DATA = 0
+KIND_OPEN = 1
+KIND_CLOSE = 2
+KIND_NAMES = {KIND_DATA: "DATA", KIND_OPEN: "OPEN", KIND_CLOSE: "CLOSE"}
+
+CaptureRecord = namedtuple("CaptureRecord", "timestamp kind peer data")
+
+
+def format_peer(addr):
+    if isinstance(addr, tuple):
+        return f"{addr[0]}:{addr[1]}"
+    return str(addr)
+
+
+class CaptureWriter:
+    """Дописування записів у файл захоплення (буферизовано, без перетворень)"""
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.records = 0
+        self.bytes = 0
+        self._file = None
+
+    def open(self):
+        self._file = open(self.path, "ab", buffering=self.buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write(self, addr, data, kind=KIND_DATA, timestamp=None):
+        if self._file is None:
+            return
+        peer = format_peer(addr).encode("utf-8")
+        header = RECORD_HEADER.pack(timestamp or time.time(), kind, len(peer), len(data))
+        self._file.write(header + peer + data)
+        self.records += 1
+        self.bytes += len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def truncate(self):
+        """Очищення файлу без закриття для виробників"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = open(self.path, "wb", buffering=self.buffer_size)
+        self._file.write(MAGIC)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_records(path):
+    """Ліниве читання записів: дані не декодуються"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: не файл захоплення UniPro")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, kind, peer_len, data_len = RECORD_HEADER.unpack(header)
+            peer = f.read(peer_len).decode("utf-8", errors="replace")
+            data = f.read(data_len)
+            if len(data) < data_len:
+                # Обірваний останній запис (процес зупинено під час запису)
+                return
+            yield CaptureRecord(timestamp, kind, peer, data)
+
+
+def view(args):
+    encodings = args.encoding or ["cp1251"]
+    shown = 0
+    for record in iter_records(args.file):
+        if args.peer and not record.peer.startswith(args.peer):
+            continue
+        if record.kind != KIND_DATA:
+            if not args.data_only:
+                stamp = datetime.fromtimestamp(record.timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+                print(f"[{stamp}] {KIND_NAMES.get(record.kind, record.kind)} {record.peer}")
+            continue
+        if args.grep:
+            if not any(args.grep.lower() in record.data.decode(e, errors="ignore").lower() for e in encodings):
+                continue
+
+        stamp = datetime.fromtimestamp(record.timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        print("=" * 60)
+        print(f"[{stamp}] Від: {record.peer}")
+        print(f"RAW байти ({len(record.data)}): {record.data!r}" if args.raw else f"Байтів: {len(record.data)}")
+        if args.hex:
+            print(f"HEX: {record.data.hex()}")
+        for encoding in encodings:
+            print(f"{encoding.upper()}: {record.data.decode(encoding, errors='replace')}")
+        shown += 1
+        if args.limit and shown >= args.limit:
+            break
+
+
+def replay(args):
+    """Повтор захопленого трафіку в сервер (кожен принтер - своє з'єднання)"""
+    connections = {}
+    previous = None
+    sent = 0
+
+    def connect(peer):
+        sock = socket.create_connection((args.host, args.port), timeout=5)
+        connections[peer] = sock
+        return sock
+
+    try:
+        for record in iter_records(args.file):
+            if args.peer and not record.peer.startswith(args.peer):
+                continue
+            if previous is not None and args.speed > 0:
+                time.sleep(max(0.0, (record.timestamp - previous) / args.speed))
+            previous = record.timestamp
+
+            if record.kind == KIND_OPEN:
+                old = connections.pop(record.peer, None)
+                if old:
+                    old.close()
+                connect(record.peer)
+            elif record.kind == KIND_CLOSE:
+                sock = connections.pop(record.peer, None)
+                if sock:
+                    sock.close()
+            else:
+                sock = connections.get(record.peer) or connect(record.peer)
+                try:
+                    sock.sendall(record.data)
+                except OSError:
+                    # Сервер закрив з'єднання (операцію завершено) - відкриваємо нове
+                    connect(record.peer).sendall(record.data)
+                sent += 1
+    finally:
+        for sock in connections.values():
+            sock.close()
+    print(f"Відправлено записів: {sent}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перегляд і повтор захопленого TCP трафіку принтера")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_view = sub.add_parser("view", help="показати записи")
+    p_view.add_argument("file")
+    p_view.add_argument("-e", "--encoding", action="append", help="кодування для показу (можна кілька)")
+    p_view.add_argument("--hex", action="store_true", help="показати HEX")
+    p_view.add_argument("--raw", action="store_true", help="показати repr сирих байтів")
+    p_view.add_argument("--peer", help="лише записи від цієї адреси (префікс)")
+    p_view.add_argument("--grep", help="лише записи, що містять текст")
+    p_view.add_argument("--data-only", action="store_true", help="без записів OPEN/CLOSE")
+    p_view.add_argument("--limit", type=int, default=0, help="максимум записів")
+    p_view.set_defaults(func=view)
+
+    p_replay = sub.add_parser("replay", help="повторити трафік у сервер")
+    p_replay.add_argument("file")
+    p_replay.add_argument("--host", default="127.0.0.1")
+    p_replay.add_argument("--port", type=int, default=4000)
+    p_replay.add_argument("--speed", type=float, default=1.0, help="множник швидкості, 0 - без пауз")
+    p_replay.add_argument("--peer", help="лише записи від цієї адреси (префікс)")
+    p_replay.set_defaults(func=replay)
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.file):
+        parser.error(f"файл не знайдено: {args.file}")
+    try:
+        args.func(args)
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
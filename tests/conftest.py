@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модулі сервера лежать у корені репозиторію
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,87 @@
+from cart_diff import ADD, UPDATE, REMOVE, CartDiff
+from line_items import LineItem
+
+
+def events(diff, *items):
+    return [(action, name) for action, name, _, _ in diff.apply([LineItem(*item) for item in items])]
+
+
+def test_add_update_remove():
+    diff = CartDiff()
+
+    assert events(diff, ("Хліб", 20.0, 1, 20.0)) == [(ADD, "Хліб")]
+    assert events(diff, ("Хліб", 20.0, 2, 40.0), ("Молоко", 35.5, 1, 35.5)) == [(UPDATE, "Хліб"), (ADD, "Молоко")]
+    assert events(diff, ("Молоко", 35.5, 1, 35.5)) == [(REMOVE, "Хліб")]
+    assert events(diff, ("Молоко", 35.5, 1, 35.5)) == []
+    assert list(diff.items) == ["Молоко"]
+
+
+def test_update_carries_old_and_new_line():
+    diff = CartDiff()
+    diff.apply([LineItem("Хліб", 20.0, 1, 20.0)])
+
+    [(action, name, new, old)] = diff.apply([LineItem("Хліб", 20.0, 3, 60.0)])
+
+    assert (action, new.qty, old.qty) == (UPDATE, 3, 1)
+
+
+def test_same_name_lines_are_merged():
+    diff = CartDiff()
+
+    assert events(diff, ("Хліб", 20.0, 1, 20.0), ("Хліб", 20.0, 2, 40.0), ("", 0, 1, 0)) == [(ADD, "Хліб")]
+    assert diff.items["Хліб"].values() == (3, 20.0, 60.0)
+
+
+def test_duplicate_datagram_is_skipped_by_fingerprint():
+    diff = CartDiff()
+    data = '{"goods":[{"fPName":"Хліб"}]}'.encode()
+
+    assert not diff.is_duplicate(data)
+    assert diff.is_duplicate(bytes(data))
+    assert not diff.is_duplicate(data.replace("Хліб".encode(), "Хлеб".encode()))
+    assert diff.skipped == 1
+
+    diff.reset()
+    assert not diff.is_duplicate(data)
+
+
+def held(diff, *items):
+    diff.hold(diff.apply([LineItem(*item) for item in items]))
+
+
+def test_pending_add_then_remove_cancels_out():
+    diff = CartDiff()
+    held(diff, ("Молоко", 35.5, 1, 35.5))
+    diff.take_pending()
+
+    held(diff, ("Молоко", 35.5, 1, 35.5), ("Хліб", 20.0, 1, 20.0))
+    held(diff, ("Молоко", 35.5, 1, 35.5))
+
+    assert diff.take_pending() == []
+    assert diff.pending == {}
+
+
+def test_pending_merges_to_net_change_from_window_start():
+    diff = CartDiff()
+    held(diff, ("Молоко", 35.5, 1, 35.5), ("Сир", 99.0, 1, 99.0))
+    diff.take_pending()
+
+    held(diff, ("Молоко", 35.5, 2, 71.0), ("Сир", 99.0, 1, 99.0))
+    held(diff, ("Молоко", 35.5, 3, 106.5), ("Хліб", 20.0, 1, 20.0))
+    held(diff, ("Молоко", 35.5, 3, 106.5), ("Хліб", 20.0, 2, 40.0))
+
+    pending = {name: (action, new, old) for action, name, new, old in diff.take_pending()}
+    assert {name: action for name, (action, _, _) in pending.items()} == {"Молоко": UPDATE, "Сир": REMOVE, "Хліб": ADD}
+    assert (pending["Молоко"][1].qty, pending["Молоко"][2].qty) == (3, 1)
+    assert pending["Хліб"][1].qty == 2
+
+
+def test_pending_back_to_start_is_no_change():
+    diff = CartDiff()
+    held(diff, ("Молоко", 35.5, 1, 35.5))
+    diff.take_pending()
+
+    held(diff, ("Молоко", 35.5, 2, 71.0))
+    held(diff, ("Молоко", 35.5, 1, 35.5))
+
+    assert diff.take_pending() == []
@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from client_protocol import (FRAMING_JSON, FRAMING_LP, LENGTH_PREFIX, PROTO_LEGACY, PROTO_V2, EVENT_DELTA, EVENT_HELLO,
+                             EVENT_SNAPSHOT, EncodedEvent, make_event, parse_proto)
+from data_processor import DataProcessor
+from receipt_formatter import ReceiptFormatter
+from server_core import POSServerCore
+
+
+class FakeClient:
+    """Клієнт без сокета: байти з черги - у received"""
+
+    def __init__(self, register_id=None):
+        self.addr = ("127.0.0.9", 50000)
+        self.register_id = register_id
+        self.proto = PROTO_LEGACY
+        self.framing = None
+        self.over_limit = False
+        self.received = []
+
+    def enqueue(self, data, incremental=True):
+        self.received.append(data)
+        return True
+
+    def take(self):
+        data, self.received = b"".join(self.received), []
+        return data
+
+
+def json_frames(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+def lp_frames(data):
+    events = []
+    while data:
+        (size,) = LENGTH_PREFIX.unpack_from(data)
+        events.append(json.loads(data[4:4 + size]))
+        data = data[4 + size:]
+    return events
+
+
+def negotiated(data, framing):
+    """hello (завжди JSON рядок) і події вибраного формату після нього"""
+    hello, _, rest = data.partition(b"\n")
+    return json.loads(hello), json_frames(rest) if framing == FRAMING_JSON else lp_frames(rest)
+
+
+def cart_datagram(*items):
+    goods = [{"fPName": name, "fPrice": price, "fQtty": qty, "fSum": price * qty} for name, price, qty in items]
+    return json.dumps({"cmd": {"cmd": ""}, "goods": goods,
+                       "sum": {"sum": sum(good["fSum"] for good in goods)}}).encode("utf-8")
+
+
+@pytest.fixture
+def core():
+    core = POSServerCore(lambda *_: None, DataProcessor, ReceiptFormatter())
+    core.coalesce_window = 0  # кожна датаграма - одразу події
+    core.sessions.ring_size = 4
+    return core
+
+
+def test_parse_proto():
+    assert parse_proto(["1"]) == (PROTO_LEGACY, None, {})
+    assert parse_proto(["2"]) == (PROTO_V2, FRAMING_JSON, {})
+    assert parse_proto(["2", "LP", "41"]) == (PROTO_V2, FRAMING_LP, {None: 41})
+    assert parse_proto(["2", "json", "127.0.0.2:17", "3:120"]) == (PROTO_V2, FRAMING_JSON, {"127.0.0.2": 17, "3": 120})
+    for args in ([], ["3"], ["2", "xml"], ["2", "json", "abc"]):
+        with pytest.raises(ValueError):
+            parse_proto(args)
+
+
+def test_framing_json_and_length_prefixed():
+    encoded = EncodedEvent(make_event(EVENT_DELTA, "1", 5, changes=[{"op": "add", "name": "Хліб\nбатон"}]))
+
+    line = encoded.framed(FRAMING_JSON)
+    assert line.endswith(b"\n") and line.count(b"\n") == 1  # перенос у назві екранується
+    assert json_frames(line)[0]["changes"][0]["name"] == "Хліб\nбатон"
+
+    framed = encoded.framed(FRAMING_LP)
+    assert LENGTH_PREFIX.unpack_from(framed)[0] == len(framed) - 4
+    assert lp_frames(framed) == json_frames(line)
+    assert encoded.framed(FRAMING_LP) is framed  # кодування один раз на формат
+
+
+def test_seq_monotonic_per_register(core):
+    client = FakeClient()
+    core.fanout.clients.append(client)
+    core.negotiate_protocol(client, ["2", "lp"])
+    client.take()
+
+    for items in ([("Хліб", 20.0, 1)], [("Хліб", 20.0, 2)], [("Хліб", 20.0, 2), ("Молоко", 35.5, 1)]):
+        core.handle_datagram(cart_datagram(*items), ("127.0.0.1", 4001))
+        core.handle_datagram(cart_datagram(*items[:1]), ("127.0.0.2", 4001))
+
+    seqs = {}
+    for event in lp_frames(client.take()):
+        seqs.setdefault(event["register"], []).append(event["seq"])
+    assert set(seqs) == {"127.0.0.1", "127.0.0.2"}
+    for register_seqs in seqs.values():
+        assert register_seqs == list(range(1, len(register_seqs) + 1))
+
+
+@pytest.mark.parametrize("framing", [FRAMING_JSON, FRAMING_LP])
+def test_resume_replays_gap_from_ring(core, framing):
+    for qty in range(1, 3):
+        core.handle_datagram(cart_datagram(("Хліб", 20.0, qty)), ("127.0.0.1", 4001))
+    session = core.sessions.get("127.0.0.1")
+    last = session.seq
+
+    client = FakeClient("127.0.0.1")
+    core.negotiate_protocol(client, ["2", framing, str(last - 2)])
+    hello, events = negotiated(client.take(), framing)
+
+    assert hello["type"] == EVENT_HELLO and hello["seq"] == {"127.0.0.1": last}
+    assert [event["seq"] for event in events] == [last - 1, last]
+    assert client.proto == PROTO_V2 and client.framing == framing
+
+
+def test_resume_up_to_date_sends_nothing(core):
+    core.handle_datagram(cart_datagram(("Хліб", 20.0, 1)), ("127.0.0.1", 4001))
+    last = core.sessions.get("127.0.0.1").seq
+
+    client = FakeClient()
+    core.negotiate_protocol(client, ["2", "json", f"127.0.0.1:{last}"])
+
+    assert negotiated(client.take(), FRAMING_JSON)[1] == []
+
+
+@pytest.mark.parametrize("resume", ["1", "999"])  # кільце вже не містить / сервер перезапущено
+def test_resume_outside_ring_falls_back_to_snapshot(core, resume):
+    for qty in range(1, 6):
+        core.handle_datagram(cart_datagram(("Хліб", 20.0, qty)), ("127.0.0.1", 4001))
+    session = core.sessions.get("127.0.0.1")
+    assert session.seq > len(session.events) + 1  # початок потоку вже витіснено з кільця
+
+    client = FakeClient("127.0.0.1")
+    core.negotiate_protocol(client, ["2", "json", resume])
+    _, events = negotiated(client.take(), FRAMING_JSON)
+
+    assert len(events) == 1
+    snapshot = events[0]
+    assert snapshot["type"] == EVENT_SNAPSHOT and snapshot["seq"] == session.seq
+    assert snapshot["active"] is True and snapshot["total"] == 100.0
+    assert snapshot["items"] == [{"name": "Хліб", "qty": 5, "price": 20.0, "sum": 100.0}]
@@ -0,0 +1,26 @@
+import os
+
+import config
+from config_template import CONFIG_TEMPLATE, render_config_py, set_config_ports
+
+CONFIG_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.py")
+
+
+def test_template_matches_config_py():
+    with open(CONFIG_PY, encoding="utf-8") as f:
+        assert CONFIG_TEMPLATE == f.read()
+
+
+def test_render_keeps_comments_and_all_keys():
+    text = render_config_py({'TCP_STATUS_PORT': 5000, 'UDP_JSON_PORT': 5001, 'TCP_CLIENT_PORT': 5002})
+    settings = {}
+    exec(text, settings)
+
+    assert "TCP_STATUS_PORT = 5000    # TCP для статусов от принтера" in text
+    assert (settings['TCP_STATUS_PORT'], settings['UDP_JSON_PORT'], settings['TCP_CLIENT_PORT']) == (5000, 5001, 5002)
+    assert {name for name in settings if name.isupper()} == {name for name in vars(config) if name.isupper()}
+
+
+def test_missing_port_line_appended():
+    assert set_config_ports("ENCODINGS = ['utf-8']\n", {'TCP_CLIENT_PORT': 4010}) == \
+        "ENCODINGS = ['utf-8']\n\nTCP_CLIENT_PORT = 4010\n"
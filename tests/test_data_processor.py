@@ -0,0 +1,47 @@
+from data_processor import DataProcessor
+from line_items import CartSnapshot, LineItem
+
+
+def loaded(*names):
+    processor = DataProcessor()
+    processor.process_json_data(CartSnapshot("", [LineItem(name, 10.0, 1, 10.0) for name in names], 10.0 * len(names)))
+    return processor
+
+
+def test_delete_marker_split_across_chunks():
+    processor = loaded("Молоко", "Хліб")
+
+    assert processor.process_status_text("Видалено то") == ([], [])
+    deleted, _ = processor.process_status_text("вар: Молоко\n")
+
+    assert [item.name for item in deleted] == ["Молоко"]
+
+
+def test_partial_line_does_not_prefix_match():
+    processor = loaded("Молоко", "Мармелад")
+
+    assert processor.process_status_text("Мол") == ([], [])
+    _, matched = processor.process_status_text("око 1 x 10.00\r\n")
+
+    assert [item.name for item in matched] == ["Молоко"]
+
+
+def test_tail_dropped_when_stream_ends():
+    processor = loaded("Молоко")
+    processor.process_status_text("Видалено товар: Мол")
+    processor.end_status_stream()
+
+    assert processor.process_status_text("око\n") == ([], [])
+
+
+def test_new_items_extend_index_without_rebuild():
+    processor = loaded("Молоко")
+    index = processor.index
+    processor.process_json_data(CartSnapshot("", [LineItem("Молоко", 10.0, 1, 10.0), LineItem("Хліб", 20.0, 1, 20.0)],
+                                             30.0))
+
+    assert processor.index is index
+    assert processor.match_line("Хліб 1 x 20.00").name == "Хліб"
+
+    processor.process_json_data(CartSnapshot("", [LineItem("Хліб", 20.0, 1, 20.0)], 20.0))
+    assert processor.match_line("Молоко") is None
@@ -0,0 +1,114 @@
+import json
+import os
+
+from journal import Journal, segment_name
+
+
+def event(kind, register, seq, **fields):
+    fields.update(type=kind, register=register, seq=seq)
+    return json.dumps(fields, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def item(name, qty=1, price=10.0):
+    return {"name": name, "qty": qty, "price": price, "sum": qty * price}
+
+
+def sale(register, seq, name):
+    """Завершена операція: start, delta, total, commit"""
+    return [
+        event("start", register, seq),
+        event("delta", register, seq + 1, changes=[dict(item(name), op="add")]),
+        event("total", register, seq + 2, total=10.0),
+        event("commit", register, seq + 3, total=10.0, items=[item(name)]),
+    ]
+
+
+def write_segment(directory, number, lines):
+    with open(os.path.join(directory, segment_name(number)), "wb") as f:
+        f.write(b"".join(lines))
+
+
+def test_recover_skips_line_torn_by_crash(tmp_path):
+    lines = sale("1", 1, "Хліб") + [
+        event("start", "1", 5),
+        event("delta", "1", 6, changes=[dict(item("Молоко", 2), op="add")]),
+    ]
+    torn = event("delta", "1", 7, changes=[dict(item("Сир"), op="add")])
+    write_segment(tmp_path, 1, lines + [torn[:len(torn) // 2]])
+
+    state = Journal(str(tmp_path)).recover()
+
+    assert state.corrupt == 1
+    [cart] = state.open_carts()
+    assert cart.seq == 6
+    assert list(cart.items) == ["Молоко"]
+
+
+def test_compact_after_truncation_keeps_open_cart(tmp_path):
+    torn = event("delta", "2", 3)
+    write_segment(tmp_path, 1, sale("1", 1, "Хліб"))
+    write_segment(tmp_path, 2, [event("start", "2", 1),
+                                event("delta", "2", 2, changes=[dict(item("Кава"), op="add")]),
+                                torn[:-5]])
+    journal = Journal(str(tmp_path))
+    journal.compact([1, 2])
+
+    assert journal.segments() == [1]
+    state = journal.recover()
+    assert state.carts["1"].seq == 4 and not state.carts["1"].active
+    [cart] = state.open_carts()
+    assert (cart.register_id, cart.seq, list(cart.items)) == ("2", 2, ["Кава"])
+
+
+def test_compaction_is_one_snapshot_per_register_and_does_not_grow(tmp_path):
+    journal = Journal(str(tmp_path))
+    write_segment(tmp_path, 1, sale("1", 1, "Хліб") + sale("2", 1, "Сир"))
+    write_segment(tmp_path, 2, sale("1", 5, "Молоко") + [event("start", "2", 5)])
+    journal.compact([1, 2])
+    first = os.path.getsize(os.path.join(tmp_path, segment_name(1)))
+
+    with open(os.path.join(tmp_path, segment_name(1)), "rb") as f:
+        snapshots = [json.loads(line) for line in f]
+    assert [(s["type"], s["register"], s["seq"], s["items"]) for s in snapshots] == [
+        ("snapshot", "1", 8, []), ("snapshot", "2", 5, [])]
+
+    # Ще продажі і друге стиснення: розмір лишається тим самим
+    write_segment(tmp_path, 2, sale("1", 9, "Хліб") + sale("2", 6, "Кава"))
+    journal.compact([1, 2])
+    second = os.path.getsize(os.path.join(tmp_path, segment_name(1)))
+
+    assert second <= first + 2  # лише довші номери seq
+    state = journal.recover()
+    assert state.carts["1"].seq == 12 and state.carts["2"].seq == 9
+    assert state.open_carts() == []
+
+
+def test_crash_mid_write_then_restart_compacts(tmp_path):
+    journal = Journal(str(tmp_path), compact_segments=2, fsync_interval=0)
+    journal.start()
+    for line in sale("1", 1, "Хліб") + [event("start", "1", 5),
+                                        event("delta", "1", 6, changes=[dict(item("Сир"), op="add")])]:
+        journal.append(line)
+    journal.stop()
+
+    # Збій посеред запису наступного рядка
+    path = os.path.join(tmp_path, segment_name(1))
+    with open(path, "ab") as f:
+        f.write(event("delta", "1", 7, changes=[dict(item("Кава"), op="add")])[:20])
+
+    restarted = Journal(str(tmp_path), compact_segments=2, fsync_interval=0)
+    state = restarted.recover()
+    assert state.corrupt == 1
+    assert [(c.seq, list(c.items)) for c in state.open_carts()] == [(6, ["Сир"])]
+
+    restarted.start()
+    restarted.append(event("total", "1", 7, total=10.0))
+    restarted.stop()
+    restarted.start()  # другий перезапуск: сегментів 2 - стиснення
+    restarted.stop()
+
+    assert restarted.compactions == 1
+    state = Journal(str(tmp_path)).recover()
+    assert state.corrupt == 0
+    [cart] = state.open_carts()
+    assert (cart.seq, list(cart.items), cart.total) == (7, ["Сир"], 10.0)
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from line_items import select_decoder
+
+DECODERS = ["json", "orjson", "msgspec"]
+
+
+def decoder(name):
+    selected, decode = select_decoder(name)
+    if selected != name:
+        pytest.skip(f"{name} не встановлено")
+    return decode
+
+
+@pytest.mark.parametrize("name", DECODERS)
+def test_decode_cart(name):
+    decode = decoder(name)
+    data = json.dumps({"cmd": {"cmd": ""}, "sum": {"sum": 75.5}, "goods": [
+        {"fPName": "Хліб", "fPrice": 20.0, "fQtty": 2, "fSum": 40.0, "fCode": 7},
+        {"fPName": "Молоко", "fPrice": 35.5, "fQtty": 1, "fSum": 35.5}]}).encode()
+
+    cart = decode(data)
+
+    assert cart.cmd == "" and cart.total == 75.5
+    assert [(i.name, i.price, i.qty, i.sum) for i in cart.items] == [("Хліб", 20.0, 2, 40.0), ("Молоко", 35.5, 1, 35.5)]
+    assert cart.items[0].merged(cart.items[0]).values() == (4, 20.0, 80.0)
+
+
+@pytest.mark.parametrize("name", DECODERS)
+def test_clear_with_nulls(name):
+    cart = decoder(name)(b'{"cmd": {"cmd": "clear"}, "goods": null, "sum": null}')
+
+    assert (cart.cmd, list(cart.items), cart.total) == ("clear", [], 0)
+
+
+@pytest.mark.parametrize("name", DECODERS)
+@pytest.mark.parametrize("data", [b"{", b"[1]", b'{"goods": [1]}', b'{"goods": {"a": 1}}', b'{"sum": [1]}',
+                                  b'{"cmd": "clear"}'])
+def test_malformed_is_value_error(name, data):
+    with pytest.raises(ValueError):
+        decoder(name)(data)
@@ -0,0 +1,41 @@
+import time
+
+from log_writer import LogWriter
+
+
+def test_index_advances_only_after_flush(tmp_path):
+    writer = LogWriter(str(tmp_path / "pos.log"), flush_interval=30.0, echo=False)
+    writer.start()
+    try:
+        for number in range(100):
+            writer.write(f"рядок {number}\n")
+        time.sleep(0.2)  # записано в буфер файлу, але не скинуто
+
+        index = writer.index
+        assert len(index) == 0
+        assert index.read(0, 10) == []
+
+        writer.flush()
+        assert len(index) == 100
+        assert index.read(98, 5) == ["рядок 98", "рядок 99"]
+        assert index.search("рядок 5")[-1] == 5
+    finally:
+        writer.stop()
+
+
+def test_multiline_record_and_reopen(tmp_path):
+    path = str(tmp_path / "pos.log")
+    writer = LogWriter(path, echo=False)
+    writer.start()
+    writer.write("перший\nдругий\n")
+    writer.write("третій\n")
+    writer.stop()
+
+    reopened = LogWriter(path, echo=False)
+    reopened.start()
+    reopened.write("четвертий\n")
+    reopened.flush()
+    try:
+        assert reopened.index.read(0, 10) == ["перший", "другий", "третій", "четвертий"]
+    finally:
+        reopened.stop()
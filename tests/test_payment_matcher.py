@@ -0,0 +1,129 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from payment_matcher import RETURN, SUCCESS, PaymentPatterns, RuleEngine, build_patterns
+
+PATTERNS = PaymentPatterns(build_patterns())
+
+
+def feed_split(text, encoding, split):
+    matcher = PATTERNS.matcher()
+    data = text.encode(encoding)
+    found = matcher.feed(data[:split]) + matcher.feed(data[split:])
+    return matcher, found
+
+
+@pytest.mark.parametrize("encoding", ["cp1251", "utf-8"])
+def test_pattern_split_across_chunks(encoding):
+    text = "Касир 1\nДякуємо за покупку!\n"
+    data = text.encode(encoding)
+    pattern_end = data.index("покупку".encode(encoding)) + 3  # всередині слова (і символу в UTF-8)
+
+    for split in range(1, pattern_end):
+        matcher, found = feed_split(text, encoding, split)
+        assert [kind for kind, _ in found] == [SUCCESS], split
+        assert matcher.has(SUCCESS) and not matcher.has(RETURN)
+
+
+@pytest.mark.parametrize("encoding", ["cp1251", "utf-8"])
+def test_return_split_byte_by_byte(encoding):
+    matcher = PATTERNS.matcher()
+    for byte in "ПОВЕРНЕННЯ №5".encode(encoding):
+        matcher.feed(bytes([byte]))
+
+    assert matcher.has(RETURN)
+    assert encoding in matcher.found[RETURN]
+
+
+def test_no_match_in_unrelated_text():
+    matcher = PATTERNS.matcher()
+    matcher.feed("Дякуємо за пок".encode("cp1251"))
+    matcher.feed("аз\n".encode("cp1251"))
+    matcher.feed("Знижка на наступну покупку 5%\nСплачено\n".encode("cp1251"))
+
+    assert not matcher.found
+
+
+@pytest.mark.parametrize("encoding", ["cp1251", "utf-8"])
+@pytest.mark.parametrize("text", ["Дякуємо За Покупку", "дЯКУЄМО зА пОКУПКУ", "ДЯКУЕМО ЗА ПОКУПКУ"])
+def test_mixed_case(encoding, text):
+    matcher = PATTERNS.matcher()
+    matcher.feed(f"Чек 12\n{text}\n".encode(encoding))
+
+    assert matcher.has(SUCCESS) and not matcher.has(RETURN)
+
+
+def test_hex_pattern_is_exact():
+    patterns = PaymentPatterns(build_patterns(hex_patterns=[(SUCCESS, "1b4141")]))
+
+    assert patterns.matcher().feed(b"\x00\x1bAA") == [(SUCCESS, "HEX 1b4141")]
+    assert patterns.matcher().feed(b"\x1baa") == []
+
+
+def rules_config(**settings):
+    settings.setdefault("SUCCESS_INDICATORS", ["Дякуємо за покупку"])
+    settings.setdefault("RETURN_INDICATORS", ["Повернення"])
+    return SimpleNamespace(**settings)
+
+
+def test_rule_engine_reload():
+    engine = RuleEngine()
+    engine.load(rules_config(SUCCESS_INDICATORS=["Готово"], PAYMENT_HEX_PATTERNS=[(RETURN, "1b52")]))
+    matcher = engine.matcher()
+
+    assert matcher.feed("ГОТОВО\n".encode("cp1251")) == [(SUCCESS, "'Готово' (cp1251)")]
+    assert engine.matcher().feed(b"\x1bR") == [(RETURN, "HEX 1b52")]
+    assert not engine.matcher().feed("Дякуємо за покупку".encode("cp1251"))
+    assert engine.version == 1
+
+
+@pytest.mark.parametrize("settings, error", [
+    ({"PAYMENT_REGEX_RULES": [("paid", r"ok")]}, ValueError),
+    ({"PAYMENT_HEX_PATTERNS": [("oops", "00")]}, ValueError),
+    ({"PAYMENT_HEX_PATTERNS": [(SUCCESS, "zz")]}, ValueError),
+    ({"PAYMENT_REGEX_RULES": [(SUCCESS, r"(до сплати")]}, re.error),
+])
+def test_rule_engine_keeps_previous_rules_on_error(settings, error):
+    engine = RuleEngine()
+    previous = engine.load(rules_config(SUCCESS_INDICATORS=["Готово"]))
+
+    with pytest.raises(error):
+        engine.load(rules_config(**settings))
+
+    assert engine.compiled is previous and engine.version == 1
+    assert engine.matcher().has(SUCCESS) is False
+    assert engine.matcher().feed("Готово".encode("utf-8"))
+
+
+def test_rule_hits_survive_reload_and_prune_removed_rules():
+    engine = RuleEngine()
+    engine.load(rules_config(SUCCESS_INDICATORS=["Готово", "Сплачено"]))
+    engine.matcher().feed("Готово Сплачено".encode("cp1251"))
+    engine.matcher().feed("Готово".encode("utf-8"))
+
+    # Відкрите з'єднання зі старими правилами рахує і після перезавантаження
+    old = engine.matcher()
+    engine.load(rules_config(SUCCESS_INDICATORS=["Готово"]))
+    old.feed("Сплачено".encode("cp1251"))
+
+    stats = dict(engine.stats())
+    assert stats["success: 'готово'"] == 2
+    assert "success: 'сплачено'" not in stats
+    assert stats["return: 'повернення'"] == 0
+
+
+@pytest.mark.parametrize("encoding", ["cp1251", "utf-8"])
+def test_regex_match_spanning_chunks(encoding):
+    engine = RuleEngine()
+    engine.load(rules_config(PAYMENT_REGEX_RULES=[(SUCCESS, r"до\s+сплати\s+\d+")]))
+    data = "Чек 5\nДО  СПЛАТИ 120\n".encode(encoding)
+    split = data.index("СПЛАТИ".encode(encoding)) + 3
+
+    matcher = engine.matcher()
+    assert matcher.feed(data[:split]) == []
+    assert matcher.feed(data[split:]) == [(SUCCESS, "/до\\s+сплати\\s+\\d+/")]
+    # Той самий збіг не рахується вдруге з наступним шматком
+    assert matcher.feed(b"\n") == []
+    assert dict(engine.stats())["success: /до\\s+сплати\\s+\\d+/"] == 1
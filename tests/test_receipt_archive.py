@@ -0,0 +1,62 @@
+import pytest
+
+from line_items import LineItem
+from receipt_archive import ReceiptArchive
+from receipt_formatter import KIND_RETURN, KIND_SALE
+
+DAY = 24 * 3600
+
+
+def cart(*items):
+    return {name: LineItem(name, price, qty, price * qty) for name, price, qty in items}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ReceiptArchive(str(tmp_path / "receipts.db"), batch_interval=0)
+    archive.start()
+    archive.add("1", KIND_SALE, cart(("Хліб білий", 20.0, 2), ("Молоко", 35.5, 1)), 75.5, "чек 1", ts=1 * DAY)
+    archive.add("2", KIND_SALE, cart(("ХЛІБ житній", 25.0, 1)), 25.0, "чек 2", ts=2 * DAY)
+    archive.add("1", KIND_RETURN, cart(("Молоко", 35.5, 1)), 35.5, "чек 3", ts=3 * DAY)
+    archive.add("2", KIND_SALE, cart(("Ірис", 5.0, 10)), 50.0, "чек 4", ts=4 * DAY)
+    archive.stop()
+    assert archive.error is None and archive.written == 4
+    return archive
+
+
+def texts(archive, rows):
+    return [archive.receipt(row["id"])["text"] for row in rows]
+
+
+def test_search_by_register(archive):
+    assert texts(archive, archive.query(register="1")) == ["чек 3", "чек 1"]  # новіші першими
+    assert texts(archive, archive.query(register=2, kind=KIND_SALE)) == ["чек 4", "чек 2"]
+
+
+def test_search_by_time_range(archive):
+    assert texts(archive, archive.query(start=2 * DAY, end=4 * DAY)) == ["чек 3", "чек 2"]
+    assert texts(archive, archive.query(end=2 * DAY)) == ["чек 1"]
+
+
+def test_search_by_total(archive):
+    assert texts(archive, archive.query(min_total=35.5, max_total=75.5)) == ["чек 4", "чек 3", "чек 1"]
+    assert texts(archive, archive.query(max_total=30)) == ["чек 2"]
+
+
+@pytest.mark.parametrize("prefix", ["хліб", "ХЛІБ", "  Хлі"])
+def test_product_prefix_case_folded(archive, prefix):
+    assert texts(archive, archive.query(product=prefix)) == ["чек 2", "чек 1"]
+
+
+def test_product_prefix_with_other_filters(archive):
+    assert texts(archive, archive.query(product="і", register="2")) == ["чек 4"]  # "Ірис"
+    assert texts(archive, archive.query(product="молоко", kind=KIND_RETURN)) == ["чек 3"]
+    assert archive.query(product="хліб", start=3 * DAY) == []
+
+
+def test_product_sales_and_full_receipt(archive):
+    assert archive.product_sales("хліб") == [("Хліб білий", 1, 2.0, 40.0), ("ХЛІБ житній", 1, 1.0, 25.0)]
+
+    receipt = archive.receipt(archive.query(register="1", kind=KIND_SALE)[0]["id"])
+    assert receipt["items"] == [("Хліб білий", 2.0, 20.0, 40.0), ("Молоко", 1.0, 35.5, 35.5)]
+    assert (receipt["register"], receipt["total"], receipt["text"]) == ("1", 75.5, "чек 1")
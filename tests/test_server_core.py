@@ -0,0 +1,38 @@
+import asyncio
+import os
+
+from data_processor import DataProcessor
+from receipt_formatter import ReceiptFormatter
+from server_core import POSServerCore
+
+
+def write_config(path, text, mtime):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_rules_reload_from_operator_config(tmp_path):
+    path = tmp_path / "config.py"
+    write_config(path, 'SUCCESS_INDICATORS = ["Готово"]\n', 1_000_000_000)
+    messages = []
+    core = POSServerCore(lambda message, *_: messages.append(message), DataProcessor, ReceiptFormatter(), str(path))
+    core._config_mtime = core._config_stat()
+    assert core._read_config_file() and core._load_rules()
+    assert "success: 'готово'" in core.rules.compiled.rules
+
+    core.loop = asyncio.new_event_loop()
+    core.running = True
+    try:
+        # Той самий розмір файлу - байткод з кешу не підміняє нові правила
+        write_config(path, 'SUCCESS_INDICATORS = ["Гаразд"]\n', 2_000_000_000)
+        core._schedule_config_check(60)
+        rules = core.rules.compiled.rules
+        assert "success: 'гаразд'" in rules and "success: 'готово'" not in rules
+
+        # Синтаксична помилка - діють попередні правила
+        write_config(path, 'SUCCESS_INDICATORS = [\n', 3_000_000_000)
+        core._schedule_config_check(60)
+        assert "success: 'гаразд'" in core.rules.compiled.rules
+        assert any("config.py не завантажено" in message for message in messages)
+    finally:
+        core.loop.close()
@@ -0,0 +1,97 @@
+import pytest
+
+import server_core
+from data_processor import DataProcessor
+from receipt_formatter import ReceiptFormatter
+from server_core import POSServerCore
+from status_encoding import StatusDecoder, detect_encoding
+
+CANDIDATES = ["utf-8", "cp1251"]
+
+
+def decode_all(decoder, chunks):
+    return "".join(decoder.decode(chunk)[0] for chunk in chunks)
+
+
+@pytest.mark.parametrize("encoding", CANDIDATES)
+def test_detect_encoding(encoding):
+    assert detect_encoding(b"Status OK\r\n", CANDIDATES) is None
+    assert detect_encoding("Видалено товар: Хліб".encode(encoding), CANDIDATES) == encoding
+
+
+def test_trailing_lead_byte_is_not_utf8():
+    decoder = StatusDecoder(None, CANDIDATES)
+
+    assert decoder.decode(b"Status OK\r\n\xc2") == ("Status OK\r\n", None)
+    assert decoder.encoding is None
+
+    text, detected = decoder.decode(" товар: Хліб\n".encode("cp1251"))
+    assert detected == "cp1251"
+    assert text == "В товар: Хліб\n"
+
+
+@pytest.mark.parametrize("encoding", CANDIDATES)
+def test_character_split_across_chunks(encoding):
+    data = "OK\nВидалено товар: Хліб\n".encode(encoding)
+    start = data.index("В".encode(encoding))
+
+    for split in range(start, start + 3):
+        decoder = StatusDecoder(None, CANDIDATES)
+        assert decode_all(decoder, [data[:split], data[split:]]) == "OK\nВидалено товар: Хліб\n", split
+        assert decoder.encoding == encoding
+
+
+def test_utf8_split_byte_by_byte():
+    decoder = StatusDecoder(None, CANDIDATES)
+    data = "Дякуємо за покупку".encode("utf-8")
+
+    assert decode_all(decoder, [bytes([byte]) for byte in data]) == "Дякуємо за покупку"
+    assert decoder.encoding == "utf-8"
+
+
+@pytest.fixture
+def core():
+    return POSServerCore(lambda *_: None, DataProcessor, ReceiptFormatter())
+
+
+def feed_status(core, host, data):
+    session = core.sessions.for_addr((host, 50000))
+    decoder = core._status_decoder(session, host)
+    core.process_status(session, core.rules.matcher(), decoder, data, (host, 50000))
+    return session, decoder
+
+
+def test_detected_encoding_cached_per_register(core, monkeypatch):
+    monkeypatch.setattr(server_core.config, "STATUS_ENCODING", "auto")
+    monkeypatch.setattr(server_core.config, "PRINTER_ENCODINGS", {})
+
+    session, decoder = feed_status(core, "10.0.0.1", "Чек 1\n".encode("utf-8"))
+    other, _ = feed_status(core, "10.0.0.2", "Чек 1\n".encode("cp1251"))
+
+    assert (session.status_encoding, other.status_encoding) == ("utf-8", "cp1251")
+    # Нове з'єднання каси одразу декодує визначеним кодуванням
+    assert core._status_decoder(session, "10.0.0.1").encoding == "utf-8"
+    assert core._status_decoder(other, "10.0.0.2").encoding == "cp1251"
+
+
+def test_encoding_overrides(core, monkeypatch):
+    monkeypatch.setattr(server_core.config, "STATUS_ENCODING", "cp1251")
+    monkeypatch.setattr(server_core.config, "PRINTER_ENCODINGS", {"10.0.0.3": "utf-8", "7": "cp866"})
+    monkeypatch.setattr(core.sessions, "registers", {"10.0.0.4": 7})
+
+    by_host = core.sessions.for_addr(("10.0.0.3", 50000))
+    by_register = core.sessions.for_addr(("10.0.0.4", 50000))
+    default = core.sessions.for_addr(("10.0.0.5", 50000))
+
+    assert core._status_decoder(by_host, "10.0.0.3").encoding == "utf-8"
+    assert core._status_decoder(by_register, "10.0.0.4").encoding == "cp866"
+    assert core._status_decoder(default, "10.0.0.5").encoding == "cp1251"
+
+
+def test_unknown_override_falls_back_to_auto(core, monkeypatch):
+    monkeypatch.setattr(server_core.config, "STATUS_ENCODING", "no-such-encoding")
+    monkeypatch.setattr(server_core.config, "PRINTER_ENCODINGS", {})
+
+    session, decoder = feed_status(core, "10.0.0.6", "Повернення\n".encode("cp1251"))
+
+    assert decoder.encoding == session.status_encoding == "cp1251"
@@ -0,0 +1,84 @@
+import asyncio
+
+from data_processor import DataProcessor
+from receipt_formatter import ReceiptFormatter
+from server_core import POSServerCore
+from status_peers import REJECT_PEER, REJECT_TOTAL, StatusPeers
+
+
+def test_per_peer_limit_and_release():
+    peers = StatusPeers(max_connections=10, max_per_peer=2)
+
+    assert peers.admit("10.0.0.1") is None
+    assert peers.admit("10.0.0.1") is None
+    assert peers.admit("10.0.0.1") == REJECT_PEER
+    assert peers.admit("10.0.0.2") is None  # інша адреса - свій ліміт
+
+    peers.closed("10.0.0.1")
+    assert peers.admit("10.0.0.1") is None
+
+    peer = peers.peers["10.0.0.1"]
+    assert (peer.open, peer.connections, peer.rejected) == (2, 3, 1)
+    assert peers.open == 3
+
+
+def test_total_limit():
+    peers = StatusPeers(max_connections=2, max_per_peer=2)
+    peers.admit("10.0.0.1")
+    peers.admit("10.0.0.2")
+
+    assert peers.admit("10.0.0.3") == REJECT_TOTAL
+    peers.closed("10.0.0.2", idle=True)
+    assert peers.admit("10.0.0.3") is None
+    assert peers.peers["10.0.0.2"].idle_closed == 1
+
+
+def test_forgets_oldest_closed_peer():
+    peers = StatusPeers(max_peers=2)
+    peers.admit("10.0.0.1")
+    peers.admit("10.0.0.2")
+    peers.closed("10.0.0.2")
+    peers.peers["10.0.0.1"].last_seen = peers.peers["10.0.0.2"].last_seen + 1
+
+    peers.admit("10.0.0.3")
+
+    # Адреса з відкритим з'єднанням не забувається
+    assert set(peers.peers) == {"10.0.0.1", "10.0.0.3"}
+
+
+def test_printer_connections_limited_and_closed_when_idle():
+    core = POSServerCore(lambda *_: None, DataProcessor, ReceiptFormatter())
+    core.status_peers = StatusPeers(max_connections=32, max_per_peer=1, idle_timeout=0.2)
+
+    async def scenario():
+        server = await asyncio.start_server(core._handle_printer, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            await asyncio.sleep(0.05)
+            # Друге з'єднання з тієї ж адреси закривається одразу
+            extra_reader, extra_writer = await asyncio.open_connection("127.0.0.1", port)
+            assert await asyncio.wait_for(extra_reader.read(), 1) == b""
+            extra_writer.close()
+
+            # Перше - закривається сервером після idle_timeout без даних
+            assert await asyncio.wait_for(reader.read(), 2) == b""
+            writer.close()
+            await asyncio.sleep(0.05)
+            peer = core.status_peers.peers["127.0.0.1"]
+            assert (peer.open, peer.rejected, peer.idle_closed) == (0, 1, 1)
+
+            # Після звільнення - знову приймається; закриття клієнтом звільняє місце
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write("Чек 1\n".encode("cp1251"))
+            await writer.drain()
+            await asyncio.sleep(0.05)
+            assert peer.open == 1 and peer.bytes == 6
+            writer.close()
+            await asyncio.sleep(0.05)
+            assert (peer.open, peer.connections, core.status_peers.open) == (0, 2, 0)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
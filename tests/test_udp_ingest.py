@@ -0,0 +1,92 @@
+import asyncio
+import socket
+
+import pytest
+
+from metrics import DATAGRAM_DROPPED, DATAGRAM_TRUNCATED, PipelineMetrics
+from udp_ingest import SO_RXQ_OVFL, UDPReceiver
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def sender():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    yield sock
+    sock.close()
+
+
+def open_receiver(loop, **settings):
+    received = []
+    receiver = UDPReceiver(loop, lambda data, addr: received.append(data), PipelineMetrics(), lambda *_: None,
+                           **settings)
+    receiver.open("127.0.0.1", 0)
+    return receiver, received, receiver.sock.getsockname()
+
+
+def test_drain_reads_queued_datagrams_in_one_callback(loop, sender):
+    receiver, received, address = open_receiver(loop, batch=256)
+    try:
+        for number in range(20):
+            sender.sendto(b'{"n": %d}' % number, address)
+        receiver._drain()
+    finally:
+        receiver.close()
+
+    assert received == [b'{"n": %d}' % number for number in range(20)]
+    assert receiver.max_batch_seen == 20
+
+
+def test_drain_stops_at_batch_limit(loop, sender):
+    receiver, received, address = open_receiver(loop, batch=3)
+    try:
+        for number in range(5):
+            sender.sendto(bytes([number]), address)
+        receiver._drain()
+        assert len(received) == 3
+        receiver._drain()
+    finally:
+        receiver.close()
+
+    assert received == [bytes([number]) for number in range(5)]
+
+
+def test_oversized_datagram_counted_as_truncated(loop, sender):
+    receiver, received, address = open_receiver(loop, max_size=512)
+    try:
+        sender.sendto(b"x" * 600, address)
+        sender.sendto(b"y" * 512, address)
+        receiver._drain()
+    finally:
+        receiver.close()
+
+    assert received == [b"y" * 512]
+    assert receiver.metrics.counters[DATAGRAM_TRUNCATED] == 1
+
+
+@pytest.mark.skipif(SO_RXQ_OVFL is None, reason="лічильник відкинутих датаграм є лише на Linux")
+def test_kernel_drops_counted(loop, sender):
+    receiver, received, address = open_receiver(loop, rcvbuf=4096)
+    if not receiver._ovfl:
+        receiver.close()
+        pytest.skip("SO_RXQ_OVFL недоступний")
+    try:
+        # Буфер ядра на кілька датаграм - решта відкидається ще до прийому
+        for _ in range(200):
+            sender.sendto(b"z" * 1000, address)
+        receiver._drain()
+        # Ядро передає лічильник з датаграмою, що прийшла вже після відкидань
+        sender.sendto(b"last", address)
+        receiver._drain()
+    finally:
+        receiver.close()
+
+    dropped = receiver.metrics.counters[DATAGRAM_DROPPED]
+    assert dropped > 0
+    assert received[-1] == b"last"
+    assert len(received) - 1 + dropped == 200
@@ -0,0 +1,133 @@
+"""Прийом UDP JSON від принтера: великі кошики і сплески сканування.
+
+Власний неблокуючий сокет замість DatagramTransport:
+    - буфер прийому на UDP_MAX_DATAGRAM + 1 байт: датаграма, що в нього
+      не влізла, рахується як обрізана і не розбирається;
+    - збільшений SO_RCVBUF (UDP_RCVBUF), щоб сплеск сканування чекав у
+      ядрі, а не губився;
+    - на кожне пробудження циклу сокет вичитується пачкою (до
+      UDP_DRAIN_BATCH датаграм) одним викликом обробника;
+    - на Linux ядро повідомляє кількість датаграм, відкинутих через
+      переповнений буфер (SO_RXQ_OVFL) - лічильник udp_dropped.
+Потрібен цикл з add_reader (SelectorEventLoop, зокрема на Windows).
+"""
+import socket
+import struct
+import sys
+
+from metrics import DATAGRAM_TRUNCATED, DATAGRAM_DROPPED
+
+# Найбільший можливий UDP payload для IPv4
+MAX_UDP_PAYLOAD = 65507
+
+# Linux: лічильник відкинутих ядром датаграм в допоміжних даних recvmsg
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40 if sys.platform.startswith("linux") else None)
+OVFL_COUNTER = struct.Struct("=I")
+
+# Windows: WSAEMSGSIZE - датаграма більша за буфер (дані обрізано)
+WSAEMSGSIZE = 10040
+
+
+class UDPReceiver:
+    """UDP сокет, що вичитується пачками; handler(data, addr) - для кожної датаграми"""
+
+    def __init__(self, loop, handler, metrics, log, max_size=MAX_UDP_PAYLOAD, rcvbuf=4 * 1024 * 1024, batch=256):
+        self.loop = loop
+        self.handler = handler
+        self.metrics = metrics
+        self.log = log
+        self.max_size = max(512, min(int(max_size), MAX_UDP_PAYLOAD))
+        self.rcvbuf = int(rcvbuf)
+        self.batch = max(1, int(batch))
+        self.sock = None
+        self.effective_rcvbuf = 0
+        self.max_batch_seen = 0
+        self.paused = False
+        self._buffer = bytearray(self.max_size + 1)
+        self._view = memoryview(self._buffer)
+        self._ovfl = False
+        self._kernel_drops = 0
+
+    def open(self, host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if self.rcvbuf:
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+                except OSError:
+                    pass
+            self.effective_rcvbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            if SO_RXQ_OVFL is not None:
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                    self._ovfl = hasattr(sock, "recvmsg_into")
+                except OSError:
+                    self._ovfl = False
+            sock.setblocking(False)
+            sock.bind((host, port))
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.loop.add_reader(sock.fileno(), self._drain)
+
+    def pause(self):
+        if self.sock is not None and not self.paused:
+            self.loop.remove_reader(self.sock.fileno())
+            self.paused = True
+
+    def resume(self):
+        if self.sock is not None and self.paused:
+            self.loop.add_reader(self.sock.fileno(), self._drain)
+            self.paused = False
+
+    def close(self):
+        if self.sock is None:
+            return
+        if not self.paused:
+            try:
+                self.loop.remove_reader(self.sock.fileno())
+            except (ValueError, RuntimeError):
+                pass
+        self.sock.close()
+        self.sock = None
+        self.paused = False
+
+    def _receive(self):
+        """(кількість байтів, адреса) однієї датаграми; BlockingIOError - черга порожня"""
+        if not self._ovfl:
+            return self.sock.recvfrom_into(self._buffer)
+        nbytes, ancdata, flags, addr = self.sock.recvmsg_into([self._buffer], socket.CMSG_SPACE(OVFL_COUNTER.size))
+        for level, kind, data in ancdata:
+            if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= OVFL_COUNTER.size:
+                # Накопичений лічильник ядра з моменту створення сокета
+                drops = OVFL_COUNTER.unpack_from(data)[0]
+                if drops > self._kernel_drops:
+                    self.metrics.count(DATAGRAM_DROPPED, drops - self._kernel_drops)
+                    self._kernel_drops = drops
+        return nbytes, addr
+
+    def _drain(self):
+        """Вичитування сокета до порожньої черги або ліміту пачки (щоб не затримувати TCP)"""
+        received = 0
+        while received < self.batch and self.sock is not None and not self.paused:
+            try:
+                nbytes, addr = self._receive()
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                if getattr(e, "winerror", None) == WSAEMSGSIZE:
+                    self.metrics.count(DATAGRAM_TRUNCATED)
+                    received += 1
+                    continue
+                # ICMP port unreachable та подібне на Windows - не причина зупиняти прийом
+                self.log(f"UDP помилка: {e}", "error")
+                break
+            received += 1
+            if nbytes > self.max_size:
+                self.metrics.count(DATAGRAM_TRUNCATED)
+                self.log(f"UDP датаграму від {addr[0]} відкинуто: більша за {self.max_size} байт", "warning")
+                continue
+            self.handler(bytes(self._view[:nbytes]), addr)
+        if received > self.max_batch_seen:
+            self.max_batch_seen = received